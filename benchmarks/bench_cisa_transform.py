@@ -0,0 +1,62 @@
+# bench_cisa_transform.py
+"""
+Benchmark cisa_db transform field resolution on a synthetic KEV-shaped feed.
+
+    python benchmarks/bench_cisa_transform.py [--entries 100000] [--irregular 0.01]
+
+--irregular is the fraction of entries using alternate key spellings or
+missing cveID (CVE id only inside notes), which exercise the slow paths.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "cisa_db"))
+from transform import _extract_entries_from_cisa_raw
+
+def make_feed(n, irregular, rng):
+    vulns = []
+    for i in range(n):
+        e = {
+            "cveID": f"CVE-{2015 + i % 11}-{10000 + i}",
+            "vendorProject": rng.choice(["Microsoft", "Cisco", "Apple", "Oracle", "Ivanti"]),
+            "product": "Product  Name\n",
+            "vulnerabilityName": "Example Remote Code Execution Vulnerability",
+            "dateAdded": "2025-01-15",
+            "shortDescription": "An attacker could send a crafted request\r\nto execute code. " * 3,
+            "requiredAction": "Apply mitigations per vendor instructions or discontinue use.",
+            "dueDate": "2025-02-05",
+            "knownRansomwareCampaignUse": rng.choice(["Known", "Unknown"]),
+            "notes": f"https://example.org/advisory/{i} ; https://nvd.nist.gov/vuln/detail/CVE-2024-{i:05d}",
+            "cwes": ["CWE-78"],
+        }
+        if rng.random() < irregular:
+            if rng.random() < 0.5:
+                e["Vendor_Project"] = e.pop("vendorProject")
+                e["DUE_DATE"] = e.pop("dueDate")
+            else:
+                del e["cveID"]
+        vulns.append(e)
+    return {"title": "KEV", "catalogVersion": "2025.10.01", "count": n, "vulnerabilities": vulns}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", type=int, default=100000)
+    ap.add_argument("--irregular", type=float, default=0.01)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    feed = make_feed(args.entries, args.irregular, random.Random(3))
+    best = None
+    for _ in range(args.repeat):
+        t0 = time.perf_counter()
+        out = _extract_entries_from_cisa_raw(feed)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"entries={args.entries} irregular={args.irregular:.2%} out={len(out)} "
+          f"best={best:.3f}s ({args.entries / best:,.0f} entries/s)")
+
+if __name__ == "__main__":
+    main()
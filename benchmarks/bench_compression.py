@@ -0,0 +1,104 @@
+# bench_compression.py
+"""
+Report DynamoDB item-size reduction from compressing large text attributes.
+
+Usage:
+    python benchmarks/bench_compression.py [--codec zlib|zstd] [--min-bytes 512]
+        [--metasploit path/to/modules_metadata_base.json] [--misp path/to/threat-actor.json]
+
+CISA uses the committed baseline (cisa_db/daily_extract/cisa_extract.json).
+Metasploit and MISP use the given raw downloads, or synthetic records if none are given.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+from common.compression import compress_item, resolve_codec
+
+FEED_FIELDS = {
+    "cisa": ["shortDescription", "notes"],
+    "metasploit": ["description", "references"],
+    "misp": ["description", "meta.refs"],
+}
+
+_WORDS = ("remote code execution buffer overflow authentication bypass via crafted request "
+          "allows attackers to execute arbitrary commands on the affected server module").split()
+
+def _sentence(rng, n):
+    return " ".join(rng.choice(_WORDS) for _ in range(n))
+
+def _item_size(item):
+    """Approximate DynamoDB item size: attribute name bytes + value bytes."""
+    total = 0
+    for k, v in item.items():
+        total += len(k.encode("utf-8"))
+        if v is None:
+            total += 1
+        elif isinstance(v, (bytes, bytearray)):
+            total += len(v)
+        else:
+            total += len(str(v).encode("utf-8"))
+    return total
+
+def _cisa_records():
+    path = os.path.join(ROOT, "cisa_db", "daily_extract", "cisa_extract.json")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _metasploit_records(path, rng):
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        return [{"module_key": k, "description": m.get("description"),
+                 "references": ";".join(m.get("references") or [])} for k, m in raw.items()]
+    return [{"module_key": f"exploit/synthetic/{i}", "description": _sentence(rng, rng.randint(40, 200)),
+             "references": ";".join(f"URL-https://example.org/advisory/{rng.randint(1, 99999)}"
+                                    for _ in range(rng.randint(2, 12)))} for i in range(5000)]
+
+def _misp_records(path, rng):
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        out = []
+        for c in raw.get("values", []):
+            refs = (c.get("meta") or {}).get("refs")
+            out.append({"uuid": c.get("uuid"), "description": c.get("description"),
+                        "meta.refs": json.dumps(refs, separators=(",", ":")) if refs else None})
+        return out
+    return [{"uuid": f"uuid-{i}", "description": _sentence(rng, rng.randint(30, 300)),
+             "meta.refs": json.dumps([f"https://example.org/report/{rng.randint(1, 99999)}"
+                                      for _ in range(rng.randint(1, 25))])} for i in range(3000)]
+
+def run(feed, records, codec, min_bytes):
+    fields = FEED_FIELDS[feed]
+    before = after = 0
+    t0 = time.perf_counter()
+    for rec in records:
+        before += _item_size(rec)
+        after += _item_size(compress_item(rec, fields, codec, min_bytes))
+    elapsed = time.perf_counter() - t0
+    saved = (1 - after / before) * 100 if before else 0.0
+    print(f"{feed:<11} items={len(records):>6}  before={before / 1024:>9.1f} KiB  "
+          f"after={after / 1024:>9.1f} KiB  saved={saved:5.1f}%  ({elapsed:.2f}s)")
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--codec", default="zlib")
+    ap.add_argument("--min-bytes", type=int, default=512)
+    ap.add_argument("--metasploit")
+    ap.add_argument("--misp")
+    args = ap.parse_args()
+    codec = resolve_codec(args.codec)
+    rng = random.Random(42)
+    print(f"codec={codec} min_bytes={args.min_bytes}")
+    run("cisa", _cisa_records(), codec, args.min_bytes)
+    run("metasploit", _metasploit_records(args.metasploit, rng), codec, args.min_bytes)
+    run("misp", _misp_records(args.misp, rng), codec, args.min_bytes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# bench_ddb_backends.py
+"""
+Sync (boto3) vs async (aiobotocore) DynamoDB item I/O from common/ddb_io.py.
+
+    python benchmarks/bench_ddb_backends.py [--endpoint http://localhost:8000] [--items 5000]
+                                            [--concurrency 64] [--latency-ms 0]
+
+Writes --items items with put_many, then reads them back with get_many, on
+each backend (separate scratch tables). --latency-ms puts a local delaying
+proxy (needs aiohttp) in front of the endpoint to stand in for the network
+round trip to real DynamoDB, which is what the async backend overlaps.
+DynamoDB Local on the same machine answers in well under a millisecond, so
+without added latency both backends are bound by the local server's CPU.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import threading
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from common.aws import get_or_create_table, get_resource
+from common.ddb_io import item_io
+
+def start_delay_proxy(target: str, latency_s: float, port: int = 0) -> str:
+    """Forward every request to target after sleeping latency_s; returns the proxy URL."""
+    from aiohttp import ClientSession, web
+
+    ready = threading.Event()
+    url = {}
+
+    async def serve():
+        session = ClientSession()
+
+        async def forward(request):
+            body = await request.read()
+            await asyncio.sleep(latency_s)
+            headers = {k: v for k, v in request.headers.items() if k.lower() not in ("host", "content-length")}
+            async with session.request(request.method, target + request.path_qs, data=body, headers=headers) as resp:
+                payload = await resp.read()
+                out = {k: v for k, v in resp.headers.items()
+                       if k.lower() not in ("content-length", "transfer-encoding", "connection", "content-encoding")}
+                return web.Response(body=payload, status=resp.status, headers=out)
+
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", forward)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", port)
+        await site.start()
+        url["value"] = f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+        ready.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=lambda: asyncio.run(serve()), daemon=True).start()
+    ready.wait()
+    return url["value"]
+
+def run(endpoint, backend, items, concurrency):
+    ddb = get_resource("dynamodb", region_name="us-east-1", endpoint_url=endpoint,
+                       aws_access_key_id="dummy", aws_secret_access_key="dummy", pool_size=concurrency)
+    table = get_or_create_table(ddb, f"bench_ddb_{backend}_{int(time.time())}", "cve")
+    ddb_io = item_io(table, "cve", backend, concurrency)
+    rows = [{"cve": f"CVE-2024-{i:06d}", "epss": Decimal("0.00042"), "percentile": Decimal("0.5"),
+             "date": "2024-06-01"} for i in range(items)]
+    t0 = time.perf_counter()
+    written = ddb_io.put_many(iter(rows))
+    t1 = time.perf_counter()
+    found = ddb_io.get_many(r["cve"] for r in rows)
+    t2 = time.perf_counter()
+    assert written == items and len(found) == items, (written, len(found))
+    table.delete()
+    return type(ddb_io).__name__, t1 - t0, t2 - t1
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--endpoint", default=os.getenv("DDB_ENDPOINT", "http://localhost:8000"))
+    ap.add_argument("--items", type=int, default=5000)
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--latency-ms", type=float, default=0)
+    args = ap.parse_args()
+    endpoint = args.endpoint
+    if args.latency_ms > 0:
+        endpoint = start_delay_proxy(args.endpoint, args.latency_ms / 1000)
+    for backend in ("sync", "async"):
+        impl, put_s, get_s = run(endpoint, backend, args.items, args.concurrency)
+        print(f"RESULT {backend:5s} ({impl}) items={args.items} latency={args.latency_ms:.0f}ms  "
+              f"put {put_s:.2f}s ({args.items / put_s:.0f}/s)  get {get_s:.2f}s ({args.items / get_s:.0f}/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# bench_epss_chunked.py
+"""
+Peak-RSS benchmark for epss_db load: full DataFrame vs chunked read_csv.
+
+    python benchmarks/bench_epss_chunked.py [--sizes 100000,250000,500000,1000000] [--chunk-size 10000]
+
+Each measurement runs in a fresh subprocess writing into a discarding table,
+so only the CSV -> item path is measured (no DynamoDB needed).
+"""
+import os
+import sys
+import random
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_CHILD = r"""
+import sys, resource
+sys.path.insert(0, {epss_dir!r})
+import load as epss_load
+
+class _NullWriter:
+    def __enter__(self): return self
+    def __exit__(self, *a): return False
+    def put_item(self, Item): pass
+
+class _NullTable:
+    def batch_writer(self, **kw): return _NullWriter()
+
+epss_load.PROGRESS_INTERVAL = 10 ** 9
+path, chunk = {path!r}, {chunk}
+if chunk:
+    batches = epss_load.iter_csv_batches(path, chunk)
+else:
+    import pandas as pd
+    batches = [pd.read_csv(path, dtype=str, keep_default_na=False).to_dict("records")]
+epss_load.write_batches(batches, table=_NullTable())
+print("RSS_KB", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+def write_csv(path, rows, rng):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("cve,epss,percentile,date\n")
+        for i in range(rows):
+            f.write(f"CVE-{1999 + i % 27}-{i:07d},{rng.random():.5f},{rng.random():.5f},2025-10-01\n")
+
+def measure(path, chunk):
+    code = _CHILD.format(epss_dir=os.path.join(ROOT, "epss_db"), path=path, chunk=chunk)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    for line in out.splitlines():
+        if line.startswith("RSS_KB"):
+            return int(line.split()[1]) / 1024
+    raise RuntimeError(out)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="100000,250000,500000,1000000")
+    ap.add_argument("--chunk-size", type=int, default=10000)
+    args = ap.parse_args()
+    rng = random.Random(1)
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{'rows':>9}  {'full MiB':>9}  {'chunked MiB':>11}")
+        for n in (int(x) for x in args.sizes.split(",")):
+            path = os.path.join(tmp, f"epss_{n}.csv")
+            write_csv(path, n, rng)
+            full = measure(path, 0)
+            chunked = measure(path, args.chunk_size)
+            print(f"{n:>9}  {full:>9.1f}  {chunked:>11.1f}")
+            os.remove(path)
+
+if __name__ == "__main__":
+    main()
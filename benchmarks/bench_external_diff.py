@@ -0,0 +1,61 @@
+# bench_external_diff.py
+"""
+Peak memory and time: in-memory dict diff vs common/extdiff.py external sort-merge diff.
+
+    python benchmarks/bench_external_diff.py [--rows 1000000] [--changed 0.01] [--run-size 100000]
+
+Both sides are generated lazily as (key, hash, payload) tuples, so the numbers
+reflect what each diff has to hold, not the input generator. Peak memory is
+measured with tracemalloc.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from common.extdiff import external_diff
+
+def side(n, changed, seed, offset=0):
+    rng = random.Random(seed)
+    for i in range(offset, n + offset):
+        h = f"{i:016x}" if rng.random() >= changed else f"{rng.getrandbits(64):016x}"
+        yield f"EDB-{(i * 7919) % (n * 2):09d}", h, {"description": f"row {i} " * 8}
+
+def in_memory(old, new):
+    old_map = {k: (h, p) for k, h, p in old}
+    new_map = {k: (h, p) for k, h, p in new}
+    out = [k for k in new_map if k not in old_map or old_map[k][0] != new_map[k][0]]
+    out += [k for k in old_map if k not in new_map]
+    return len(out)
+
+def external(old, new, run_size):
+    return sum(1 for _ in external_diff(old, new, run_size=run_size))
+
+def measure(fn, *args):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    n = fn(*args)
+    elapsed = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return n, elapsed, peak
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1000000)
+    ap.add_argument("--changed", type=float, default=0.01)
+    ap.add_argument("--run-size", type=int, default=100000)
+    args = ap.parse_args()
+    mk = lambda: (side(args.rows, 0.0, 1), side(args.rows, args.changed, 2, offset=args.rows // 100))
+    n1, t1, p1 = measure(in_memory, *mk())
+    n2, t2, p2 = measure(external, *mk(), args.run_size)
+    assert n1 == n2, f"diff sizes differ: {n1} vs {n2}"
+    print(f"RESULT rows={args.rows} diff={n1}  in-memory: {t1:.1f}s peak {p1 / 2**20:.0f} MiB  "
+          f"external(run={args.run_size}): {t2:.1f}s peak {p2 / 2**20:.0f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# bench_lookup_service.py
+"""
+Latency benchmark for lookup_service/lookup_main.py.
+
+With DynamoDB Local running:
+    python benchmarks/bench_lookup_service.py --seed        # write synthetic rows, then exit
+    python lookup_service/lookup_main.py &                  # start the service on the seeded tables
+    python benchmarks/bench_lookup_service.py --requests 200 --concurrency 8 --size 1000
+
+Reports p50/p95/p99 request latency for --size CVE ids per POST /lookup.
+"""
+import os
+import time
+import random
+import asyncio
+import argparse
+
+import aiohttp
+import boto3
+
+def _cve(rng):
+    return f"CVE-{rng.randint(1999, 2025)}-{rng.randint(1, 60000):05d}"
+
+def seed(endpoint, n, rng):
+    ddb = boto3.resource("dynamodb", region_name="us-east-1", endpoint_url=endpoint,
+                         aws_access_key_id="dummy", aws_secret_access_key="dummy")
+    existing = ddb.meta.client.list_tables().get("TableNames", [])
+    for name, pk in (("cisa_data", "cveID"), ("epss_data", "cve"), ("exploit_data", "id"), ("metasploit_data", "id")):
+        if name not in existing:
+            ddb.create_table(TableName=name, KeySchema=[{"AttributeName": pk, "KeyType": "HASH"}],
+                             AttributeDefinitions=[{"AttributeName": pk, "AttributeType": "S"}],
+                             ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5})
+    cves = list({_cve(rng) for _ in range(n)})
+    with ddb.Table("epss_data").batch_writer() as b:
+        for c in cves:
+            b.put_item(Item={"cve": c, "epss": str(round(rng.random(), 5)), "percentile": str(round(rng.random(), 5))})
+    with ddb.Table("cisa_data").batch_writer() as b:
+        for c in cves[: n // 20]:
+            b.put_item(Item={"cveID": c, "vendorProject": "Vendor", "dateAdded": "2025-01-01"})
+    with ddb.Table("exploit_data").batch_writer() as b:
+        for i, c in enumerate(cves[: n // 5]):
+            b.put_item(Item={"id": str(i), "CVE_id": c, "description": "synthetic exploit"})
+    with ddb.Table("metasploit_data").batch_writer() as b:
+        for i, c in enumerate(cves[: n // 50]):
+            b.put_item(Item={"id": f"META-2025-{i:06d}", "cve_id": c, "module_name": "synthetic"})
+    print(f"🌱 Seeded {len(cves)} CVEs")
+    return cves
+
+async def run(url, cves, requests, concurrency, size, rng):
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession() as session:
+        async def one():
+            body = {"cves": rng.sample(cves, min(size, len(cves)))}
+            async with sem:
+                t0 = time.perf_counter()
+                async with session.post(f"{url}/lookup", json=body) as resp:
+                    await resp.read()
+                    resp.raise_for_status()
+                latencies.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        wall = time.perf_counter() - t0
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+    print(f"requests={requests} size={size} concurrency={concurrency} wall={wall:.2f}s "
+          f"p50={pct(50):.1f}ms p95={pct(95):.1f}ms p99={pct(99):.1f}ms max={latencies[-1]:.1f}ms")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="http://127.0.0.1:8080")
+    ap.add_argument("--endpoint", default=os.getenv("DDB_ENDPOINT", "http://localhost:8000"))
+    ap.add_argument("--seed", action="store_true")
+    ap.add_argument("--cves", type=int, default=20000)
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--size", type=int, default=1000)
+    args = ap.parse_args()
+    rng = random.Random(7)
+    if args.seed:
+        seed(args.endpoint, args.cves, rng)
+        return
+    cves = list({_cve(rng) for _ in range(args.cves)})
+    asyncio.run(run(args.url, cves, args.requests, args.concurrency, args.size, rng))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# bench_mirror_query.py
+"""
+Ad-hoc query latency on the local SQLite mirror (common/mirror.py).
+
+    python benchmarks/bench_mirror_query.py [--epss 250000] [--kev 1200] [--modules 3000] [--exploits 45000]
+
+Builds a scratch mirror with synthetic rows of roughly production size through
+MirrorRun (the same path the loaders use), then times a few analyst queries.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from common.mirror import MirrorRun, query
+
+QUERIES = {
+    "kev_epss_msf": "SELECT k.cve, e.epss FROM cisa k JOIN epss e USING (cve) WHERE e.epss > 0.5 AND EXISTS "
+                    "(SELECT 1 FROM cve_links l WHERE l.cve = k.cve AND l.feed = 'metasploit')",
+    "kev_by_vendor": "SELECT vendor_project, COUNT(*) n, AVG(e.epss) avg_epss FROM cisa k LEFT JOIN epss e USING (cve) "
+                     "GROUP BY vendor_project ORDER BY n DESC LIMIT 10",
+    "top_epss_with_exploit": "SELECT e.cve, e.epss FROM epss e WHERE EXISTS (SELECT 1 FROM cve_links l "
+                             "WHERE l.cve = e.cve AND l.feed = 'exploit') ORDER BY e.epss DESC LIMIT 20",
+    "overview_one": "SELECT * FROM cve_overview WHERE cve = 'CVE-2021-00046'",
+}
+
+def build(path, args):
+    rnd = random.Random(7)
+    cves = [f"CVE-{2015 + i % 10}-{i:05d}" for i in range(args.epss)]
+    feeds = {
+        "epss": ({"cve": c, "epss": Decimal(str(round(rnd.random() ** 4, 5))), "percentile": Decimal("0.5"),
+                  "date": "2025-01-01"} for c in cves),
+        "cisa": ({"cveID": c, "vendorProject": f"vendor{rnd.randrange(200)}", "product": "p",
+                  "dateAdded": "2024-01-01"} for c in rnd.sample(cves, args.kev)),
+        "metasploit": ({"id": f"META-{i}", "module_key": f"exploit/x/{i}", "cve_id": rnd.choice(cves)}
+                       for i in range(args.modules)),
+        "exploit": ({"id": str(i), "CVE_id": rnd.choice(cves), "type": "remote"} for i in range(args.exploits)),
+    }
+    for feed, items in feeds.items():
+        t0 = time.perf_counter()
+        with MirrorRun(path, feed) as run:
+            run.stage_many(items)
+            n = run.commit()
+        print(f"RESULT load {feed}: {n} rows in {time.perf_counter() - t0:.2f}s")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--epss", type=int, default=250000)
+    ap.add_argument("--kev", type=int, default=1200)
+    ap.add_argument("--modules", type=int, default=3000)
+    ap.add_argument("--exploits", type=int, default=45000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+    path = os.path.join(tempfile.mkdtemp(prefix="mirror_"), "bench.sqlite")
+    build(path, args)
+    for name, sql in QUERIES.items():
+        times = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            rows = query(sql, path=path)
+            times.append((time.perf_counter() - t0) * 1000)
+        print(f"RESULT query {name}: {len(rows)} rows, best {min(times):.1f} ms, median {sorted(times)[len(times) // 2]:.1f} ms")
+
+if __name__ == "__main__":
+    main()
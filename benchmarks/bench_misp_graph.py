@@ -0,0 +1,98 @@
+# bench_misp_graph.py
+"""
+MISP alias resolution and related-cluster walks (common/misp_graph.py) vs parsing every item.
+
+    python benchmarks/bench_misp_graph.py [--clusters 20000] [--related 3] [--rounds 3]
+
+Builds a scratch mirror with synthetic clusters shaped like the loader writes
+them (meta.synonyms and related as JSON strings), times a full graph build,
+incremental updates after small MISP runs (checked against a full rebuild),
+and lookups against a scan that parses each item.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from common import mirror, misp_graph
+from common.mirror import MirrorRun, query
+
+RELATIONS = ["similar", "uses", "variant-of", "related-to"]
+
+def _uuid(i):
+    return f"00000000-0000-4000-8000-{i:012d}"
+
+def _cluster(rnd, i, n, related, version=0):
+    return {
+        "uuid": _uuid(i), "value": f"Actor {i}", "type": rnd.choice(["threat-actor", "tool", "malware"]),
+        "description": f"cluster {i} v{version}",
+        "meta.synonyms": json.dumps([f"Alias {i}-{version}-{j}" for j in range(3)] + [f"Group-{i}"]),
+        "related": json.dumps([{"dest-uuid": _uuid(rnd.randrange(n)), "type": rnd.choice(RELATIONS)}
+                               for _ in range(rnd.randint(0, related * 2))]),
+    }
+
+def load(path, items):
+    with MirrorRun(path, "misp") as run:
+        run.stage_many(items)
+        run.commit()
+
+def scan_resolve(path, name):
+    """Baseline: parse every item's synonyms."""
+    key = misp_graph.normalize_alias(name)
+    return [r["uuid"] for r in query("SELECT uuid, item FROM misp", path=path)
+            if key in {misp_graph.normalize_alias(a) for a in misp_graph.cluster_aliases(json.loads(r["item"]))}]
+
+def _state(graph, refs):
+    return [(sorted(c["uuid"] for c in graph.resolve(r)),
+             sorted((x["uuid"], x["hops"]) for x in graph.khop(r, 2, "both"))) for r in refs]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--clusters", type=int, default=20000)
+    ap.add_argument("--related", type=int, default=3)
+    ap.add_argument("--rounds", type=int, default=3)
+    args = ap.parse_args()
+    mirror.RISK_RANK = mirror.TEXT_INDEX = mirror.MISP_GRAPH = False  # updates are triggered (and timed) below
+    rnd = random.Random(3)
+    tmp = tempfile.mkdtemp(prefix="misp_graph_")
+    path = os.path.join(tmp, "bench.sqlite")
+    graph_file = os.path.join(tmp, "bench.misp_graph.idx")
+    load(path, [_cluster(rnd, i, args.clusters, args.related) for i in range(args.clusters)])
+
+    t0 = time.perf_counter()
+    misp_graph.update(path, graph_file, full=True)
+    print(f"RESULT full build: {(time.perf_counter() - t0) * 1000:.0f} ms, {os.path.getsize(graph_file) / 1e6:.1f} MB")
+
+    refs = [f"group {rnd.randrange(args.clusters)}" for _ in range(20)]
+    for round_no in range(1, args.rounds + 1):
+        changed = rnd.sample(range(args.clusters + 50), 200)  # updates and a few new clusters
+        load(path, [_cluster(rnd, i, args.clusters + 50, args.related, round_no) for i in changed])
+        t0 = time.perf_counter()
+        result = misp_graph.update(path, graph_file)
+        inc_ms = (time.perf_counter() - t0) * 1000
+        misp_graph.update(path, graph_file + ".full", full=True)
+        same = _state(misp_graph.MispGraph(graph_file), refs) == _state(misp_graph.MispGraph(graph_file + ".full"), refs)
+        print(f"RESULT round {round_no}: incremental {inc_ms:.0f} ms ({result['reread']} clusters), "
+              f"matches full build: {same}")
+
+    graph = misp_graph.MispGraph(graph_file)
+    for name, fn in [("resolve", lambda r: graph.resolve(r)),
+                     ("1-hop", lambda r: graph.khop(r, 1)),
+                     ("3-hop", lambda r: graph.khop(r, 3))]:
+        times = []
+        for r in refs:
+            t0 = time.perf_counter()
+            fn(r)
+            times.append((time.perf_counter() - t0) * 1000)
+        print(f"RESULT {name}: median {sorted(times)[len(times) // 2]:.3f} ms, max {max(times):.3f} ms")
+    t0 = time.perf_counter()
+    scan_resolve(path, refs[0])
+    print(f"RESULT resolve by parsing every item: {(time.perf_counter() - t0) * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
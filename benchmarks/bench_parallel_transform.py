@@ -0,0 +1,84 @@
+# bench_parallel_transform.py
+"""
+Scaling benchmark for the process-pool transforms (Metasploit and MISP).
+
+    python benchmarks/bench_parallel_transform.py [--modules 200000] [--clusters 100000] [--workers 1,2,4,8,16]
+
+Uses synthetic inputs shaped like modules_metadata_base.json and threat-actor.json
+and checks that every worker count yields the same output as the serial run.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import importlib.util
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _load(name, path):
+    # both feeds have a module called transform.py; load them side by side
+    spec = importlib.util.spec_from_file_location(name, path)
+    mod = importlib.util.module_from_spec(spec)
+    sys.modules[name] = mod
+    spec.loader.exec_module(mod)
+    return mod
+
+msf = _load("metasploit_transform", os.path.join(ROOT, "metasploit_db", "transform.py"))
+misp = _load("misp_transform", os.path.join(ROOT, "misp_db", "transform.py"))
+
+_TEXT = "This module exploits a   stack buffer overflow\nin the\tservice   when a crafted packet is sent. "
+
+def make_modules(n, rng):
+    return json.dumps({
+        f"exploit/windows/synthetic/mod_{i}": {
+            "name": f"Synthetic   Module {i}", "fullname": f"exploit/windows/synthetic/mod_{i}",
+            "aliases": [], "rank": 600, "type": "exploit",
+            "author": ["alice <a@example.org>", "  bob  "],
+            "description": _TEXT * rng.randint(1, 6),
+            "references": [f"CVE-2020-{i % 9000 + 1000}", f"URL-https://example.org/{i}"],
+            "platform": "windows", "autofilter_services": ["http", "https"],
+            "rport": 443, "path": f"/modules/exploits/windows/mod_{i}.rb", "ref_name": f"windows/mod_{i}",
+        } for i in range(n)
+    })
+
+def make_clusters(n, rng):
+    return {"name": "Threat Actor", "values": [{
+        "uuid": f"00000000-0000-0000-0000-{i:012d}", "value": f"APT {i}",
+        "description": _TEXT * rng.randint(1, 4),
+        "meta": {"synonyms": [f"Group {i}", f"G{i}"], "country": rng.choice(["CN", "RU", "KP", "IR"]),
+                 "refs": [f"https://example.org/report/{i}/{j}" for j in range(rng.randint(1, 8))]},
+        "related": [{"dest-uuid": f"00000000-0000-0000-0000-{(i + 1) % n:012d}", "type": "similar"}],
+    } for i in range(n)]}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modules", type=int, default=200000)
+    ap.add_argument("--clusters", type=int, default=100000)
+    ap.add_argument("--workers", default="1,2,4,8,16")
+    args = ap.parse_args()
+    rng = random.Random(11)
+    modules_text = make_modules(args.modules, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        misp_path = os.path.join(tmp, "threat_actor.json")
+        with open(misp_path, "w", encoding="utf-8") as f:
+            json.dump(make_clusters(args.clusters, rng), f)
+
+        base_msf = base_misp = None
+        for w in (int(x) for x in args.workers.split(",")):
+            t0 = time.perf_counter()
+            records, _ = msf.transform_json_text_to_records_and_json_bytes(modules_text, workers=w)
+            t_msf = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            df = misp.transform_misp(misp_path, workers=w)
+            t_misp = time.perf_counter() - t0
+            if base_msf is None:
+                base_msf, base_misp = records, df
+            assert records == base_msf, "metasploit output differs from serial run"
+            assert df.equals(base_misp) and list(df.columns) == list(base_misp.columns), "misp output differs"
+            print(f"RESULT workers={w:>2}  metasploit={t_msf:6.2f}s  misp={t_misp:6.2f}s")
+
+if __name__ == "__main__":
+    main()
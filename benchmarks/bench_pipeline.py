@@ -0,0 +1,74 @@
+# bench_pipeline.py
+"""
+Sequential vs pipelined extract -> transform -> load (common/pipeline.py).
+
+    python benchmarks/bench_pipeline.py [--batches 20] [--extract-ms 50] [--transform-ms 10] [--load-ms 40]
+
+Stages sleep to stand in for the EPSS API fetch and DynamoDB writes (both
+release the GIL). Pipelined wall time should approach the slowest stage
+times --batches, not the sum of all three. Peak in-flight batches are reported
+to show that the bounded queues hold memory flat.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from common.pipeline import run_pipeline
+
+class InFlight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.now = self.peak = 0
+
+    def add(self, n):
+        with self.lock:
+            self.now += n
+            self.peak = max(self.peak, self.now)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batches", type=int, default=20)
+    ap.add_argument("--extract-ms", type=float, default=50)
+    ap.add_argument("--transform-ms", type=float, default=10)
+    ap.add_argument("--load-ms", type=float, default=40)
+    ap.add_argument("--queue", type=int, default=2)
+    args = ap.parse_args()
+    tracker = InFlight()
+
+    def extract():
+        for i in range(args.batches):
+            time.sleep(args.extract_ms / 1000)
+            tracker.add(1)
+            yield [i]
+
+    def transform(batch):
+        time.sleep(args.transform_ms / 1000)
+        return batch
+
+    def load(batches):
+        n = 0
+        for _ in batches:
+            time.sleep(args.load_ms / 1000)
+            tracker.add(-1)
+            n += 1
+        return n
+
+    t0 = time.perf_counter()
+    load(transform(b) for b in extract())
+    sequential = time.perf_counter() - t0
+    seq_peak, tracker.peak = tracker.peak, 0
+
+    t0 = time.perf_counter()
+    result, _ = run_pipeline(("extract", extract()), [("transform", transform)], ("load", load), queue_size=args.queue)
+    pipelined = time.perf_counter() - t0
+    assert result == args.batches
+    slowest = max(args.extract_ms, args.transform_ms, args.load_ms) * args.batches / 1000
+    print(f"RESULT sequential={sequential:.2f}s (peak {seq_peak} batches)  pipelined={pipelined:.2f}s "
+          f"(peak {tracker.peak} batches, queue={args.queue})  slowest-stage bound={slowest:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# bench_risk_rank.py
+"""
+Top-K risk ranking (common/risk_rank.py): full recompute vs incremental update.
+
+    python benchmarks/bench_risk_rank.py [--epss 250000] [--k 500] [--rounds 5]
+
+Builds a scratch mirror like bench_mirror_query.py, then applies small loader
+runs (new KEV entries, changed EPSS scores, new Metasploit modules) and times
+the incremental update after each. Every round's ranking is checked against a
+full recompute of a copy of the mirror.
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from common import mirror, risk_rank
+from common.mirror import MirrorRun
+
+def _epss(rnd, c):
+    return {"cve": c, "epss": Decimal(str(round(rnd.random() ** 4, 5))),
+            "percentile": Decimal(str(round(rnd.random(), 5))), "date": "2025-01-01"}
+
+def build(path, args, rnd, cves):
+    feeds = {
+        "epss": (_epss(rnd, c) for c in cves),
+        "cisa": ({"cveID": c, "vendorProject": f"vendor{rnd.randrange(200)}", "dateAdded": "2024-01-01",
+                  "knownRansomwareCampaignUse": rnd.choice(["Known", "Unknown"])} for c in rnd.sample(cves, args.kev)),
+        "metasploit": ({"id": f"META-{i}", "module_key": f"exploit/x/{i}", "cve_id": rnd.choice(cves)}
+                       for i in range(args.modules)),
+        "exploit": ({"id": str(i), "CVE_id": rnd.choice(cves), "type": "remote"} for i in range(args.exploits)),
+    }
+    for feed, items in feeds.items():
+        with MirrorRun(path, feed) as run:
+            run.stage_many(items)
+            run.commit()
+
+def small_runs(path, rnd, cves, round_no):
+    """One round of loader runs touching a few hundred CVEs."""
+    runs = {
+        "cisa": [{"cveID": c, "vendorProject": "vendor0", "dateAdded": "2025-02-01",
+                  "knownRansomwareCampaignUse": "Known"} for c in rnd.sample(cves, 20)],
+        "epss": [_epss(rnd, c) for c in rnd.sample(cves, 2000)],
+        "metasploit": [{"id": f"META-R{round_no}-{i}", "module_key": f"exploit/r/{i}", "cve_id": rnd.choice(cves)}
+                       for i in range(50)],
+    }
+    for feed, items in runs.items():
+        with MirrorRun(path, feed) as run:
+            run.stage_many(items)
+            run.commit()
+
+def ranking(path):
+    return [(r["cve"], r["score"]) for r in risk_rank.top(path=path)]
+
+def full_copy(path, cfg):
+    copy = path + ".full"
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(copy + suffix):
+            os.remove(copy + suffix)
+    src, dst = sqlite3.connect(path), sqlite3.connect(copy)
+    src.backup(dst)
+    src.close(), dst.close()
+    t0 = time.perf_counter()
+    risk_rank.update(copy, cfg, force_full=True)
+    return ranking(copy), (time.perf_counter() - t0) * 1000
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--epss", type=int, default=250000)
+    ap.add_argument("--kev", type=int, default=1200)
+    ap.add_argument("--modules", type=int, default=3000)
+    ap.add_argument("--exploits", type=int, default=45000)
+    ap.add_argument("--k", type=int, default=500)
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+    mirror.RISK_RANK = False  # updates are triggered (and timed) explicitly below
+    cfg = {"TOP_K": args.k}
+    rnd = random.Random(11)
+    cves = [f"CVE-{2015 + i % 10}-{i:05d}" for i in range(args.epss)]
+    path = os.path.join(tempfile.mkdtemp(prefix="risk_"), "bench.sqlite")
+    build(path, args, rnd, cves)
+
+    t0 = time.perf_counter()
+    risk_rank.update(path, cfg, force_full=True)
+    print(f"RESULT full recompute: {(time.perf_counter() - t0) * 1000:.1f} ms over {len(cves)} CVEs")
+
+    for round_no in range(args.rounds):
+        small_runs(path, rnd, cves, round_no)
+        t0 = time.perf_counter()
+        result = risk_rank.update(path, cfg)
+        inc_ms = (time.perf_counter() - t0) * 1000
+        expected, full_ms = full_copy(path, cfg)
+        print(f"RESULT round {round_no}: {result['mode']} update {inc_ms:.1f} ms ({result['touched']} touched) vs "
+              f"full {full_ms:.1f} ms, ranking matches full: {ranking(path) == expected}")
+
+    times = []
+    for _ in range(20):
+        t0 = time.perf_counter()
+        rows = risk_rank.top(args.k, path)
+        times.append((time.perf_counter() - t0) * 1000)
+    print(f"RESULT read top {len(rows)}: best {min(times):.2f} ms, median {sorted(times)[len(times) // 2]:.2f} ms")
+
+if __name__ == "__main__":
+    main()
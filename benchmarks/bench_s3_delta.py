@@ -0,0 +1,85 @@
+# bench_s3_delta.py
+"""
+Bytes uploaded to S3 per Metasploit run: legacy full JSON uploads vs the
+compressed manifest/delta store in metasploit_db/s3_store.py.
+
+    python benchmarks/bench_s3_delta.py [--modules 5000] [--changed 0.01] [--runs 5]
+
+Runs against an in-process S3 stand-in (moto), so no AWS account is needed.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+import boto3
+from moto import mock_aws
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "metasploit_db"))
+from s3_store import BaselineStore
+
+PREFIX = "vuln-raw-source/metasploit/"
+
+def make_entries(n, rng):
+    return {f"exploit/synthetic/mod_{i}": {
+        "module_key": f"exploit/synthetic/mod_{i}", "id": f"META-2025-{i + 1:06d}",
+        "module_name": f"Synthetic Module {i}", "rank": "excellent", "type": "exploit",
+        "description": "This module exploits a stack buffer overflow in the service. " * rng.randint(1, 6),
+        "references": f"CVE-2020-{i % 9000 + 1000};URL-https://example.org/{i}",
+        "content_hash": f"b2:{rng.getrandbits(128):032x}", "uploaded_date": "2025-01-01",
+    } for i in range(n)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--modules", type=int, default=5000)
+    ap.add_argument("--changed", type=float, default=0.01)
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+    rng = random.Random(5)
+    merged = make_entries(args.modules, rng)
+    keys = list(merged)
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    with mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="bench")
+        legacy_total = new_total = 0
+        legacy_t = new_t = 0.0
+        for run in range(args.runs):
+            delta = []
+            if run:
+                for mk in rng.sample(keys, int(args.modules * args.changed)):
+                    merged[mk] = dict(merged[mk], content_hash=f"b2:{rng.getrandbits(128):032x}")
+                    delta.append(merged[mk])
+            else:
+                delta = list(merged.values())
+            records = list(merged.values())
+
+            t0 = time.perf_counter()
+            canonical = json.dumps(records, ensure_ascii=False, indent=2).encode("utf-8")
+            baseline = json.dumps(records, ensure_ascii=False, indent=2).encode("utf-8")
+            s3.put_object(Bucket="bench", Key=PREFIX + "metasploit.json", Body=canonical)
+            s3.put_object(Bucket="bench", Key=PREFIX + "metasploit_baseline.json", Body=baseline)
+            legacy_t += time.perf_counter() - t0
+            legacy_total += len(canonical) + len(baseline)
+
+            t0 = time.perf_counter()
+            store = BaselineStore(s3, "bench", PREFIX, {})
+            content_key = str(hash(tuple(r["content_hash"] for r in records)))
+            store.put_canonical(json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+                                content_key)
+            store.save_baseline(merged, delta)
+            store.flush()
+            new_t += time.perf_counter() - t0
+            new_total += store.bytes_uploaded
+            print(f"run {run}: legacy={len(canonical) + len(baseline):>11,} B  store={store.bytes_uploaded:>11,} B "
+                  f"({store.puts} PUTs)")
+        print(f"RESULT modules={args.modules} changed={args.changed:.1%} runs={args.runs} "
+              f"legacy={legacy_total:,} B ({legacy_t:.2f}s)  store={new_total:,} B ({new_t:.2f}s)  "
+              f"saved={1 - new_total / legacy_total:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# bench_s3_transfer.py
+"""
+Round-trip timing for metasploit_db/s3_store.py uploads and downloads:
+single PUT/GET vs multipart upload and concurrent ranged GETs.
+
+    python benchmarks/bench_s3_transfer.py [--mb 64] [--endpoint http://localhost:9000]
+
+Without --endpoint an in-process S3 stand-in (moto) is used; point --endpoint at
+MinIO or `moto_server` to include real HTTP overhead. Correctness is covered by
+tests/test_s3_store.py.
+"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+
+import boto3
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "metasploit_db"))
+from s3_store import S3TransferSettings, s3_get_bytes_if_exists, s3_put_bytes
+
+MODES = {
+    "single": {"S3_MULTIPART_THRESHOLD_MB": 4096, "S3_RANGE_MB": 4096, "S3_MAX_CONCURRENCY": 1},
+    "multipart+ranged": {"S3_MULTIPART_THRESHOLD_MB": 16, "S3_MULTIPART_CHUNK_MB": 8,
+                         "S3_RANGE_MB": 8, "S3_MAX_CONCURRENCY": 8},
+}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=int, default=64)
+    ap.add_argument("--endpoint", default=None)
+    args = ap.parse_args()
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+    data = os.urandom(args.mb * 1024 * 1024)
+    if args.endpoint:
+        ctx = contextlib.nullcontext()
+    else:
+        from moto import mock_aws
+        ctx = mock_aws()
+    with ctx:
+        s3 = boto3.client("s3", region_name="us-east-1", endpoint_url=args.endpoint)
+        with contextlib.suppress(Exception):
+            s3.create_bucket(Bucket="bench")
+        for mode, cfg in MODES.items():
+            transfer = S3TransferSettings(cfg)
+            key = f"bench/{mode}.bin"
+            t0 = time.perf_counter()
+            s3_put_bytes(s3, "bench", key, data, transfer)
+            t_put = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            s3_get_bytes_if_exists(s3, "bench", key, transfer)
+            t_get = time.perf_counter() - t0
+            print(f"RESULT {mode:<17} size={args.mb} MiB  put={t_put:6.2f}s  get={t_get:6.2f}s")
+
+if __name__ == "__main__":
+    main()
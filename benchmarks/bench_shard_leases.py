@@ -0,0 +1,95 @@
+# bench_shard_leases.py
+"""
+Several local worker processes sharing shards through common/leases.py.
+
+    python benchmarks/bench_shard_leases.py [--endpoint http://localhost:8000] [--workers 4] [--shards 16]
+                                            [--keys 20000] [--shard-ms 300] [--crash]
+
+Needs DynamoDB Local (or any DynamoDB endpoint). Each worker process claims
+shards of a fresh job, writes the keys that hash into the shard to a scratch
+table and completes the lease. With --crash one worker exits abruptly in the
+middle of its first shard; its lease expires after --lease-seconds and another
+worker takes the shard over. At the end every shard must be done and every key
+written exactly once (items are idempotent puts).
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing as mp
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def _ddb(endpoint):
+    from common.aws import get_resource
+    return get_resource("dynamodb", region_name="us-east-1", endpoint_url=endpoint,
+                        aws_access_key_id="dummy", aws_secret_access_key="dummy")
+
+def worker(args, job, worker_no):
+    from common.aws import get_or_create_table
+    from common.leases import ShardLeases, run_shards, shard_of
+
+    ddb = _ddb(args.endpoint)
+    table = get_or_create_table(ddb, args.table, "cve")
+    leases = ShardLeases(ddb, job, args.shards, worker_id=f"bench-{worker_no}", lease_seconds=args.lease_seconds)
+
+    def process(shard):
+        keys = [f"CVE-2024-{i:05d}" for i in range(args.keys) if shard_of(f"CVE-2024-{i:05d}", args.shards) == shard]
+        time.sleep(args.shard_ms / 1000)
+        if args.crash and worker_no == 0:
+            print(f"💥 bench-0 crashing inside shard {shard + 1}", flush=True)
+            os._exit(1)
+        with table.batch_writer(overwrite_by_pkeys=["cve"]) as batch:
+            for k in keys:
+                batch.put_item(Item={"cve": k, "job": job, "shard": shard})
+        return {"keys": len(keys)}
+
+    run_shards(leases, process, poll_seconds=1)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--endpoint", default=os.getenv("DDB_ENDPOINT", "http://localhost:8000"))
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--shards", type=int, default=16)
+    ap.add_argument("--keys", type=int, default=20000)
+    ap.add_argument("--shard-ms", type=float, default=300)
+    ap.add_argument("--lease-seconds", type=int, default=5)
+    ap.add_argument("--table", default="bench_shard_items")
+    ap.add_argument("--crash", action="store_true")
+    args = ap.parse_args()
+
+    from common.leases import DONE, ShardLeases
+    job = f"bench-{int(time.time())}"
+    t0 = time.perf_counter()
+    procs = [mp.Process(target=worker, args=(args, job, i)) for i in range(args.workers)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - t0
+
+    ddb = _ddb(args.endpoint)
+    status = ShardLeases(ddb, job, args.shards, worker_id="bench-check").status()
+    done = sum(1 for s in status if s.get("state") == DONE)
+    owners = {}
+    for s in status:
+        owners[s.get("owner")] = owners.get(s.get("owner"), 0) + 1
+    written = 0
+    scan = {"FilterExpression": "#job = :j", "ExpressionAttributeNames": {"#job": "job"},
+            "ExpressionAttributeValues": {":j": job}, "Select": "COUNT"}
+    table = ddb.Table(args.table)
+    while True:
+        resp = table.scan(**scan)
+        written += resp["Count"]
+        if "LastEvaluatedKey" not in resp:
+            break
+        scan["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    assert done == args.shards, f"only {done}/{args.shards} shards done"
+    assert written == args.keys, f"{written} items written, expected {args.keys}"
+    serial = args.shards * args.shard_ms / 1000
+    print(f"RESULT workers={args.workers} shards={args.shards} done={done} items={written} "
+          f"elapsed={elapsed:.1f}s (serial sleep alone {serial:.1f}s) shards per owner={owners}")
+
+if __name__ == "__main__":
+    main()
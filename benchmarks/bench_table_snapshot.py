@@ -0,0 +1,67 @@
+# bench_table_snapshot.py
+"""
+Parquet snapshot export and restore throughput (common/table_snapshot.py).
+
+    python benchmarks/bench_table_snapshot.py [--endpoint http://localhost:8000] [--items 20000]
+                                              [--segments 8] [--workers 8] [--backend sync]
+
+Fills a scratch epss-shaped table, exports it with a parallel scan, restores
+the snapshot into a second scratch table and checks the item count. Also
+prints the snapshot size next to the raw JSON size of the same items.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from common import table_snapshot
+from common.aws import get_or_create_table, get_resource
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--endpoint", default=os.getenv("DDB_ENDPOINT", "http://localhost:8000"))
+    ap.add_argument("--items", type=int, default=20000)
+    ap.add_argument("--segments", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--backend", default="sync")
+    args = ap.parse_args()
+
+    ddb = get_resource("dynamodb", region_name="us-east-1", endpoint_url=args.endpoint,
+                       aws_access_key_id="dummy", aws_secret_access_key="dummy")
+    # point the epss feed at a scratch table for the run
+    source = f"bench_snapshot_{int(time.time())}"
+    table_snapshot.FEED_TABLES = {"epss": (source, "cve")}
+    table = get_or_create_table(ddb, source, "cve")
+    rows = [{"cve": f"CVE-2024-{i:06d}", "epss": Decimal(i % 1000) / 1000, "percentile": Decimal("0.5"),
+             "date": "2024-06-01"} for i in range(args.items)]
+    with table.batch_writer() as batch:
+        for row in rows:
+            batch.put_item(Item=row)
+
+    out = tempfile.mkdtemp(prefix="snapshot_")
+    cfg = {"DDB_ENDPOINT": args.endpoint, "SEGMENTS": args.segments, "WORKERS": args.workers}
+    try:
+        t0 = time.perf_counter()
+        table_snapshot.export_tables(out, None, cfg)
+        t1 = time.perf_counter()
+        written = table_snapshot.import_tables(out, None, prefix="restored_", backend=args.backend, config=cfg)
+        t2 = time.perf_counter()
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(out) for f in files)
+        raw = len(json.dumps(rows, default=str))
+        assert written["restored_" + source] == args.items, written
+        print(f"RESULT items={args.items} segments={args.segments} workers={args.workers} backend={args.backend}  "
+              f"export {t1 - t0:.2f}s ({args.items / (t1 - t0):.0f}/s)  import {t2 - t1:.2f}s "
+              f"({args.items / (t2 - t1):.0f}/s)  snapshot {size / 1024:.0f} KiB vs JSON {raw / 1024:.0f} KiB")
+    finally:
+        shutil.rmtree(out, ignore_errors=True)
+        table.delete()
+        ddb.Table("restored_" + source).delete()
+
+if __name__ == "__main__":
+    main()
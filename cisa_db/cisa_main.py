@@ -2,6 +2,7 @@
 from extract import download_raw_json
 from transform import transform_json
 from load import sync_today_with_dynamodb
+from common.profiling import Profiler
 import os
 
 RAW_JSON_URL = "https://www.cisa.gov/sites/default/files/feeds/known_exploited_vulnerabilities.json"
@@ -21,23 +22,29 @@ CISA_CONFIG = {
 }
 
 def main():
+    # profiling: PIPELINE_PROFILE=cprofile|sample or --profile[=sample]; artifacts go to DAILY_DIR
+    prof = Profiler.from_env("cisa", DAILY_DIR)
+
     # 1) extract
     try:
-        raw_path = download_raw_json(RAW_JSON_URL, DAILY_DIR)
+        with prof.stage("extract"):
+            raw_path = download_raw_json(RAW_JSON_URL, DAILY_DIR)
     except Exception as e:
         print(f"❌ Download failed: {e}")
         return
 
     # 2) transform (normalize fields we need)
     try:
-        transformed_path = transform_json(raw_path)
+        with prof.stage("transform"):
+            transformed_path = transform_json(raw_path)
     except Exception as e:
         print(f"❌ Transformation failed: {e}")
         return
 
     # 3) load/sync
     try:
-        res = sync_today_with_dynamodb(transformed_path, config=CISA_CONFIG)
+        with prof.stage("load"):
+            res = sync_today_with_dynamodb(transformed_path, config=CISA_CONFIG)
         print("✅ Sync result:", res)
     except Exception as e:
         print(f"❌ Load/sync failed: {e}")
@@ -1,21 +1,45 @@
 # load_cisa.py
 import os
+import sys
 import json
 import time
 import math
-import boto3
 from decimal import Decimal
-from botocore.exceptions import ClientError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.compression import compress_item, decompress_item, compression_settings
+from common.hashing import record_hashes, resolve_algorithm
+from common.aws import get_or_create_table, get_resource
+from common.changelog import INSERT, RESTORE, UPDATE, changed_fields, open_changelog
+from common.ddb_io import item_io, progress_printer
+from common.mirror import DEFAULT_MIRROR_DB, apply_run
+from common.indexes import index_attributes, table_indexes
+from common.profiling import profiled_entry
 
 # Default config (can be overridden by caller)
 DEFAULT_CONFIG = {
     "TABLE_NAME": "cisa_data",
     "DDB_ENDPOINT": "http://localhost:8000",
     "AWS_REGION": "us-east-1",
+    "MAX_POOL_CONNECTIONS": 32,  # botocore pool size (default would be 10)
+    "DDB_BACKEND": os.getenv("CISA_DDB_BACKEND"),  # "sync" | "async" (aiobotocore); None -> DDB_BACKEND env
+    "DDB_ASYNC_CONCURRENCY": 64,  # in-flight batch requests with the async backend
     "PROJECT_ROOT": r"C:\Users\ShivamChopra\Projects\vuln\metasploit_db",  # will be overridden by caller
     "DAILY_DIR": None,  # resolved relative to PROJECT_ROOT if None
     "BASELINE_FILENAME": "cisa_extract.json",
-    "BATCH_PROGRESS_SIZE": 25
+    "BATCH_PROGRESS_SIZE": 25,
+    # opt-in: large text attributes stored as compressed Binary (empty list = disabled)
+    "COMPRESS_FIELDS": [],  # e.g. ["shortDescription", "notes"]
+    "COMPRESS_CODEC": "zlib",  # "zlib" or "zstd"
+    "COMPRESS_MIN_BYTES": 512,
+    # content hash for baseline change detection: "blake2b", "xxh3" (needs xxhash) or "sha256"
+    "HASH_ALGORITHM": "blake2b",
+    # change log (NDJSON segments) of each run's inserts/updates/restores; None -> DAILY_DIR/changelog, "" -> off
+    "CHANGELOG_DIR": None,
+    "CHANGELOG_SEGMENT_MB": 64,
+    "CHANGELOG_INCLUDE_ITEMS": False,
+    # local SQLite query mirror updated with each run's written rows (common/mirror.py); "" -> off
+    "MIRROR_DB": DEFAULT_MIRROR_DB,
 }
 
 def _resolve_config(user_config):
@@ -25,28 +49,18 @@ def _resolve_config(user_config):
     if not cfg["DAILY_DIR"]:
         cfg["DAILY_DIR"] = os.path.join(cfg["PROJECT_ROOT"], "daily_extract")
     cfg["BASELINE_FILE"] = os.path.join(cfg["DAILY_DIR"], cfg["BASELINE_FILENAME"])
+    if cfg["CHANGELOG_DIR"] is None:
+        cfg["CHANGELOG_DIR"] = os.path.join(cfg["DAILY_DIR"], "changelog")
     return cfg
 
 def get_dynamodb_table(cfg):
-    ddb = boto3.resource(
+    ddb = get_resource(
         "dynamodb",
         region_name=cfg["AWS_REGION"],
-        aws_access_key_id="dummy",
-        aws_secret_access_key="dummy",
         endpoint_url=cfg["DDB_ENDPOINT"],
+        pool_size=cfg.get("MAX_POOL_CONNECTIONS"),
     )
-    existing = ddb.meta.client.list_tables().get("TableNames", [])
-    if cfg["TABLE_NAME"] not in existing:
-        print(f"⚡ Creating DynamoDB table '{cfg['TABLE_NAME']}' locally...")
-        table = ddb.create_table(
-            TableName=cfg["TABLE_NAME"],
-            KeySchema=[{"AttributeName": "cveID", "KeyType": "HASH"}],
-            AttributeDefinitions=[{"AttributeName": "cveID", "AttributeType": "S"}],
-            ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5}
-        )
-        table.meta.client.get_waiter("table_exists").wait(TableName=cfg["TABLE_NAME"])
-        print("✅ Table created.")
-    return ddb.Table(cfg["TABLE_NAME"])
+    return get_or_create_table(ddb, cfg["TABLE_NAME"], "cveID", indexes=table_indexes("cisa"))
 
 def remove_dated_jsons_keep_baseline(daily_dir, baseline_file):
     """Delete dated JSON files except baseline_file (and any other .json that is not baseline)."""
@@ -87,6 +101,7 @@ def items_equal(rec_a, rec_b):
             return False
     return True
 
+@profiled_entry("cisa", "load")
 def sync_today_with_dynamodb(current_json_path: str, config: dict = None):
     """
     Sync the transformed CISA JSON (list of records) with DynamoDB.
@@ -101,6 +116,7 @@ def sync_today_with_dynamodb(current_json_path: str, config: dict = None):
     BASELINE_FILE = cfg["BASELINE_FILE"]
     TABLE_NAME = cfg["TABLE_NAME"]
     batch_size = cfg["BATCH_PROGRESS_SIZE"]
+    compress_fields, compress_codec, compress_min = compression_settings(cfg)
 
     os.makedirs(DAILY_DIR, exist_ok=True)
     table = get_dynamodb_table(cfg)
@@ -119,30 +135,24 @@ def sync_today_with_dynamodb(current_json_path: str, config: dict = None):
     else:
         print("ℹ️ No baseline found (first run)")
 
-    # compute changed_ids (new or differing vs baseline)
-    changed_ids = []
-    for cid, rec in current_map.items():
-        base_rec = baseline_map.get(cid)
-        if base_rec is None:
-            changed_ids.append(cid)
-        else:
-            if not items_equal(rec, base_rec):
-                changed_ids.append(cid)
+    # compute changed_ids (new or differing vs baseline) by content hash; 'uploaded_date' is meta
+    hash_algorithm = resolve_algorithm(cfg["HASH_ALGORITHM"])
+    hash_fields = sorted({k for rec in current_map.values() for k in rec} - {"uploaded_date"})
+    current_hashes = dict(zip(current_map, record_hashes(current_map.values(), hash_fields, hash_algorithm)))
+    in_both = [cid for cid in current_map if cid in baseline_map]
+    baseline_hashes = dict(zip(in_both, record_hashes((baseline_map[c] for c in in_both), hash_fields, hash_algorithm)))
+    changed_ids = [cid for cid in current_map if baseline_hashes.get(cid) != current_hashes[cid]]
 
     # also check baseline ids missing from DDB (re-add accidental deletions)
+    ddb_io = item_io(table, "cveID", cfg.get("DDB_BACKEND"), cfg.get("DDB_ASYNC_CONCURRENCY"))
     missing_in_ddb = []
     if baseline_exists:
-        for cid in baseline_map.keys():
-            try:
-                resp = table.get_item(Key={"cveID": cid})
-                if "Item" not in resp:
-                    missing_in_ddb.append(cid)
-            except ClientError:
-                missing_in_ddb.append(cid)
+        # batched reads; ids that could not be fetched count as missing
+        present = ddb_io.get_many(baseline_map.keys(), attributes=["cveID"])
+        missing_in_ddb = [cid for cid in baseline_map if cid not in present]
     # combine
-    for mid in missing_in_ddb:
-        if mid not in changed_ids:
-            changed_ids.append(mid)
+    changed = set(changed_ids)
+    changed_ids.extend(cid for cid in missing_in_ddb if cid not in changed)
 
     if not changed_ids:
         print("✅ No new/updated records and no missing baseline items in DynamoDB.")
@@ -151,17 +161,13 @@ def sync_today_with_dynamodb(current_json_path: str, config: dict = None):
 
     # Prepare writes: for each changed_id compare with DDB item and only write if different or missing
     to_write = []
+    existing = ddb_io.get_many(changed_ids)
     for cid in changed_ids:
         rec = current_map.get(cid) or baseline_map.get(cid)
         if rec is None:
             continue
-        # fetch existing DDB item
-        try:
-            resp = table.get_item(Key={"cveID": cid})
-            ddb_item = resp.get("Item")
-        except ClientError as e:
-            print(f"⚠️ Warning fetching cveID={cid} from DDB: {e}")
-            ddb_item = None
+        # existing DDB item (None if missing or not fetched)
+        ddb_item = decompress_item(existing.get(cid))
 
         if ddb_item is None:
             to_write.append(rec)
@@ -173,10 +179,11 @@ def sync_today_with_dynamodb(current_json_path: str, config: dict = None):
 
     # Batch write to DynamoDB in manageable chunks
     uploaded = 0
+    written = []
     if to_write:
-        print(f"⬆️ Writing {len(to_write)} items to DynamoDB...")
-        # batch_writer can accept dicts directly; ensure no empty strings etc.
-        with table.batch_writer(overwrite_by_pkeys=["cveID"]) as batch:
+        print(f"⬆️ Writing {len(to_write)} items to DynamoDB ({ddb_io.name} backend)...")
+
+        def safe_items():
             for rec in to_write:
                 # clean item: remove empty strings
                 safe_item = {}
@@ -186,16 +193,33 @@ def sync_today_with_dynamodb(current_json_path: str, config: dict = None):
                     else:
                         safe_item[k] = v
                 safe_item["cveID"] = str(safe_item["cveID"])
-                try:
-                    batch.put_item(Item=safe_item)
-                    uploaded += 1
-                except ClientError as e:
-                    print(f"❌ Failed to write cveID={safe_item.get('cveID')}: {e}")
-                if uploaded % batch_size == 0 or uploaded == len(to_write):
-                    print(f"⬆️ Uploaded {uploaded}/{len(to_write)}")
+                safe_item.update(index_attributes("cisa", safe_item))  # GSI keys (dateAdded / dueDate / vendor)
+                yield compress_item(safe_item, compress_fields, compress_codec, compress_min)
+
+        progress = progress_printer(batch_size, len(to_write), "⬆️ Uploaded {}/{}")
+        uploaded = ddb_io.put_many(safe_items(), progress, written.extend)
     else:
         print("ℹ️ Nothing to write to DynamoDB.")
 
+    # Change log: every changed/restored id except those whose write failed
+    changelog = open_changelog(cfg["CHANGELOG_DIR"], "cisa", cfg)
+    if changelog:
+        failed = {str(rec["cveID"]) for rec in to_write} - set(written)
+        for cid in changed_ids:
+            rec = current_map.get(cid) or baseline_map.get(cid)
+            if rec is None or cid in failed:
+                continue
+            if cid not in baseline_map:
+                changelog.append(INSERT, cid, current_hashes.get(cid), item=rec)
+            elif cid in current_map and baseline_hashes.get(cid) != current_hashes[cid]:
+                changelog.append(UPDATE, cid, current_hashes[cid], changed_fields(baseline_map[cid], rec), item=rec)
+            else:
+                changelog.append(RESTORE, cid, current_hashes.get(cid), item=rec)
+        changelog.commit({"uploaded": uploaded, "total_current": total_current})
+
+    # Local query mirror: the rows written this run, applied in one SQLite transaction
+    mirror_rows = apply_run(cfg["MIRROR_DB"], "cisa", to_write, written, changelog)
+
     # Overwrite baseline with current authoritative data (atomic replace)
     try:
         abs_in = os.path.abspath(current_json_path)
@@ -219,6 +243,8 @@ def sync_today_with_dynamodb(current_json_path: str, config: dict = None):
         "changed_ids_considered": len(changed_ids),
         "to_write": len(to_write),
         "uploaded": uploaded,
+        "changelog_entries": changelog.count if changelog else 0,
+        "mirror_rows": mirror_rows,
         "baseline_file": BASELINE_FILE,
         "table": TABLE_NAME
     }
@@ -2,8 +2,12 @@
 import json
 import os
 import re
+import sys
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.cve import CVE_RE
+
 # Fields required in output (exact names requested)
 OUTPUT_FIELDS = [
     "cveID",
@@ -19,16 +23,68 @@ OUTPUT_FIELDS = [
     "cwes"
 ]
 
+# Output field -> accepted source keys, in lookup order (exact match, then case-insensitive)
+FIELD_ALIASES = {
+    "cveID": ("cveID", "cve", "vulnerabilityID", "cveId"),
+    "vendorProject": ("vendorProject", "vendor", "vendor_project", "vendorName"),
+    "product": ("product", "productName", "products"),
+    "vulnerabilityName": ("vulnerabilityName", "vulnerability_name", "vulnName"),
+    "dateAdded": ("dateAdded", "date_added", "datePublished"),
+    "shortDescription": ("shortDescription", "short_description"),
+    "requiredAction": ("requiredAction", "required_action"),
+    "dueDate": ("dueDate", "due_date"),
+    "knownRansomwareCampaignUse": ("knownRansomwareCampaignUse",),
+    "notes": ("notes", "note", "reference"),
+    "cwes": ("cwes", "cwe"),
+}
+# cap on distinct key layouts cached per batch; beyond it entries are resolved individually
+MAX_CACHED_LAYOUTS = 256
+
 CLEAN_WS = re.compile(r"\s+")
 
 def _clean_text(x):
     if x is None:
         return None
-    s = str(x)
-    s = s.replace("\r", " ").replace("\n", " ")
-    s = CLEAN_WS.sub(" ", s).strip()
+    # str.split() splits on exactly the characters \s matches, so this equals
+    # CLEAN_WS.sub(" ", s).strip() (including \r / \n) without the regex
+    s = " ".join(str(x).split())
     return s if s != "" else None
 
+def _resolve_source_keys(keys):
+    """
+    Build the (output field, source key) plan for one entry key layout.
+    Same precedence as a per-entry lookup: for each alias, exact key first,
+    then the first key that matches case-insensitively.
+    """
+    key_set = set(keys)
+    lower = {}
+    for k in keys:
+        lower.setdefault(k.lower(), k)
+    plan = []
+    for field, aliases in FIELD_ALIASES.items():
+        src = None
+        for alias in aliases:
+            if alias in key_set:
+                src = alias
+                break
+            src = lower.get(alias.lower())
+            if src is not None:
+                break
+        plan.append((field, src))
+    return tuple(plan)
+
+def _find_cve_in_entry(e):
+    """Slow path for entries without a cveID field: first CVE-like string in any value."""
+    for v in e.values():
+        try:
+            s = json.dumps(v)
+        except Exception:
+            s = str(v)
+        m = CVE_RE.search(s)
+        if m:
+            return m.group(0).upper()
+    return None
+
 def _extract_entries_from_cisa_raw(raw_obj):
     """
     Accepts the downloaded JSON object and returns a list of normalized dicts
@@ -67,55 +123,28 @@ def _extract_entries_from_cisa_raw(raw_obj):
                 return cand
         return []
 
-    # Now normalize each entry to the OUTPUT_FIELDS
+    # Now normalize each entry to the OUTPUT_FIELDS.
+    # The feed is almost always uniform, so the alias -> source key plan is
+    # resolved once per distinct key layout instead of once per field per entry.
+    plans = {}
     normalized = []
     for e in entries:
         if not isinstance(e, dict):
             continue
-        # common field names used by CISA feed:
-        # cveID or cveID (sometimes 'cveID' exact), vendorProject, product, vulnerabilityName, dateAdded,
-        # shortDescription, requiredAction, dueDate, knownRansomwareCampaignUse, notes, cwes
-        # Use flexible lookups
-        def getf(*keys):
-            for k in keys:
-                if k in e:
-                    return e[k]
-                # case-insensitive fallback
-                for ek in e.keys():
-                    if ek.lower() == k.lower():
-                        return e[ek]
-            return None
-
-        rec = {
-            "cveID": _clean_text(getf("cveID", "cve", "vulnerabilityID", "cveId")),
-            "vendorProject": _clean_text(getf("vendorProject", "vendor", "vendor_project", "vendorName")),
-            "product": _clean_text(getf("product", "productName", "products")),
-            "vulnerabilityName": _clean_text(getf("vulnerabilityName", "vulnerability_name", "vulnName", "vulnerabilityName")),
-            "dateAdded": _clean_text(getf("dateAdded", "date_added", "datePublished", "dateAdded")),
-            "shortDescription": _clean_text(getf("shortDescription", "short_description", "shortDescription")),
-            "requiredAction": _clean_text(getf("requiredAction", "required_action", "requiredAction")),
-            "dueDate": _clean_text(getf("dueDate", "due_date", "dueDate")),
-            "knownRansomwareCampaignUse": _clean_text(getf("knownRansomwareCampaignUse", "knownRansomwareCampaignUse")),
-            "notes": _clean_text(getf("notes", "note", "reference")),
-            "cwes": _clean_text(getf("cwes", "cwe"))
-        }
+        layout = tuple(e)
+        plan = plans.get(layout)
+        if plan is None:
+            plan = _resolve_source_keys(layout)
+            if len(plans) < MAX_CACHED_LAYOUTS:
+                plans[layout] = plan
+
+        rec = {field: (_clean_text(e[src]) if src is not None else None) for field, src in plan}
 
         # Ensure we have a cveID — if missing, skip record (can't be keyed)
         if not rec["cveID"]:
             # sometimes feed uses 'cveID' as list inside 'cveID' object; try other strategies
             # try scanning full entry for a CVE-like string
-            import re
-            CVE_RE = re.compile(r"CVE-\d{4}-\d{4,7}", flags=re.IGNORECASE)
-            found = None
-            for v in e.values():
-                try:
-                    s = json.dumps(v)
-                except Exception:
-                    s = str(v)
-                m = CVE_RE.search(s)
-                if m:
-                    found = m.group(0).upper()
-                    break
+            found = _find_cve_in_entry(e)
             if found:
                 rec["cveID"] = found
             else:
@@ -0,0 +1,100 @@
+# array_file.py
+"""
+Single-file container for numpy arrays that is read through a memory map.
+
+    magic (8 bytes) | header length (uint64 LE) | JSON header | arrays, each 8-byte aligned
+
+The header holds the caller's metadata, a format number and
+{"arrays": {name: [dtype, offset, count]}}. Opening a file maps it and builds
+array views without reading the data. Files are written to a temp name and
+renamed, so readers holding the old mapping are never disturbed.
+
+Used by the derived indexes next to the mirror (common/text_search.py,
+common/misp_graph.py). Strings are stored CSR-style: utf-8 bytes plus an
+offsets array (Strings).
+"""
+import os
+import json
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+ALIGN = 8
+HEADER_SLACK = 256  # room for the offsets growing by a few digits between the two header passes
+
+def write_arrays(path: str, magic: bytes, fmt: int, arrays: Dict[str, np.ndarray], meta: dict):
+    layout, offset = {}, 0
+    for name, arr in arrays.items():
+        layout[name] = [arr.dtype.str, offset, int(arr.size)]
+        offset += -(-arr.nbytes // ALIGN) * ALIGN
+    # header size depends on the absolute offsets, which depend on the header size: pad to a fixed width
+    header = json.dumps({"format": fmt, **meta, "arrays": layout}).encode("utf-8")
+    base = -(-(len(magic) + 8 + len(header) + HEADER_SLACK) // ALIGN) * ALIGN
+    for entry in layout.values():
+        entry[1] += base
+    header = json.dumps({"format": fmt, **meta, "arrays": layout}).encode("utf-8")
+    header += b" " * (base - len(magic) - 8 - len(header))
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, "wb") as f:
+        f.write(magic + np.array([len(header)], dtype="<u8").tobytes() + header)
+        for arr in arrays.values():
+            f.write(np.ascontiguousarray(arr).tobytes())
+            f.write(b"\0" * (-arr.nbytes % ALIGN))
+    os.replace(tmp, path)
+
+def map_arrays(path: str, magic: bytes, fmt: int) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """(header, {name: read-only array view}) of a file written by write_arrays."""
+    buf = np.memmap(path, dtype=np.uint8, mode="r")
+    if buf[:len(magic)].tobytes() != magic:
+        raise ValueError(f"{path} is not a {magic.decode('ascii', 'replace')} file")
+    start = len(magic) + 8
+    header_len = int(buf[len(magic):start].view("<u8")[0])
+    header = json.loads(buf[start:start + header_len].tobytes())
+    if header.get("format") != fmt:
+        raise ValueError(f"{path}: unsupported format {header.get('format')}")
+    arrays = {}
+    for name, (dtype, offset, count) in header["arrays"].items():
+        arrays[name] = buf[offset:offset + count * np.dtype(dtype).itemsize].view(dtype)
+    return header, arrays
+
+def csr_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """(utf-8 bytes, int64 offsets) for a list of strings."""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+class Strings:
+    """Sequence view of CSR strings (bisect works on it without decoding everything)."""
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data, self.offsets = data, offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i) -> bytes:
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+    def str(self, i) -> str:
+        return self[i].decode("utf-8")
+
+    def decode_all(self) -> List[str]:
+        raw, o = self.data.tobytes(), self.offsets.tolist()
+        return [raw[o[i]:o[i + 1]].decode("utf-8") for i in range(len(o) - 1)]
+
+class ReloadingFile:
+    """Opens path with opener and re-opens it when the file is replaced (one stat per get())."""
+    def __init__(self, path: str, opener: Callable):
+        self.path, self.opener = path, opener
+        self._obj, self._stamp = None, None
+
+    def get(self) -> Optional[object]:
+        """The opened file, or None while it does not exist."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp != self._stamp:
+            self._obj, self._stamp = self.opener(self.path), stamp
+        return self._obj
@@ -0,0 +1,215 @@
+# aws.py
+"""
+Shared boto3 sessions, clients and resources for the loaders.
+
+Creating a boto3 resource per run (or per call) builds a fresh session and a
+new connection pool every time. This module keeps one session per credential
+set and caches clients/resources by (service, region, endpoint, credentials,
+pool size). Their botocore Config sizes the connection pool to the caller's
+concurrency (botocore's default is 10) and turns on TCP keep-alive.
+
+Table existence is checked with describe_table once per process and cached.
+This replaces list_tables() on every run, which also only sees the first 100
+tables. Global secondary indexes passed to get_or_create_table are created
+with the table, or added to an existing table that lacks them; a table is
+only cached once all of its requested indexes exist.
+
+Clients are thread-safe and can be shared by worker threads. Resources are
+not, so threads should use resource.meta.client, or one Table object each.
+
+Credentials (resolve_credentials, applied by get_client / get_resource): keys
+passed explicitly win; otherwise boto3's default chain (env, profile, role).
+Only against an endpoint override (DynamoDB Local, a local S3 stand-in) with
+nothing in the chain are dummy keys used, since those endpoints accept any.
+"""
+import os
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+DEFAULT_POOL_SIZE = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "32"))
+DEFAULT_RETRIES = {"max_attempts": 5, "mode": "adaptive"}
+
+_lock = threading.Lock()
+_sessions: Dict[tuple, boto3.session.Session] = {}
+_clients: Dict[tuple, object] = {}
+_resources: Dict[tuple, object] = {}
+_known_tables = set()
+_chain_has_credentials = None
+LOCAL_DUMMY_KEY = "dummy"
+
+def client_config(pool_size: Optional[int] = None, **extra) -> Config:
+    """botocore Config with a pool sized for pool_size concurrent calls and keep-alive on."""
+    return Config(max_pool_connections=max(1, int(pool_size or DEFAULT_POOL_SIZE)),
+                  tcp_keepalive=True, retries=dict(DEFAULT_RETRIES), **extra)
+
+def get_session(aws_access_key_id=None, aws_secret_access_key=None, region_name=None) -> boto3.session.Session:
+    key = (aws_access_key_id, aws_secret_access_key, region_name)
+    with _lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = boto3.session.Session(aws_access_key_id=aws_access_key_id,
+                                            aws_secret_access_key=aws_secret_access_key,
+                                            region_name=region_name)
+            _sessions[key] = session
+        return session
+
+def _default_chain_has_credentials() -> bool:
+    global _chain_has_credentials
+    if _chain_has_credentials is None:
+        _chain_has_credentials = boto3.session.Session().get_credentials() is not None
+    return _chain_has_credentials
+
+def resolve_credentials(endpoint_url=None, aws_access_key_id=None,
+                        aws_secret_access_key=None) -> Tuple[Optional[str], Optional[str]]:
+    """(key, secret) to build a session with; (None, None) means boto3's default chain."""
+    if aws_access_key_id or not endpoint_url or _default_chain_has_credentials():
+        return aws_access_key_id, aws_secret_access_key
+    return LOCAL_DUMMY_KEY, LOCAL_DUMMY_KEY
+
+def client_credentials(client) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """(key, secret, token) a boto3 client signs with, e.g. to build a matching aiobotocore client."""
+    creds = client._get_credentials()  # botocore has no public accessor
+    if creds is None:
+        return None, None, None
+    frozen = creds.get_frozen_credentials()
+    return frozen.access_key, frozen.secret_key, frozen.token
+
+def _cache_key(service, region_name, endpoint_url, aws_access_key_id, aws_secret_access_key, pool_size):
+    return (service, region_name, endpoint_url, aws_access_key_id, aws_secret_access_key,
+            int(pool_size or DEFAULT_POOL_SIZE))
+
+def get_client(service: str, region_name=None, endpoint_url=None, aws_access_key_id=None,
+               aws_secret_access_key=None, pool_size: Optional[int] = None):
+    aws_access_key_id, aws_secret_access_key = resolve_credentials(endpoint_url, aws_access_key_id,
+                                                                   aws_secret_access_key)
+    key = _cache_key(service, region_name, endpoint_url, aws_access_key_id, aws_secret_access_key, pool_size)
+    session = get_session(aws_access_key_id, aws_secret_access_key, region_name)
+    with _lock:
+        # session.client() itself is not thread-safe, so creation stays under the lock
+        client = _clients.get(key)
+        if client is None:
+            client = session.client(service, endpoint_url=endpoint_url, config=client_config(pool_size))
+            _clients[key] = client
+        return client
+
+def get_resource(service: str, region_name=None, endpoint_url=None, aws_access_key_id=None,
+                 aws_secret_access_key=None, pool_size: Optional[int] = None):
+    aws_access_key_id, aws_secret_access_key = resolve_credentials(endpoint_url, aws_access_key_id,
+                                                                   aws_secret_access_key)
+    key = _cache_key(service, region_name, endpoint_url, aws_access_key_id, aws_secret_access_key, pool_size)
+    session = get_session(aws_access_key_id, aws_secret_access_key, region_name)
+    with _lock:
+        resource = _resources.get(key)
+        if resource is None:
+            resource = session.resource(service, endpoint_url=endpoint_url, config=client_config(pool_size))
+            _resources[key] = resource
+        return resource
+
+def _gsi_definition(name: str, hash_key: str, range_key: Optional[str], read_capacity: int, write_capacity: int) -> dict:
+    schema = [{"AttributeName": hash_key, "KeyType": "HASH"}]
+    if range_key:
+        schema.append({"AttributeName": range_key, "KeyType": "RANGE"})
+    return {"IndexName": name, "KeySchema": schema, "Projection": {"ProjectionType": "ALL"},
+            "ProvisionedThroughput": {"ReadCapacityUnits": read_capacity, "WriteCapacityUnits": write_capacity}}
+
+def _index_attribute_definitions(indexes) -> List[dict]:
+    names = dict.fromkeys(a for _, h, r in indexes for a in (h, r) if a)
+    return [{"AttributeName": a, "AttributeType": "S"} for a in names]
+
+def _wait_index_active(client, table_name: str, index_name: str, timeout: float = 900):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        table = client.describe_table(TableName=table_name)["Table"]
+        status = {g["IndexName"]: g.get("IndexStatus") for g in table.get("GlobalSecondaryIndexes", [])}
+        if status.get(index_name) == "ACTIVE":
+            return
+        time.sleep(2)
+    raise TimeoutError(f"index {index_name} of {table_name} not active after {timeout:.0f}s")
+
+def ensure_indexes(client, table_name: str, indexes, existing: Optional[dict] = None,
+                   read_capacity: int = 5, write_capacity: int = 5) -> bool:
+    """
+    Add the GSIs in indexes [(name, hash attr, range attr)] missing from an existing table, one at a time.
+    Returns False if any could not be added now (another index update in progress, or the GSI limit).
+    """
+    table = existing or client.describe_table(TableName=table_name)["Table"]
+    present = {g["IndexName"] for g in table.get("GlobalSecondaryIndexes", [])}
+    complete = True
+    for name, hash_key, range_key in indexes:
+        if name in present:
+            continue
+        print(f"⚡ Adding index '{name}' to '{table_name}' (backfilled by DynamoDB)...")
+        kwargs = {"TableName": table_name,
+                  "AttributeDefinitions": _index_attribute_definitions([(name, hash_key, range_key)]),
+                  "GlobalSecondaryIndexUpdates": [{"Create": _gsi_definition(name, hash_key, range_key,
+                                                                              read_capacity, write_capacity)}]}
+        if table.get("BillingModeSummary", {}).get("BillingMode") == "PAY_PER_REQUEST":
+            kwargs["GlobalSecondaryIndexUpdates"][0]["Create"].pop("ProvisionedThroughput")
+        try:
+            client.update_table(**kwargs)
+        except ClientError as e:
+            # another worker is adding it (or another index) right now
+            if e.response.get("Error", {}).get("Code") not in ("ResourceInUseException", "LimitExceededException"):
+                raise
+            print(f"⚠️ Could not add index '{name}' now: {e}")
+            complete = False
+            continue
+        # only one index can be created per UpdateTable, and the next must wait for it
+        _wait_index_active(client, table_name, name)
+        print(f"✅ Index '{name}' active.")
+    return complete
+
+def get_or_create_table(ddb_resource, table_name: str, hash_key: str, key_type: str = "S",
+                        read_capacity: int = 5, write_capacity: int = 5, indexes=None):
+    """
+    Table handle, creating the table (single hash key) if missing; existence is cached per endpoint.
+    indexes: [(index name, hash attribute, range attribute or None)] string-keyed GSIs
+    (projection ALL), created with the table or added to an existing one.
+    """
+    client = ddb_resource.meta.client
+    cache_key = (client.meta.endpoint_url, client.meta.region_name, table_name)
+    if cache_key in _known_tables:
+        return ddb_resource.Table(table_name)
+    indexes = list(indexes or [])
+    try:
+        existing = client.describe_table(TableName=table_name)["Table"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ResourceNotFoundException":
+            raise
+        existing = None
+        print(f"⚡ Creating DynamoDB table '{table_name}'...")
+        kwargs = {}
+        if indexes:
+            kwargs["GlobalSecondaryIndexes"] = [_gsi_definition(n, h, r, read_capacity, write_capacity)
+                                                for n, h, r in indexes]
+        try:
+            ddb_resource.create_table(
+                TableName=table_name,
+                KeySchema=[{"AttributeName": hash_key, "KeyType": "HASH"}],
+                AttributeDefinitions=[{"AttributeName": hash_key, "AttributeType": key_type}]
+                + _index_attribute_definitions(indexes),
+                ProvisionedThroughput={"ReadCapacityUnits": read_capacity, "WriteCapacityUnits": write_capacity},
+                **kwargs,
+            )
+        except ClientError as e:
+            # another worker created it between our describe and create
+            if e.response.get("Error", {}).get("Code") != "ResourceInUseException":
+                raise
+        client.get_waiter("table_exists").wait(TableName=table_name)
+        print("✅ Table created.")
+    if existing is not None and indexes:
+        if not ensure_indexes(client, table_name, indexes, existing, read_capacity, write_capacity):
+            # not cached, so the next call retries the missing indexes
+            return ddb_resource.Table(table_name)
+    _known_tables.add(cache_key)
+    return ddb_resource.Table(table_name)
+
+def forget_table(ddb_resource, table_name: str):
+    """Drop a cached existence check (e.g. after deleting the table)."""
+    client = ddb_resource.meta.client
+    _known_tables.discard((client.meta.endpoint_url, client.meta.region_name, table_name))
@@ -0,0 +1,281 @@
+# changelog.py
+"""
+Append-only change log (CDC) of per-run record deltas, as rotated NDJSON segments.
+
+Each loader run appends one line per changed record, then a commit line:
+
+    {"seq": 42, "run": "cisa-20250101T060000-1234", "ts": "...", "feed": "cisa",
+     "op": "insert" | "update" | "restore", "key": "CVE-2025-0001",
+     "hash": "b2:...", "changed": ["dueDate", "notes"], "item": {...}}
+    {"seq": 43, "run": "...", "op": "commit", "count": 1, "summary": {...}}
+
+insert   key not in the previous baseline / table
+update   content hash changed; "changed" lists the fields that differ (when known)
+restore  baseline record missing from DynamoDB and written back unchanged
+"item" (the written record) is included only with include_items.
+
+Segments live in <directory>/<feed>/ and are named after the first seq they
+hold (00000000000000000001.ndjson, ...). A new segment is started when the
+current one exceeds max_segment_bytes; with retain_segments only the newest N
+are kept. seq increases by one per line across segments and runs, so a
+consumer only needs to remember the last seq it processed (see
+ChangeLogReader / tail). Readers skip a trailing line without a newline (a
+write in progress) and by default only release records once their run's
+commit line is present, so a crashed run is never half-applied.
+
+Entries are written after the DynamoDB writes, per logical change vs the
+previous baseline. A run that crashes before committing re-detects the same
+changes next time, so delivery is at-least-once: consumers should apply
+entries idempotently (by key).
+
+One writer per feed directory at a time (one run per feed).
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_SEGMENT_BYTES = int(float(os.getenv("CHANGELOG_SEGMENT_MB", "64")) * 1024 * 1024)
+DEFAULT_RETAIN_SEGMENTS = int(os.getenv("CHANGELOG_RETAIN_SEGMENTS", "0")) or None  # None: keep all
+INCLUDE_ITEMS = os.getenv("CHANGELOG_INCLUDE_ITEMS", "").lower() in {"1", "true", "yes"}
+
+INSERT = "insert"
+UPDATE = "update"
+RESTORE = "restore"
+COMMIT = "commit"
+
+SEGMENT_SUFFIX = ".ndjson"
+
+def changed_fields(old: Optional[dict], new: Optional[dict], ignore: Iterable[str] = ("uploaded_date",)) -> List[str]:
+    """Sorted field names whose values differ between two record versions (ignoring meta fields)."""
+    old, new = old or {}, new or {}
+    skip = set(ignore)
+    return sorted(k for k in set(old) | set(new) if k not in skip and old.get(k) != new.get(k))
+
+def _segments(feed_dir: str) -> List[str]:
+    if not os.path.isdir(feed_dir):
+        return []
+    return sorted(f for f in os.listdir(feed_dir) if f.endswith(SEGMENT_SUFFIX) and f[:-len(SEGMENT_SUFFIX)].isdigit())
+
+def _first_seq(segment: str) -> int:
+    return int(segment[:-len(SEGMENT_SUFFIX)])
+
+def _complete_lines(path: str, start: int = 0) -> Iterator[tuple]:
+    """(offset after line, parsed record) for every newline-terminated line from byte offset start."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        pos = start
+        for line in f:
+            if not line.endswith(b"\n"):
+                return  # partial write in progress
+            pos += len(line)
+            if line.strip():
+                yield pos, json.loads(line)
+
+def _json_default(v):
+    if isinstance(v, (bytes, bytearray)):
+        return None  # compressed attributes are not copied into the log
+    if isinstance(v, (set, frozenset)):
+        return sorted(v)
+    return str(v)  # Decimal and anything else
+
+class ChangeLogWriter:
+    """Appends change entries for one run of one feed; use as a context manager or call commit()."""
+    def __init__(self, directory: str, feed: str, run_id: Optional[str] = None,
+                 max_segment_bytes: int = DEFAULT_SEGMENT_BYTES, retain_segments: Optional[int] = DEFAULT_RETAIN_SEGMENTS,
+                 include_items: bool = INCLUDE_ITEMS):
+        self.feed = feed
+        self.dir = os.path.join(directory, feed)
+        self.run_id = run_id or f"{feed}-{time.strftime('%Y%m%dT%H%M%S')}-{socket.gethostname()}-{os.getpid()}"
+        self.max_segment_bytes = max(1, int(max_segment_bytes))
+        self.retain_segments = retain_segments
+        self.include_items = include_items
+        self.count = 0
+        self._f = None
+        self._size = 0
+        self._seq = self._last_seq()
+        os.makedirs(self.dir, exist_ok=True)
+
+    @property
+    def seq(self) -> int:
+        """seq of the last line written (or found on disk)."""
+        return self._seq
+
+    def _last_seq(self) -> int:
+        segments = _segments(self.dir)
+        if not segments:
+            return 0
+        last = os.path.join(self.dir, segments[-1])
+        seq = _first_seq(segments[-1]) - 1
+        size = os.path.getsize(last)
+        for pos, rec in _complete_lines(last):
+            seq = rec["seq"]
+            size = pos
+        if size != os.path.getsize(last):
+            # drop a torn last line left by a crashed writer so appends start on a line boundary
+            with open(last, "r+b") as f:
+                f.truncate(size)
+        return seq
+
+    def _segment_for_append(self):
+        if self._f is not None and self._size < self.max_segment_bytes:
+            return self._f
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        segments = _segments(self.dir)
+        path = os.path.join(self.dir, segments[-1]) if segments else None
+        if path is None or os.path.getsize(path) >= self.max_segment_bytes:
+            path = os.path.join(self.dir, f"{self._seq + 1:020d}{SEGMENT_SUFFIX}")
+            self._prune(keep_extra=1)
+        self._f = open(path, "ab")
+        self._size = self._f.tell()
+        return self._f
+
+    def _prune(self, keep_extra: int = 0):
+        if not self.retain_segments:
+            return
+        segments = _segments(self.dir)
+        # keep_extra reserves room for the segment about to be created
+        for name in segments[:max(0, len(segments) - self.retain_segments + keep_extra)]:
+            os.remove(os.path.join(self.dir, name))
+
+    def _write(self, record: dict):
+        f = self._segment_for_append()
+        self._seq += 1
+        line = json.dumps({"seq": self._seq, "run": self.run_id, "ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                           "feed": self.feed, **record}, default=_json_default, ensure_ascii=False,
+                          separators=(",", ":")).encode("utf-8") + b"\n"
+        f.write(line)
+        self._size += len(line)
+
+    def append(self, op: str, key, content_hash: Optional[str] = None, changed: Optional[List[str]] = None,
+               item: Optional[dict] = None):
+        record = {"op": op, "key": str(key)}
+        if content_hash:
+            record["hash"] = content_hash
+        if changed is not None:
+            record["changed"] = changed
+        if self.include_items and item is not None:
+            record["item"] = item
+        self._write(record)
+        self.count += 1
+
+    def commit(self, summary: Optional[dict] = None):
+        """Write the run's commit line and fsync; entries become visible to committed-only readers."""
+        self._write({"op": COMMIT, "count": self.count, **({"summary": summary} if summary else {})})
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self.close()
+        print(f"📝 Change log: {self.count} entries committed to {self.dir} (seq {self._seq})")
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # no commit line on failure: readers ignore the partial run
+        self.close()
+
+def open_changelog(directory: Optional[str], feed: str, cfg: Optional[Dict] = None) -> Optional[ChangeLogWriter]:
+    """Writer for feed under directory, or None when the change log is disabled (falsy directory)."""
+    if not directory:
+        return None
+    cfg = cfg or {}
+    segment_mb = cfg.get("CHANGELOG_SEGMENT_MB")
+    return ChangeLogWriter(directory, feed,
+                           max_segment_bytes=int(float(segment_mb) * 1024 * 1024) if segment_mb else DEFAULT_SEGMENT_BYTES,
+                           retain_segments=cfg.get("CHANGELOG_RETAIN_SEGMENTS", DEFAULT_RETAIN_SEGMENTS),
+                           include_items=bool(cfg.get("CHANGELOG_INCLUDE_ITEMS", INCLUDE_ITEMS)))
+
+class ChangeLogReader:
+    """Incremental reader over a feed's segments by seq."""
+    def __init__(self, directory: str, feed: str):
+        self.dir = os.path.join(directory, feed)
+
+    def read(self, after_seq: int = 0, committed_only: bool = True) -> Iterator[dict]:
+        """
+        Entries with seq > after_seq, in order. With committed_only, a run's
+        entries are yielded once its commit line is read (commit lines included),
+        and entries of runs that never committed are skipped.
+        """
+        segments = _segments(self.dir)
+        if segments and _first_seq(segments[0]) > after_seq + 1:
+            print(f"⚠️ Change log entries {after_seq + 1}..{_first_seq(segments[0]) - 1} of {self.dir} "
+                  f"were pruned (retention); continuing from seq {_first_seq(segments[0])}")
+        # start at the last segment whose first seq is <= after_seq + 1
+        start = 0
+        for i, name in enumerate(segments):
+            if _first_seq(name) <= after_seq + 1:
+                start = i
+        pending_run, pending = None, []
+        for name in segments[start:]:
+            for _, rec in _complete_lines(os.path.join(self.dir, name)):
+                if rec["seq"] <= after_seq:
+                    continue
+                if not committed_only:
+                    yield rec
+                    continue
+                if rec["run"] != pending_run:
+                    pending_run, pending = rec["run"], []  # a previous run without commit is abandoned
+                if rec["op"] == COMMIT:
+                    yield from pending
+                    yield rec
+                    pending_run, pending = None, []
+                else:
+                    pending.append(rec)
+
+    def last_seq(self) -> int:
+        seq = 0
+        segments = _segments(self.dir)
+        if segments:
+            seq = _first_seq(segments[-1]) - 1
+            for _, rec in _complete_lines(os.path.join(self.dir, segments[-1])):
+                seq = rec["seq"]
+        return seq
+
+def tail(directory: str, feed: str, cursor_path: str, committed_only: bool = True) -> Iterator[dict]:
+    """
+    Entries not yet consumed according to the cursor file (last processed seq).
+    The cursor advances after each commit line has been yielded and the consumer
+    asked for the next entry, i.e. after it finished the run's entries.
+    """
+    after = 0
+    if os.path.exists(cursor_path):
+        with open(cursor_path, "r", encoding="utf-8") as f:
+            after = int(json.load(f).get("seq", 0))
+    for rec in ChangeLogReader(directory, feed).read(after, committed_only):
+        yield rec
+        if rec["op"] == COMMIT or not committed_only:
+            tmp = cursor_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"seq": rec["seq"], "run": rec["run"]}, f)
+            os.replace(tmp, cursor_path)
+
+def main(argv=None):
+    """python -m common.changelog <directory> <feed> --cursor FILE [--follow]: print new entries as NDJSON."""
+    ap = argparse.ArgumentParser(description="Print change log entries not yet consumed by a cursor")
+    ap.add_argument("directory")
+    ap.add_argument("feed")
+    ap.add_argument("--cursor", required=True, help="JSON file holding the last consumed seq")
+    ap.add_argument("--follow", action="store_true", help="keep polling for new runs")
+    ap.add_argument("--interval", type=float, default=5.0)
+    ap.add_argument("--uncommitted", action="store_true", help="also emit entries of runs not committed yet")
+    args = ap.parse_args(argv)
+    while True:
+        for rec in tail(args.directory, args.feed, args.cursor, committed_only=not args.uncommitted):
+            sys.stdout.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+        if not args.follow:
+            return
+        time.sleep(args.interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# compression.py
+"""
+Opt-in codec for large text attributes stored in DynamoDB.
+
+Configured string attributes whose UTF-8 size is at or above a threshold are
+compressed and stored as DynamoDB Binary values. Every compressed value starts
+with a one-byte codec marker so readers can decompress without knowing the
+loader config that wrote it.
+"""
+import zlib
+from typing import Dict, Iterable
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+ZLIB_MARKER = b"z"
+ZSTD_MARKER = b"s"
+
+DEFAULT_CODEC = "zlib"
+DEFAULT_MIN_BYTES = 512
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 10
+
+_zstd_compressor = None
+_zstd_decompressor = None
+
+def _zstd_c():
+    global _zstd_compressor
+    if _zstd_compressor is None:
+        _zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    return _zstd_compressor
+
+def _zstd_d():
+    global _zstd_decompressor
+    if _zstd_decompressor is None:
+        _zstd_decompressor = zstandard.ZstdDecompressor()
+    return _zstd_decompressor
+
+def resolve_codec(name: str) -> str:
+    """Return the codec actually usable here ('zstd' falls back to 'zlib' if zstandard is missing)."""
+    name = (name or DEFAULT_CODEC).lower()
+    if name not in ("zlib", "zstd"):
+        raise ValueError(f"Unknown compression codec: {name}")
+    if name == "zstd" and zstandard is None:
+        print("⚠️ zstandard not installed; falling back to zlib compression")
+        return "zlib"
+    return name
+
+def compress_value(value, codec: str = DEFAULT_CODEC, min_bytes: int = DEFAULT_MIN_BYTES):
+    """Compress a string value into marked bytes if it is large enough and compression pays off."""
+    if not isinstance(value, str):
+        return value
+    raw = value.encode("utf-8")
+    if len(raw) < min_bytes:
+        return value
+    if codec == "zstd":
+        packed = ZSTD_MARKER + _zstd_c().compress(raw)
+    else:
+        packed = ZLIB_MARKER + zlib.compress(raw, ZLIB_LEVEL)
+    # keep the plain string when compression does not shrink it
+    return packed if len(packed) < len(raw) else value
+
+def decompress_value(value):
+    """Inverse of compress_value; non-binary values are returned unchanged."""
+    # boto3 returns Binary attributes wrapped in boto3.dynamodb.types.Binary
+    if hasattr(value, "value") and isinstance(value.value, (bytes, bytearray)):
+        value = value.value
+    if not isinstance(value, (bytes, bytearray)) or not value:
+        return value
+    marker, body = bytes(value[:1]), bytes(value[1:])
+    if marker == ZLIB_MARKER:
+        return zlib.decompress(body).decode("utf-8")
+    if marker == ZSTD_MARKER:
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed attribute found but zstandard is not installed")
+        return _zstd_d().decompress(body).decode("utf-8")
+    return value
+
+def compress_item(item: Dict, fields: Iterable[str], codec: str = DEFAULT_CODEC,
+                  min_bytes: int = DEFAULT_MIN_BYTES) -> Dict:
+    """Return a copy of item with the configured fields compressed."""
+    fields = list(fields or [])
+    if not fields:
+        return item
+    out = dict(item)
+    for f in fields:
+        if f in out:
+            out[f] = compress_value(out[f], codec, min_bytes)
+    return out
+
+def decompress_item(item: Dict) -> Dict:
+    """Return a copy of a DynamoDB item with every compressed attribute decoded back to str."""
+    if not item:
+        return item
+    return {k: decompress_value(v) for k, v in item.items()}
+
+def compression_settings(cfg: Dict):
+    """Read (fields, codec, min_bytes) from a loader config; fields empty means disabled."""
+    fields = cfg.get("COMPRESS_FIELDS") or []
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    codec = resolve_codec(cfg.get("COMPRESS_CODEC")) if fields else DEFAULT_CODEC
+    min_bytes = int(cfg.get("COMPRESS_MIN_BYTES") or DEFAULT_MIN_BYTES)
+    return fields, codec, min_bytes
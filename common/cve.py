@@ -0,0 +1,82 @@
+# cve.py
+"""
+Shared CVE id codec.
+
+A canonical id 'CVE-YYYY-NNNN...' is packed into one 64-bit integer
+(year << 32) | sequence, so sets, joins and sorts can run on int arrays.
+Sorting packed keys orders by year, then sequence. INVALID (-1) marks
+values that are not canonical CVE ids in vectorized results.
+"""
+import re
+from typing import List, Optional
+
+# search pattern for CVE ids embedded in free text (references, notes, ...)
+CVE_RE = re.compile(r"(CVE-\d{4}-\d{4,7})", re.IGNORECASE)
+# full-match pattern for a canonical id: 4-digit sequence, or 5-9 digits without zero padding
+_CVE_PARTS_PATTERN = r"^CVE-(\d{4})-(\d{4}|[1-9]\d{4,8})$"
+CVE_PARTS_RE = re.compile(_CVE_PARTS_PATTERN, re.IGNORECASE)
+
+INVALID = -1
+_SEQ_MASK = 0xFFFFFFFF
+
+def normalize_cve(cve) -> Optional[str]:
+    """Strip and upper-case a CVE id; None if it is not canonical."""
+    if cve is None:
+        return None
+    s = str(cve).strip().upper()
+    return s if CVE_PARTS_RE.match(s) else None
+
+def pack_cve(cve) -> Optional[int]:
+    """'CVE-2021-44228' -> (2021 << 32) | 44228; None for non-canonical ids."""
+    if cve is None:
+        return None
+    m = CVE_PARTS_RE.match(str(cve).strip())
+    if not m:
+        return None
+    return (int(m.group(1)) << 32) | int(m.group(2))
+
+def unpack_cve(key: int) -> str:
+    key = int(key)
+    return f"CVE-{key >> 32}-{str(key & _SEQ_MASK).zfill(4)}"
+
+def find_cve(text) -> Optional[str]:
+    """First CVE id found in free text, upper-cased (None if there is none)."""
+    if not text:
+        return None
+    m = CVE_RE.search(str(text))
+    return m.group(1).upper() if m else None
+
+def find_all_cves(text) -> List[str]:
+    """All distinct CVE ids in free text or a ';'-joined list, upper-cased, in order of appearance."""
+    if not text:
+        return []
+    return list(dict.fromkeys(m.upper() for m in CVE_RE.findall(str(text))))
+
+# ---------------- vectorized (numpy / pandas) ----------------
+def pack_many(values):
+    """
+    Vectorized pack over a pandas Series, numpy array or iterable of strings.
+    Returns an int64 numpy array aligned with the input; INVALID where not a CVE.
+    """
+    import numpy as np
+    import pandas as pd
+
+    s = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype="object")
+    parts = s.astype("string").str.strip().str.extract(_CVE_PARTS_PATTERN, flags=re.IGNORECASE)
+    ok = parts[0].notna().to_numpy()
+    out = np.full(len(s), INVALID, dtype=np.int64)
+    if ok.any():
+        years = parts.loc[ok, 0].astype("int64").to_numpy()
+        seqs = parts.loc[ok, 1].astype("int64").to_numpy()
+        out[ok] = (years << 32) | seqs
+    return out
+
+def unpack_many(keys) -> List[Optional[str]]:
+    """Inverse of pack_many; INVALID keys map to None."""
+    import numpy as np
+
+    keys = np.asarray(keys, dtype=np.int64)
+    years = (keys >> 32).tolist()
+    seqs = (keys & _SEQ_MASK).tolist()
+    return [None if k == INVALID else f"CVE-{y}-{str(q).zfill(4)}"
+            for k, y, q in zip(keys.tolist(), years, seqs)]
@@ -0,0 +1,288 @@
+# ddb_io.py
+"""
+Bulk DynamoDB item reads and writes for the loaders, behind a selectable backend.
+
+    sync   boto3 on the calling thread: batch_writer for puts, BatchGetItem
+           (100 keys per call) for reads, one request in flight at a time.
+    async  aiobotocore on an asyncio event loop: BatchWriteItem (25 items) and
+           BatchGetItem (100 keys) calls run concurrently, bounded by an
+           asyncio.Semaphore (DDB_ASYNC_CONCURRENCY, default 64). Each pending
+           request is a coroutine, not a thread, so hundreds or thousands can
+           be in flight from one process.
+
+Both backends expose the same blocking calls, so the loaders keep their
+signatures: get_many(keys[, attributes]) -> {key: item} (missing keys are absent) and
+put_many(items[, progress, on_written]) -> written count. Written keys are
+reported per batch to on_written, so a long write never accumulates them.
+Unprocessed items/keys and throttling errors are retried with exponential
+backoff; failures are printed and left out of the result, like the per-item
+handling they replace.
+
+Select per feed with the feed's DDB_BACKEND config key / env var, or globally
+with DDB_BACKEND. "async" needs the optional aiobotocore package and falls back
+to sync without it. Within one put_many call a key should appear once: async
+batches run concurrently, so two puts of the same key in different batches
+have no defined order.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import concurrent.futures
+from typing import Callable, Dict, Iterable, List, Optional
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session as get_aio_session
+except ImportError:  # optional async backend
+    get_aio_session = None
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.aws import client_credentials
+
+BACKENDS = ("sync", "async")
+DEFAULT_BACKEND = os.getenv("DDB_BACKEND", "sync")
+DEFAULT_CONCURRENCY = int(os.getenv("DDB_ASYNC_CONCURRENCY", "64"))
+WRITE_BATCH = 25  # BatchWriteItem limit
+GET_BATCH = 100  # BatchGetItem limit
+MAX_ATTEMPTS = 8
+RETRYABLE = {"ProvisionedThroughputExceededException", "ThrottlingException", "RequestLimitExceeded",
+             "InternalServerError", "ServiceUnavailable"}
+
+def _backoff(attempt: int) -> float:
+    return min(5.0, 0.05 * (2 ** attempt)) * (0.5 + random.random() / 2)
+
+def _chunks(items: Iterable, size: int):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _projection(attributes: Optional[List[str]]) -> dict:
+    """ProjectionExpression parameters for a BatchGetItem table entry (placeholders avoid reserved words)."""
+    if not attributes:
+        return {}
+    names = {f"#p{i}": a for i, a in enumerate(attributes)}
+    return {"ProjectionExpression": ", ".join(names), "ExpressionAttributeNames": names}
+
+def progress_printer(every: int, total: int, template: str) -> Callable[[int], None]:
+    """put_many progress callback: prints template.format(done, total) every `every` items and at the end."""
+    every = max(1, int(every))
+    last = [0]
+
+    def progress(done: int):
+        if done // every != last[0] // every or (done == total and last[0] != total):
+            print(template.format(done, total))
+        last[0] = done
+    return progress
+
+class SyncItemIO:
+    """boto3 resource-level I/O on the calling thread."""
+    name = "sync"
+
+    def __init__(self, table, key: str):
+        self.table = table
+        self.key = key
+
+    def get_many(self, keys: Iterable[str], attributes: Optional[List[str]] = None) -> Dict[str, dict]:
+        client = self.table.meta.client  # resource client: native Python values in and out
+        found = {}
+        for chunk in _chunks(dict.fromkeys(keys), GET_BATCH):
+            request = {self.table.name: {"Keys": [{self.key: k} for k in chunk], **_projection(attributes)}}
+            attempt = 0
+            while request:
+                try:
+                    resp = client.batch_get_item(RequestItems=request)
+                except ClientError as e:
+                    print(f"⚠️ Warning fetching {len(chunk)} keys from DDB: {e}")
+                    break
+                for item in resp.get("Responses", {}).get(self.table.name, []):
+                    found[item[self.key]] = item
+                request = resp.get("UnprocessedKeys") or None
+                if request:
+                    attempt += 1
+                    time.sleep(_backoff(attempt))
+        return found
+
+    def put_many(self, items: Iterable[dict], progress: Optional[Callable[[int], None]] = None,
+                 on_written: Optional[Callable[[List[str]], None]] = None) -> int:
+        written = 0
+        for chunk in _chunks(items, WRITE_BATCH):
+            keys = []
+            # one batch_writer per chunk: its keys are flushed before they are reported
+            with self.table.batch_writer(overwrite_by_pkeys=[self.key]) as batch:
+                for item in chunk:
+                    try:
+                        batch.put_item(Item=item)
+                        keys.append(item[self.key])
+                    except ClientError as e:
+                        print(f"❌ Failed to write {self.key}={item.get(self.key)}: {e}")
+            written += len(keys)
+            if on_written and keys:
+                on_written(keys)
+            if progress:
+                progress(written)
+        return written
+
+class AsyncItemIO:
+    """aiobotocore I/O: concurrent batch calls on a private event loop, bounded by a semaphore."""
+    name = "async"
+
+    def __init__(self, table, key: str, concurrency: int = DEFAULT_CONCURRENCY):
+        if get_aio_session is None:
+            raise ImportError("aiobotocore is required for the async DynamoDB backend")
+        self._table_client = table.meta.client
+        meta = self._table_client.meta
+        self.table_name = table.name
+        self.key = key
+        self.concurrency = max(1, int(concurrency))
+        self._client_args = dict(region_name=meta.region_name, endpoint_url=meta.endpoint_url,
+                                 config=AioConfig(max_pool_connections=self.concurrency,
+                                                  retries={"max_attempts": 3, "mode": "standard"}))
+        self._ser = TypeSerializer()
+        self._de = TypeDeserializer()
+
+    def _client(self):
+        # sign with the table client's credentials (resolved per call, so refreshed role keys are picked up)
+        key, secret, token = client_credentials(self._table_client)
+        return get_aio_session().create_client("dynamodb", aws_access_key_id=key, aws_secret_access_key=secret,
+                                               aws_session_token=token, **self._client_args)
+
+    @staticmethod
+    def _run(coro):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        # called from inside an event loop (e.g. an async service): use a private loop on a helper thread
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(asyncio.run, coro).result()
+
+    async def _bounded(self, chunks: Iterable[list], handle):
+        """
+        Run handle(chunk) for every chunk with at most self.concurrency in flight.
+        Chunks are pulled lazily on a helper thread, so a slow source (e.g. a
+        pipeline queue) does not stall requests already in flight.
+        """
+        loop = asyncio.get_running_loop()
+        sem = asyncio.Semaphore(self.concurrency)
+        pending = set()
+        chunks = iter(chunks)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=1) as puller:
+            while True:
+                await sem.acquire()
+                chunk = await loop.run_in_executor(puller, next, chunks, None)
+                if chunk is None:
+                    sem.release()
+                    break
+                task = asyncio.ensure_future(handle(chunk))
+                task.add_done_callback(lambda _t: sem.release())
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def _call(self, fn, what: str, **kwargs):
+        """One batch call with retries on throttling / transient errors; None after a hard failure."""
+        for attempt in range(MAX_ATTEMPTS):
+            try:
+                return await fn(**kwargs)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code not in RETRYABLE or attempt == MAX_ATTEMPTS - 1:
+                    print(f"❌ DynamoDB {what} failed: {e}")
+                    return None
+            await asyncio.sleep(_backoff(attempt))
+        return None
+
+    def get_many(self, keys: Iterable[str], attributes: Optional[List[str]] = None) -> Dict[str, dict]:
+        return self._run(self._get_many(dict.fromkeys(keys), attributes))
+
+    async def _get_many(self, keys, attributes) -> Dict[str, dict]:
+        found = {}
+        async with self._client() as client:
+            async def handle(chunk):
+                request = {self.table_name: {"Keys": [{self.key: self._ser.serialize(k)} for k in chunk],
+                                             **_projection(attributes)}}
+                attempt = 0
+                while request:
+                    resp = await self._call(client.batch_get_item, f"BatchGetItem ({len(chunk)} keys)",
+                                            RequestItems=request)
+                    if resp is None:
+                        return
+                    for raw in resp.get("Responses", {}).get(self.table_name, []):
+                        item = {k: self._de.deserialize(v) for k, v in raw.items()}
+                        found[item[self.key]] = item
+                    request = resp.get("UnprocessedKeys") or None
+                    if request:
+                        attempt += 1
+                        await asyncio.sleep(_backoff(attempt))
+            await self._bounded(_chunks(keys, GET_BATCH), handle)
+        return found
+
+    def put_many(self, items: Iterable[dict], progress: Optional[Callable[[int], None]] = None,
+                 on_written: Optional[Callable[[List[str]], None]] = None) -> int:
+        return self._run(self._put_many(items, progress, on_written))
+
+    async def _put_many(self, items, progress, on_written) -> int:
+        written = 0
+        async with self._client() as client:
+            async def handle(chunk):
+                nonlocal written
+                # duplicate keys are not allowed within one BatchWriteItem; last one wins
+                by_key = {item[self.key]: item for item in chunk}
+                requests = []
+                for k, item in by_key.items():
+                    try:
+                        requests.append((k, {"PutRequest": {"Item": {a: self._ser.serialize(v) for a, v in item.items()}}}))
+                    except (TypeError, ValueError) as e:
+                        print(f"❌ Failed to write {self.key}={k}: {e}")
+                pending = {self.table_name: [r for _, r in requests]} if requests else None
+                attempt = 0
+                while pending:
+                    resp = await self._call(client.batch_write_item, f"BatchWriteItem ({len(requests)} items)",
+                                            RequestItems=pending)
+                    if resp is None:
+                        return
+                    pending = resp.get("UnprocessedItems") or None
+                    if pending:
+                        attempt += 1
+                        if attempt >= MAX_ATTEMPTS:
+                            break
+                        await asyncio.sleep(_backoff(attempt))
+                unprocessed = set()
+                if pending:
+                    unprocessed = {self._de.deserialize(r["PutRequest"]["Item"][self.key])
+                                   for r in pending[self.table_name]}
+                    print(f"❌ {len(unprocessed)} items still unprocessed after {attempt} attempts")
+                keys = [k for k, _ in requests if k not in unprocessed]
+                written += len(keys)
+                if on_written and keys:
+                    on_written(keys)
+                if progress:
+                    progress(written)
+            await self._bounded(_chunks(items, WRITE_BATCH), handle)
+        return written
+
+def item_io(table, key: str, backend: Optional[str] = None, concurrency: Optional[int] = None):
+    """
+    Item I/O for table (hash key `key`) using backend ('sync' | 'async'; None -> DDB_BACKEND env).
+    Both backends use the credentials of the table's boto3 client (common/aws.py policy).
+    """
+    name = (backend or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown DynamoDB backend: {name} (expected one of {BACKENDS})")
+    if name == "async":
+        if get_aio_session is None:
+            print("⚠️ aiobotocore not installed; using the sync DynamoDB backend")
+        else:
+            return AsyncItemIO(table, key, concurrency or DEFAULT_CONCURRENCY)
+    return SyncItemIO(table, key)
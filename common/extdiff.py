@@ -0,0 +1,168 @@
+# extdiff.py
+"""
+External sort-merge diff for baselines that do not fit in memory.
+
+Each side is streamed as (key, hash, payload) tuples. Records are buffered up
+to run_size, sorted by key and spilled to a temporary run file; runs are then
+k-way merged (heapq.merge) back into one sorted stream. The two sorted streams
+are merge-joined in a single pass that emits new, changed, deleted (and,
+optionally, unchanged) keys. Peak memory is about run_size records plus one
+block of RUN_BLOCK records per open run, whatever the input size.
+
+Within one side a repeated key keeps its last record, like building a dict.
+"""
+import os
+import heapq
+import pickle
+import tempfile
+from collections import Counter, namedtuple
+from operator import itemgetter
+from typing import Iterable, Iterator, Optional, Tuple
+
+DEFAULT_RUN_SIZE = int(os.getenv("EXTDIFF_RUN_SIZE", "200000"))
+MAX_OPEN_RUNS = 128  # wider merges are done in passes
+RUN_BLOCK = 1024  # records per pickled block in a run file
+
+NEW = "new"
+CHANGED = "changed"
+DELETED = "deleted"
+UNCHANGED = "unchanged"
+
+DiffRow = namedtuple("DiffRow", "status key old new")  # old/new: (hash, payload) or None
+
+_order = itemgetter(0, 1)
+
+def _write_run(entries, tmp_dir: Optional[str]) -> str:
+    # fixed-size pickled blocks: a long-lived Pickler/Unpickler would memoize every record
+    fd, path = tempfile.mkstemp(prefix="extdiff-", suffix=".run", dir=tmp_dir)
+    with os.fdopen(fd, "wb") as f:
+        block = []
+        for e in entries:
+            block.append(e)
+            if len(block) >= RUN_BLOCK:
+                pickle.dump(block, f, pickle.HIGHEST_PROTOCOL)
+                block = []
+        if block:
+            pickle.dump(block, f, pickle.HIGHEST_PROTOCOL)
+    return path
+
+def _read_run(path: str) -> Iterator[tuple]:
+    with open(path, "rb") as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+            yield from block
+
+class ExternalSorter:
+    """Accumulates (key, value) pairs and iterates them sorted by key, spilling runs to disk."""
+    def __init__(self, run_size: int = DEFAULT_RUN_SIZE, tmp_dir: Optional[str] = None):
+        self.run_size = max(1, int(run_size))
+        self.tmp_dir = tmp_dir
+        self._buf = []
+        self._runs = []
+        self._readers = []
+        self._seq = 0
+
+    def add(self, key: str, value):
+        self._buf.append((key, self._seq, value))
+        self._seq += 1
+        if len(self._buf) >= self.run_size:
+            self._spill()
+
+    def extend(self, pairs: Iterable[Tuple[str, object]]):
+        for key, value in pairs:
+            self.add(key, value)
+        return self
+
+    def _spill(self):
+        if self._buf:
+            self._buf.sort(key=_order)
+            self._runs.append(_write_run(self._buf, self.tmp_dir))
+            self._buf = []
+
+    @property
+    def runs(self) -> int:
+        return len(self._runs)
+
+    def _merged(self) -> Iterator[tuple]:
+        if not self._runs:
+            self._buf.sort(key=_order)
+            buf, self._buf = self._buf, []
+            return iter(buf)
+        self._spill()
+        # keep the number of simultaneously open run files bounded
+        while len(self._runs) > MAX_OPEN_RUNS:
+            group, self._runs = self._runs[:MAX_OPEN_RUNS], self._runs[MAX_OPEN_RUNS:]
+            merged = _write_run(heapq.merge(*(_read_run(p) for p in group), key=_order), self.tmp_dir)
+            for p in group:
+                os.remove(p)
+            self._runs.append(merged)
+        self._readers = [_read_run(p) for p in self._runs]
+        return heapq.merge(*self._readers, key=_order)
+
+    def __iter__(self) -> Iterator[Tuple[str, object]]:
+        """Sorted, de-duplicated (last wins) (key, value) pairs; run files are removed afterwards."""
+        try:
+            prev = None
+            for entry in self._merged():
+                if prev is not None and entry[0] != prev[0]:
+                    yield prev[0], prev[2]
+                prev = entry
+            if prev is not None:
+                yield prev[0], prev[2]
+        finally:
+            self.close()
+
+    def close(self):
+        # close readers first so run files can be removed on Windows too
+        for r in self._readers:
+            r.close()
+        self._readers = []
+        for p in self._runs:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        self._runs = []
+        self._buf = []
+
+def merge_diff(old: Iterator[Tuple[str, tuple]], new: Iterator[Tuple[str, tuple]],
+               emit_unchanged: bool = False, stats: Counter = None) -> Iterator[DiffRow]:
+    """Merge-join two key-sorted streams of (key, (hash, payload)) into DiffRows."""
+    stats = stats if stats is not None else Counter()
+    sentinel = (None, None)
+    a = next(old, sentinel)
+    b = next(new, sentinel)
+    while a is not sentinel or b is not sentinel:
+        if b is sentinel or (a is not sentinel and a[0] < b[0]):
+            stats[DELETED] += 1
+            yield DiffRow(DELETED, a[0], a[1], None)
+            a = next(old, sentinel)
+        elif a is sentinel or b[0] < a[0]:
+            stats[NEW] += 1
+            yield DiffRow(NEW, b[0], None, b[1])
+            b = next(new, sentinel)
+        else:
+            status = UNCHANGED if a[1][0] == b[1][0] else CHANGED
+            stats[status] += 1
+            if status == CHANGED or emit_unchanged:
+                yield DiffRow(status, b[0], a[1], b[1])
+            a = next(old, sentinel)
+            b = next(new, sentinel)
+
+def external_diff(old_records: Iterable[tuple], new_records: Iterable[tuple], run_size: int = DEFAULT_RUN_SIZE,
+                  tmp_dir: Optional[str] = None, emit_unchanged: bool = False,
+                  stats: Counter = None) -> Iterator[DiffRow]:
+    """
+    Diff two unsorted streams of (key, hash, payload). Both sides are sorted
+    externally first (the old side fully before the new side starts), then merged.
+    """
+    old_sorted = ExternalSorter(run_size, tmp_dir).extend((k, (h, p)) for k, h, p in old_records)
+    new_sorted = ExternalSorter(run_size, tmp_dir).extend((k, (h, p)) for k, h, p in new_records)
+    try:
+        yield from merge_diff(iter(old_sorted), iter(new_sorted), emit_unchanged, stats)
+    finally:
+        old_sorted.close()
+        new_sorted.close()
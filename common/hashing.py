@@ -0,0 +1,98 @@
+# hashing.py
+"""
+Content hashing for change detection, shared by all feeds.
+
+A record hash covers a fixed list of fields joined with '|'. Each field is
+canonicalized (None -> '', whitespace collapsed, stripped). Values already in
+canonical form, which is what the transforms emit, are used as-is.
+
+Algorithms:
+    sha256   hex digest, untagged (matches hashes in existing baselines)
+    blake2b  16-byte digest, tagged 'b2:'
+    xxh3     xxh3_128 via the optional xxhash package, tagged 'x3:' (falls back to blake2b)
+
+Tags let callers tell a hash made by another algorithm from a content change
+(see same_algorithm), so switching algorithms never looks like every record changed.
+"""
+import hashlib
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+try:
+    import xxhash
+except ImportError:  # optional fast hash
+    xxhash = None
+
+DEFAULT_ALGORITHM = "blake2b"
+_TAGS = {"sha256": "", "blake2b": "b2:", "xxh3": "x3:", "frame64": "f64:"}
+
+def resolve_algorithm(name: Optional[str]) -> str:
+    name = (name or DEFAULT_ALGORITHM).lower()
+    if name not in ("sha256", "blake2b", "xxh3"):
+        raise ValueError(f"Unknown hash algorithm: {name}")
+    if name == "xxh3" and xxhash is None:
+        print("⚠️ xxhash not installed; falling back to blake2b content hashes")
+        return "blake2b"
+    return name
+
+def algorithm_of(h: Optional[str]) -> Optional[str]:
+    """Algorithm that produced a stored hash (None for empty)."""
+    if not h:
+        return None
+    for name, tag in _TAGS.items():
+        if tag and h.startswith(tag):
+            return name
+    return "sha256"
+
+def same_algorithm(h: Optional[str], algorithm: str) -> bool:
+    return algorithm_of(h) == algorithm
+
+def canonical_text(v) -> str:
+    """None -> '', otherwise whitespace-collapsed, stripped str; already-clean strings pass through."""
+    if v is None:
+        return ""
+    s = v if isinstance(v, str) else str(v)
+    # isprintable() rules out every whitespace char except ' ', so this is "already clean"
+    if s.isprintable() and "  " not in s and s[:1] != " " and s[-1:] != " ":
+        return s
+    return " ".join(s.split())
+
+def digest(data: str, algorithm: str = DEFAULT_ALGORITHM) -> str:
+    raw = data.encode("utf-8")
+    if algorithm == "sha256":
+        return hashlib.sha256(raw).hexdigest()
+    if algorithm == "xxh3":
+        return _TAGS["xxh3"] + xxhash.xxh3_128_hexdigest(raw)
+    return _TAGS["blake2b"] + hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+def content_hash(rec: Dict, fields: Sequence[str], algorithm: str = DEFAULT_ALGORITHM,
+                 canonical: Callable = canonical_text) -> str:
+    return digest("|".join([canonical(rec.get(f)) for f in fields]), algorithm)
+
+def record_hashes(records: Iterable[Dict], fields: Sequence[str], algorithm: str = DEFAULT_ALGORITHM,
+                  canonical: Callable = canonical_text) -> List[str]:
+    """Hash a batch of records with one field list (cheaper than calling content_hash per record)."""
+    fields = list(fields)
+    if algorithm == "sha256":
+        h = hashlib.sha256
+        return [h("|".join([canonical(r.get(f)) for f in fields]).encode("utf-8")).hexdigest() for r in records]
+    return [digest("|".join([canonical(r.get(f)) for f in fields]), algorithm) for r in records]
+
+def frame_hashes(df, fields: Sequence[str], null_tokens=("nan", "none")):
+    """
+    Vectorized 64-bit row hashes of a DataFrame over fields (pandas hash_pandas_object).
+    Values are stripped and NaN / '' / null_tokens all hash alike, so rows read with
+    dtype=str compare the same way as per-value normalization. Returns a list of 'f64:' hex strings.
+    """
+    import pandas as pd
+
+    cols = {}
+    for f in fields:
+        if f in df.columns:
+            s = df[f].astype("string").str.strip().fillna("")
+            s = s.mask(s.str.lower().isin(null_tokens), "")
+        else:
+            s = pd.Series([""] * len(df), index=df.index, dtype="string")
+        cols[f] = s
+    canon = pd.DataFrame(cols, index=df.index)
+    hashed = pd.util.hash_pandas_object(canon, index=False)
+    return [f"{_TAGS['frame64']}{v:016x}" for v in hashed.tolist()]
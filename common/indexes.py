@@ -0,0 +1,234 @@
+# indexes.py
+"""
+Global secondary indexes for range queries on the feed tables.
+
+Index keys are dedicated gsi_* attributes that the loaders derive from each
+record (index_attributes). Source attributes can be NULL, and DynamoDB rejects
+an item whose index key has the wrong type, so the copies are only set when
+the source value is usable. Items without them are simply not in that index
+(sparse indexes). All keys are strings with sortable encodings:
+
+    cisa     dateAdded-index   gsi_kev ("KEV")           / gsi_date_added (YYYY-MM-DD)
+             dueDate-index     gsi_kev ("KEV")           / gsi_due_date   (YYYY-MM-DD)
+             vendor-index      gsi_vendor (lower-cased)  / gsi_date_added
+    epss     percentile-index  gsi_pct_bucket ("000".."100", floor(percentile * 100)) / gsi_percentile ("0.95123")
+             score-index       gsi_score_bucket ("001".."100", floor(epss * 100))     / gsi_epss ("0.97531")
+    exploit  platform-index    gsi_platform (lower-cased) / gsi_date_published (YYYY-MM-DD)
+    misp     type-index        gsi_type (galaxy type)     / gsi_value (lower-cased value)
+
+The KEV catalog is small enough for one constant partition. Percentiles are
+uniform, so every percentile bucket holds about 1% of the EPSS table. EPSS
+scores are heavily skewed towards zero, so score-index only holds scores
+>= SCORE_INDEX_MIN (about a tenth of the table). Lower thresholds fall back
+to a scan.
+
+Tables are created with their indexes by the loaders' table helpers (through
+common.aws.get_or_create_table), and missing indexes are added to existing
+tables. Items written before this change get their index attributes with:
+
+    python -m common.indexes backfill [--tables cisa,epss]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import concurrent.futures
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterator, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+KEV_PARTITION = "KEV"
+SCORE_INDEX_MIN = Decimal(os.getenv("EPSS_SCORE_INDEX_MIN", "0.01"))
+QUERY_WORKERS = 8  # bucket queries / backfill updates run in parallel
+BACKFILL_CHUNK = 1000
+
+# feed -> [(index name, hash attribute, range attribute)]; every key attribute is a string (S)
+FEED_INDEXES = {
+    "cisa": [
+        ("dateAdded-index", "gsi_kev", "gsi_date_added"),
+        ("dueDate-index", "gsi_kev", "gsi_due_date"),
+        ("vendor-index", "gsi_vendor", "gsi_date_added"),
+    ],
+    "epss": [
+        ("percentile-index", "gsi_pct_bucket", "gsi_percentile"),
+        ("score-index", "gsi_score_bucket", "gsi_epss"),
+    ],
+    "exploit": [
+        ("platform-index", "gsi_platform", "gsi_date_published"),
+    ],
+    "misp": [
+        ("type-index", "gsi_type", "gsi_value"),
+    ],
+}
+
+_DATE_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})")
+
+def table_indexes(feed: str) -> List[tuple]:
+    return FEED_INDEXES.get(feed, [])
+
+def iso_date(value) -> Optional[str]:
+    """'YYYY-MM-DD' prefix of a date / timestamp string, None if it does not start with one."""
+    if value is None:
+        return None
+    m = _DATE_RE.match(str(value).strip())
+    return "-".join(m.groups()) if m else None
+
+def score(value) -> Optional[Decimal]:
+    """A probability in [0, 1] as Decimal, None otherwise."""
+    if value is None or value == "":
+        return None
+    try:
+        d = value if isinstance(value, Decimal) else Decimal(str(value).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    return d if d.is_finite() and 0 <= d <= 1 else None
+
+def encode_score(value: Decimal) -> str:
+    """Fixed-width string that sorts like the number (0.00000 .. 1.00000)."""
+    return f"{value:.5f}"
+
+def bucket(value: Decimal) -> str:
+    """Zero-padded floor(value * 100): '000' .. '100'."""
+    return f"{int(value * 100):03d}"
+
+def _text_key(value) -> Optional[str]:
+    if value is None:
+        return None
+    s = str(value).strip().lower()
+    return s or None
+
+def index_attributes(feed: str, item: Dict) -> Dict[str, str]:
+    """gsi_* attributes for an item of feed (only those whose source value is usable)."""
+    out = {}
+    if feed == "cisa":
+        out["gsi_kev"] = KEV_PARTITION
+        out["gsi_date_added"] = iso_date(item.get("dateAdded"))
+        out["gsi_due_date"] = iso_date(item.get("dueDate"))
+        out["gsi_vendor"] = _text_key(item.get("vendorProject"))
+    elif feed == "epss":
+        pct, epss = score(item.get("percentile")), score(item.get("epss"))
+        if pct is not None:
+            out["gsi_pct_bucket"] = bucket(pct)
+            out["gsi_percentile"] = encode_score(pct)
+        if epss is not None and epss >= SCORE_INDEX_MIN:
+            out["gsi_score_bucket"] = bucket(epss)
+            out["gsi_epss"] = encode_score(epss)
+    elif feed == "exploit":
+        out["gsi_platform"] = _text_key(item.get("platform"))
+        out["gsi_date_published"] = iso_date(item.get("date_published"))
+    elif feed == "misp":
+        out["gsi_type"] = _text_key(item.get("type"))
+        out["gsi_value"] = _text_key(item.get("value"))
+    return {k: v for k, v in out.items() if v is not None}
+
+# ----- queries -----
+
+def query_index(client, table_name: str, index: str, hash_attr: str, hash_value: str, range_attr: Optional[str] = None,
+                lower: Optional[str] = None, upper: Optional[str] = None, descending: bool = False,
+                limit: Optional[int] = None) -> Iterator[dict]:
+    """
+    Items of one index partition with lower <= range key <= upper (either bound
+    optional), paginated. client should be a resource client (native values).
+    """
+    names = {"#h": hash_attr}
+    values = {":h": hash_value}
+    condition = "#h = :h"
+    if range_attr and (lower is not None or upper is not None):
+        names["#r"] = range_attr
+        if lower is not None and upper is not None:
+            condition += " AND #r BETWEEN :lo AND :hi"
+            values.update({":lo": lower, ":hi": upper})
+        elif lower is not None:
+            condition += " AND #r >= :lo"
+            values[":lo"] = lower
+        else:
+            condition += " AND #r <= :hi"
+            values[":hi"] = upper
+    kwargs = {"TableName": table_name, "IndexName": index, "KeyConditionExpression": condition,
+              "ExpressionAttributeNames": names, "ExpressionAttributeValues": values,
+              "ScanIndexForward": not descending}
+    returned = 0
+    while True:
+        if limit is not None:
+            kwargs["Limit"] = limit - returned
+        resp = client.query(**kwargs)
+        for item in resp.get("Items", []):
+            yield item
+            returned += 1
+        if "LastEvaluatedKey" not in resp or (limit is not None and returned >= limit):
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+def query_buckets(client, table_name: str, index: str, hash_attr: str, buckets: List[str], range_attr: str,
+                  lower: Optional[str] = None) -> List[dict]:
+    """Union of several bucket partitions (first bucket bounded by lower), queried in parallel."""
+    def one(i_bucket):
+        i, b = i_bucket
+        return list(query_index(client, table_name, index, hash_attr, b, range_attr, lower if i == 0 else None))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(QUERY_WORKERS, max(1, len(buckets)))) as pool:
+        return [item for part in pool.map(one, enumerate(buckets)) for item in part]
+
+# ----- index maintenance -----
+
+def _scan(client, table_name: str) -> Iterator[dict]:
+    paginator = client.get_paginator("scan")
+    for page in paginator.paginate(TableName=table_name):
+        yield from page.get("Items", [])
+
+def backfill(feeds: Optional[List[str]] = None, config: Optional[dict] = None) -> Dict[str, int]:
+    """Add missing indexes and set the gsi_* attributes on existing items (only changed attributes are written)."""
+    from common.aws import get_or_create_table, get_resource
+    from common.compression import decompress_item
+    from common.query import DEFAULT_CONFIG, FEED_TABLES
+
+    cfg = {**DEFAULT_CONFIG, **(config or {})}
+    ddb = get_resource("dynamodb", region_name=cfg["AWS_REGION"], endpoint_url=cfg["DDB_ENDPOINT"],
+                       aws_access_key_id=cfg["AWS_ACCESS_KEY_ID"], aws_secret_access_key=cfg["AWS_SECRET_ACCESS_KEY"],
+                       pool_size=QUERY_WORKERS * 2)
+    counts = {}
+    for feed in feeds or FEED_INDEXES:
+        table_name, key = FEED_TABLES[feed]
+        get_or_create_table(ddb, table_name, key, indexes=table_indexes(feed))
+        client = ddb.meta.client
+        print(f"🔄 Backfilling index attributes of {table_name}...")
+        t0 = time.time()
+        updated = 0
+
+        def update(item):
+            attrs = index_attributes(feed, decompress_item(item))
+            changed = {k: v for k, v in attrs.items() if item.get(k) != v}
+            if not changed:
+                return 0
+            names = {f"#a{i}": k for i, k in enumerate(changed)}
+            values = {f":v{i}": v for i, v in enumerate(changed.values())}
+            client.update_item(TableName=table_name, Key={key: item[key]},
+                               UpdateExpression="SET " + ", ".join(f"#a{i} = :v{i}" for i in range(len(changed))),
+                               ExpressionAttributeNames=names, ExpressionAttributeValues=values)
+            return 1
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=QUERY_WORKERS) as pool:
+            page = []
+            for item in _scan(client, table_name):
+                page.append(item)
+                if len(page) >= BACKFILL_CHUNK:
+                    updated += sum(pool.map(update, page))
+                    page = []
+            updated += sum(pool.map(update, page))
+        counts[feed] = updated
+        print(f"✅ {table_name}: {updated} items updated in {time.time() - t0:.1f}s")
+    return counts
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Maintain the feed tables' secondary indexes")
+    sub = ap.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("backfill", help="create missing indexes and set index attributes on existing items")
+    b.add_argument("--tables", default="", help="comma-separated feeds (default: all indexed feeds)")
+    b.add_argument("--endpoint", default=None)
+    args = ap.parse_args(argv)
+    feeds = [t.strip() for t in args.tables.split(",") if t.strip()] or None
+    backfill(feeds, {"DDB_ENDPOINT": args.endpoint} if args.endpoint else None)
+
+if __name__ == "__main__":
+    main()
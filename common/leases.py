@@ -0,0 +1,260 @@
+# leases.py
+"""
+Sharded multi-node execution with DynamoDB-backed work leases.
+
+A job (e.g. one day's EPSS refresh) splits its key space into num_shards shards
+by a stable hash of the record key (shard_of). Workers on any number of nodes
+share one coordination table and claim shards with conditional writes:
+
+    lease_id    "<job>#<shard>"                      (hash key)
+    state       leased | done | free
+    owner       worker id holding the lease
+    expires_at  epoch seconds; a leased shard past this is up for grabs
+    token       fencing counter, incremented on every claim
+
+A claim succeeds only if the shard was never claimed, was released, or its
+lease expired; completion and renewal require the caller to still own the
+lease. While a shard is processed a heartbeat thread renews its lease every
+lease_seconds / 3. If a worker dies, its shards are picked up by others after
+the lease expires. Loads are idempotent puts keyed by the record key, so a
+shard re-run after a lost lease only rewrites the same items.
+
+Expiry uses the workers' wall clocks; keep lease_seconds well above any
+expected clock skew between nodes.
+"""
+import os
+import re
+import time
+import random
+import socket
+import hashlib
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+from botocore.exceptions import ClientError
+
+from common.aws import get_or_create_table
+
+LEASE_TABLE = os.getenv("SHARD_LEASE_TABLE", "shard_leases")
+DEFAULT_LEASE_SECONDS = int(os.getenv("SHARD_LEASE_SECONDS", "300"))
+DEFAULT_POLL_SECONDS = float(os.getenv("SHARD_POLL_SECONDS", "10"))
+
+LEASED = "leased"
+DONE = "done"
+FREE = "free"
+
+class LeaseLost(Exception):
+    """The caller no longer owns the shard lease (expired and taken over, or released)."""
+
+def shard_of(key, num_shards: int) -> int:
+    """Stable shard index for a record key (same on every node and Python process)."""
+    raw = str(key).strip().upper().encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big") % num_shards
+
+def in_shard(key, shard: Optional[tuple]) -> bool:
+    """True if key belongs to shard=(index, num_shards); None means no sharding."""
+    return shard is None or shard_of(key, shard[1]) == shard[0]
+
+def filter_rows(batches: Iterable[list], shard: Optional[tuple], key: str = "cve"):
+    """Yield each batch of row dicts restricted to one shard (empty batches are dropped)."""
+    for rows in batches:
+        if shard is not None:
+            rows = [r for r in rows if in_shard(r.get(key), shard)]
+        if rows:
+            yield rows
+
+def default_worker_id() -> str:
+    return os.getenv("SHARD_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+# every lease attribute goes through a placeholder; several (state, owner, token, ...) are DynamoDB reserved words
+_NAMES = {f"#{a}": a for a in ("state", "owner", "expires_at", "token", "job", "shard", "num_shards",
+                                "claimed_at", "completed_at", "result")}
+
+def _names(*expressions) -> dict:
+    """Placeholders used by the expressions (DynamoDB rejects unused ones)."""
+    text = " ".join(expressions)
+    return {k: v for k, v in _NAMES.items() if re.search(re.escape(k) + r"\b", text)}
+
+def _conditional_failed(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException"
+
+class ShardLeases:
+    """Conditional-write leases for the shards of one job in the coordination table."""
+    def __init__(self, ddb_resource, job: str, num_shards: int, worker_id: Optional[str] = None,
+                 lease_seconds: int = DEFAULT_LEASE_SECONDS, table_name: str = LEASE_TABLE):
+        if num_shards < 1:
+            raise ValueError("num_shards must be >= 1")
+        self.job = job
+        self.num_shards = num_shards
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.table = get_or_create_table(ddb_resource, table_name, "lease_id")
+        self.tokens: Dict[int, int] = {}  # fencing token of each lease we hold
+
+    def lease_id(self, shard: int) -> str:
+        return f"{self.job}#{shard:05d}"
+
+    def claim(self, shard: int) -> bool:
+        """Take the shard if it is unclaimed, released or expired; False if someone else holds it or it is done."""
+        now = int(time.time())
+        try:
+            update = ("SET #state = :leased, #owner = :me, #expires_at = :exp, #job = :job, #shard = :shard, "
+                      "#num_shards = :n, #claimed_at = :now ADD #token :one")
+            condition = ("attribute_not_exists(lease_id) OR "
+                         "(#state <> :done AND (#state = :free OR #expires_at < :now OR #owner = :me))")
+            resp = self.table.update_item(
+                Key={"lease_id": self.lease_id(shard)},
+                UpdateExpression=update,
+                ConditionExpression=condition,
+                ExpressionAttributeNames=_names(update, condition),
+                ExpressionAttributeValues={":leased": LEASED, ":done": DONE, ":free": FREE, ":me": self.worker_id,
+                                           ":exp": now + self.lease_seconds, ":now": now, ":job": self.job,
+                                           ":shard": shard, ":n": self.num_shards, ":one": 1},
+                ReturnValues="ALL_NEW",
+            )
+        except ClientError as e:
+            if _conditional_failed(e):
+                return False
+            raise
+        self.tokens[shard] = int(resp["Attributes"]["token"])
+        return True
+
+    def _owned_update(self, shard: int, update: str, values: dict, drop_token: bool = False):
+        condition = "#owner = :me AND #token = :token"
+        try:
+            self.table.update_item(
+                Key={"lease_id": self.lease_id(shard)},
+                UpdateExpression=update,
+                ConditionExpression=condition,
+                ExpressionAttributeNames=_names(update, condition),
+                ExpressionAttributeValues={":me": self.worker_id, ":token": self.tokens.get(shard, -1), **values},
+            )
+        except ClientError as e:
+            if _conditional_failed(e):
+                self.tokens.pop(shard, None)
+                raise LeaseLost(f"lease on {self.lease_id(shard)} is no longer held by {self.worker_id}") from e
+            raise
+        if drop_token:
+            self.tokens.pop(shard, None)
+
+    def renew(self, shard: int):
+        self._owned_update(shard, "SET #expires_at = :exp", {":exp": int(time.time()) + self.lease_seconds})
+
+    def complete(self, shard: int, result: Optional[dict] = None):
+        update = "SET #state = :done, #completed_at = :now"
+        values = {":done": DONE, ":now": int(time.time())}
+        if result:
+            update += ", #result = :result"
+            values[":result"] = result
+        self._owned_update(shard, update, values, drop_token=True)
+
+    def release(self, shard: int):
+        """Give the shard back without completing it so another worker can claim it at once."""
+        self._owned_update(shard, "SET #state = :free, #expires_at = :zero REMOVE #owner",
+                           {":free": FREE, ":zero": 0}, drop_token=True)
+
+    def status(self) -> List[dict]:
+        """Lease items of every shard of the job (missing shards are reported as free)."""
+        client = self.table.meta.client
+        keys = [{"lease_id": self.lease_id(s)} for s in range(self.num_shards)]
+        found = {}
+        for i in range(0, len(keys), 100):
+            request = {self.table.name: {"Keys": keys[i:i + 100], "ConsistentRead": True}}
+            while request:
+                resp = client.batch_get_item(RequestItems=request)
+                for item in resp.get("Responses", {}).get(self.table.name, []):
+                    found[item["lease_id"]] = item
+                request = resp.get("UnprocessedKeys") or None
+        return [found.get(self.lease_id(s), {"lease_id": self.lease_id(s), "shard": s, "state": FREE})
+                for s in range(self.num_shards)]
+
+class Heartbeat:
+    """Renews one lease in the background; .lost is set if the lease could not be renewed."""
+    def __init__(self, leases: ShardLeases, shard: int, interval: Optional[float] = None):
+        self.leases = leases
+        self.shard = shard
+        self.interval = interval or max(1.0, leases.lease_seconds / 3.0)
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{shard}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.leases.renew(self.shard)
+            except LeaseLost as e:
+                print(f"⚠️ {e}")
+                self.lost.set()
+                return
+            except Exception as e:  # transient; the next beat retries before expiry
+                print(f"⚠️ Lease renewal for shard {self.shard} failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def run_shards(leases: ShardLeases, process: Callable[[int], Optional[dict]], wait: bool = True,
+               poll_seconds: float = DEFAULT_POLL_SECONDS, max_shards: Optional[int] = None) -> dict:
+    """
+    Claim and process shards until the job is done. process(shard) runs the
+    existing extract -> transform -> load for one shard and may return a small
+    summary dict that is stored on the lease. A failing shard is released for
+    another attempt and the error is re-raised once this worker stops.
+    With wait=True the worker keeps polling while other workers hold leases,
+    so it can take over shards whose owners died; max_shards caps how many
+    shards this worker processes.
+    """
+    processed, failed = [], []
+    first_error = None
+    order = list(range(leases.num_shards))
+    random.Random(leases.worker_id).shuffle(order)  # spread workers over the shards
+    while True:
+        claimed_any = False
+        for shard in order:
+            if max_shards is not None and len(processed) >= max_shards:
+                break
+            if not leases.claim(shard):
+                continue
+            claimed_any = True
+            print(f"🔒 {leases.worker_id} claimed shard {shard + 1}/{leases.num_shards} of {leases.job}")
+            t0 = time.time()
+            try:
+                with Heartbeat(leases, shard) as hb:
+                    result = process(shard)
+                if hb.lost.is_set():
+                    raise LeaseLost(f"lease on {leases.lease_id(shard)} was lost while processing")
+                leases.complete(shard, result)
+                processed.append(shard)
+                print(f"✅ Shard {shard + 1}/{leases.num_shards} done in {time.time() - t0:.1f}s")
+            except LeaseLost as e:
+                # someone else owns it now and will finish it
+                print(f"⚠️ {e}")
+            except Exception as e:
+                print(f"❌ Shard {shard + 1}/{leases.num_shards} failed: {e}")
+                failed.append(shard)
+                first_error = first_error or e
+                try:
+                    leases.release(shard)
+                except LeaseLost:
+                    pass
+        if max_shards is not None and len(processed) >= max_shards:
+            break
+        if first_error is not None:
+            break
+        states = [item.get("state") for item in leases.status()]
+        remaining = sum(1 for s in states if s != DONE)
+        if remaining == 0 or not wait:
+            break
+        if not claimed_any:
+            print(f"⏳ {remaining} shard(s) of {leases.job} held by other workers; polling in {poll_seconds:.0f}s")
+            time.sleep(poll_seconds)
+    summary = {"job": leases.job, "worker": leases.worker_id, "processed": sorted(processed),
+               "failed": sorted(failed)}
+    print(f"🏁 Worker {leases.worker_id} finished: {len(processed)} shard(s) processed, {len(failed)} failed")
+    if first_error is not None:
+        raise first_error
+    return summary
@@ -0,0 +1,429 @@
+# mirror.py
+"""
+Local SQLite mirror of the feed tables for ad-hoc joins and aggregations.
+
+The loaders stage the rows they write during a run and apply them to the
+mirror in one SQLite transaction after their DynamoDB writes (next to the
+change log commit), keeping only rows whose write succeeded. A crashed run
+leaves the mirror at the previous run, like the change log. Each applied run
+is recorded in mirror_runs.
+
+    cisa        cve PK, vendor_project, product, vulnerability_name, date_added, due_date, ransomware
+    epss        cve PK, epss, percentile, date
+    exploit     id PK, cve_ids, date_published, type, platform, verified
+    metasploit  id PK, module_key, fullname, rank, type, cve_id
+    misp        uuid PK, value, type, description
+    cve_links   (cve, feed, key): CVEs referenced by exploit / metasploit / misp rows
+    cve_overview  view: one row per CVE with KEV flag, EPSS and exploit / module counts
+    risk_*      precomputed top-K ranking (common/risk_rank.py), refreshed after each run
+    *.text.idx  full-text index file next to the mirror (common/text_search.py), refreshed after each run
+    *.misp_graph.idx  MISP alias index and related-cluster graph (common/misp_graph.py)
+
+Every feed table also keeps the full record as JSON in `item` (json_extract
+works on any attribute). Queries run locally and never touch DynamoDB:
+
+    python -m common.mirror query "SELECT k.cve, e.epss FROM cisa k JOIN epss e USING (cve)
+        WHERE e.epss > 0.5 AND EXISTS (SELECT 1 FROM cve_links l
+                                       WHERE l.cve = k.cve AND l.feed = 'metasploit')"
+    python -m common.mirror rebuild [--tables cisa,epss] [--from-snapshot DIR]
+
+rebuild fills the mirror from a full scan of DynamoDB (or a Parquet snapshot
+from common/table_snapshot.py); use it once when enabling the mirror, since
+runs only apply the rows they changed. DuckDB users can attach the file
+directly (ATTACH 'vuln_mirror.sqlite' (TYPE sqlite)).
+
+Path: the loaders' MIRROR_DB config / VULN_MIRROR_DB env. The mirror is off
+unless one is set, e.g. VULN_MIRROR_DB=mirror/vuln_mirror.sqlite (git-ignored).
+"""
+import os
+import sys
+import json
+import math
+import time
+import sqlite3
+import argparse
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.compression import decompress_item
+from common.cve import find_all_cves
+
+DEFAULT_MIRROR_DB = os.getenv("VULN_MIRROR_DB", "")  # "" -> mirror off (opt-in)
+STAGE_BATCH = 5000
+BUSY_TIMEOUT_S = 60  # loaders of different feeds may commit at the same time
+RISK_RANK = os.getenv("RISK_RANK", "1").lower() not in {"0", "false", "no"}  # refresh the top-K ranking after each run
+TEXT_INDEX = os.getenv("TEXT_INDEX", "1").lower() not in {"0", "false", "no"}  # refresh the full-text index after each run
+MISP_GRAPH = os.getenv("MISP_GRAPH", "1").lower() not in {"0", "false", "no"}  # refresh the MISP alias / related graph
+
+# feed -> (primary key column, source attribute, [(column, source attribute, SQL type)])
+MIRROR_TABLES = {
+    "cisa": ("cve", "cveID", [("vendor_project", "vendorProject", "TEXT"), ("product", "product", "TEXT"),
+                              ("vulnerability_name", "vulnerabilityName", "TEXT"), ("date_added", "dateAdded", "TEXT"),
+                              ("due_date", "dueDate", "TEXT"), ("ransomware", "knownRansomwareCampaignUse", "TEXT")]),
+    "epss": ("cve", "cve", [("epss", "epss", "REAL"), ("percentile", "percentile", "REAL"), ("date", "date", "TEXT")]),
+    "exploit": ("id", "id", [("cve_ids", "CVE_id", "TEXT"), ("date_published", "date_published", "TEXT"),
+                             ("type", "type", "TEXT"), ("platform", "platform", "TEXT"), ("verified", "verified", "TEXT")]),
+    "metasploit": ("id", "id", [("module_key", "module_key", "TEXT"), ("fullname", "fullname", "TEXT"),
+                                ("rank", "rank", "TEXT"), ("type", "type", "TEXT"), ("cve_id", "cve_id", "TEXT")]),
+    "misp": ("uuid", "uuid", [("value", "value", "TEXT"), ("type", "type", "TEXT"),
+                              ("description", "description", "TEXT")]),
+}
+
+# feed -> attributes scanned for CVE ids into cve_links
+LINK_ATTRIBUTES = {
+    "exploit": ("CVE_id",),
+    "metasploit": ("cve_id",),
+    "misp": ("value",),
+}
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS cisa_date_added ON cisa (date_added)",
+    "CREATE INDEX IF NOT EXISTS cisa_vendor ON cisa (vendor_project)",
+    "CREATE INDEX IF NOT EXISTS epss_score ON epss (epss)",
+    "CREATE INDEX IF NOT EXISTS epss_percentile ON epss (percentile)",
+    "CREATE INDEX IF NOT EXISTS exploit_published ON exploit (date_published)",
+    "CREATE INDEX IF NOT EXISTS cve_links_cve ON cve_links (cve, feed)",
+    # rows applied by one run (common/risk_rank.py re-scores only those CVEs)
+    "CREATE INDEX IF NOT EXISTS cisa_updated ON cisa (updated_at)",
+    "CREATE INDEX IF NOT EXISTS epss_updated ON epss (updated_at)",
+    "CREATE INDEX IF NOT EXISTS exploit_updated ON exploit (updated_at)",
+    "CREATE INDEX IF NOT EXISTS metasploit_updated ON metasploit (updated_at)",
+)
+
+OVERVIEW_VIEW = """
+CREATE VIEW IF NOT EXISTS cve_overview AS
+WITH cves AS (
+    SELECT cve FROM epss
+    UNION ALL SELECT cve FROM cisa WHERE cve NOT IN (SELECT cve FROM epss)
+    UNION ALL SELECT DISTINCT cve FROM cve_links
+              WHERE cve NOT IN (SELECT cve FROM epss) AND cve NOT IN (SELECT cve FROM cisa)
+)
+SELECT c.cve,
+       k.cve IS NOT NULL AS in_kev,
+       k.date_added AS kev_date_added,
+       k.ransomware AS kev_ransomware,
+       e.epss,
+       e.percentile,
+       (SELECT COUNT(*) FROM cve_links l WHERE l.cve = c.cve AND l.feed = 'exploit') AS exploits,
+       (SELECT COUNT(*) FROM cve_links l WHERE l.cve = c.cve AND l.feed = 'metasploit') AS metasploit_modules
+FROM cves c
+LEFT JOIN cisa k ON k.cve = c.cve
+LEFT JOIN epss e ON e.cve = c.cve
+"""
+
+def _json_default(v):
+    if isinstance(v, Decimal):
+        return int(v) if v == v.to_integral_value() else float(v)
+    if isinstance(v, (set, frozenset)):
+        return sorted(v, key=str)
+    if isinstance(v, (bytes, bytearray)):
+        return None
+    return str(v)
+
+def _clean(value):
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+def _column_value(value, sql_type: str):
+    if value is None or value == "":
+        return None
+    if sql_type == "REAL":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    if isinstance(value, (list, dict, set)):
+        return json.dumps(value, default=_json_default, ensure_ascii=False)
+    return str(value)
+
+def connect(path: Optional[str] = None, read_only: bool = False) -> sqlite3.Connection:
+    """Connection to the mirror (schema created if needed); read_only opens the file with mode=ro."""
+    path = path or DEFAULT_MIRROR_DB
+    if not path:
+        raise ValueError("No mirror path: pass --db or set VULN_MIRROR_DB")
+    if read_only:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Mirror {path} not found (run `python -m common.mirror rebuild`)")
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_S, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # check_same_thread off: the async DynamoDB backend pulls (and stages) items on a helper thread, one at a time
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_S, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")  # readers are not blocked by a loader's commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    ensure_schema(conn)
+    return conn
+
+def ensure_schema(conn: sqlite3.Connection):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for feed, (pk, _, columns) in MIRROR_TABLES.items():
+            cols = ", ".join(f"{name} {sql_type}" for name, _, sql_type in columns)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {feed} ({pk} TEXT PRIMARY KEY, {cols}, item TEXT, updated_at TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS cve_links (cve TEXT NOT NULL, feed TEXT NOT NULL, key TEXT NOT NULL, "
+                     "PRIMARY KEY (feed, key, cve))")
+        conn.execute("CREATE TABLE IF NOT EXISTS mirror_runs (run_id TEXT, feed TEXT, applied_at TEXT, rows INTEGER, "
+                     "replaced INTEGER, changelog_seq INTEGER)")
+        for ddl in INDEXES:
+            conn.execute(ddl)
+        conn.execute(OVERVIEW_VIEW)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+class MirrorRun:
+    """
+    Rows of one loader run for one feed. stage() buffers rows in a temp table
+    (outside the mirror); commit() applies those whose key was written, in one
+    transaction. Nothing reaches the mirror tables without commit().
+    """
+    def __init__(self, path: Optional[str], feed: str, run_id: Optional[str] = None):
+        if feed not in MIRROR_TABLES:
+            raise ValueError(f"Unknown feed: {feed} (expected one of {sorted(MIRROR_TABLES)})")
+        self.path = path or DEFAULT_MIRROR_DB
+        self.feed = feed
+        self.run_id = run_id or f"{feed}-{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+        self.pk, self.source_key, self.columns = MIRROR_TABLES[feed]
+        self.staged = 0
+        self.failed = None
+        self._buffer, self._links = [], []
+        self.conn = connect(self.path)
+        names = ", ".join(name for name, _, _ in self.columns)
+        self.conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS stage ({self.pk} TEXT PRIMARY KEY, {names}, item TEXT)")
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS stage_links (key TEXT, cve TEXT)")
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS written (key TEXT PRIMARY KEY)")
+
+    def stage(self, item: dict):
+        """Buffer one record (as written to DynamoDB, compressed attributes are decoded)."""
+        key = item.get(self.source_key)
+        if key is None or self.failed:
+            return
+        item = {k: _clean(v) for k, v in decompress_item(item).items()}
+        key = str(key)
+        row = [key] + [_column_value(item.get(attr), sql_type) for _, attr, sql_type in self.columns]
+        row.append(json.dumps(item, default=_json_default, ensure_ascii=False))
+        self._buffer.append(row)
+        for attr in LINK_ATTRIBUTES.get(self.feed, ()):
+            value = item.get(attr)
+            if value:
+                self._links.extend((key, cve) for cve in find_all_cves(value))
+        if len(self._buffer) >= STAGE_BATCH:
+            try:
+                self._flush()
+            except sqlite3.Error as e:
+                # never break the DynamoDB load that feeds stage(); commit() reports it
+                self.failed = e
+                self._buffer, self._links = [], []
+
+    def stage_many(self, items: Iterable[dict]):
+        for item in items:
+            self.stage(item)
+
+    def _flush(self):
+        if not self._buffer and not self._links:
+            return
+        marks = ", ".join("?" * (len(self.columns) + 2))
+        self.conn.execute("BEGIN")
+        self.conn.executemany(f"INSERT OR REPLACE INTO temp.stage VALUES ({marks})", self._buffer)
+        self.conn.executemany("INSERT INTO temp.stage_links VALUES (?, ?)", self._links)
+        self.conn.execute("COMMIT")
+        self.staged += len(self._buffer)
+        self._buffer, self._links = [], []
+
+    def commit(self, written_keys: Optional[Iterable] = None, replace: bool = False,
+               changelog_seq: Optional[int] = None) -> int:
+        """
+        Apply staged rows in one transaction. written_keys limits them to keys
+        whose DynamoDB write succeeded (None: all staged rows). replace=True
+        first empties the feed's table (full rebuild). Returns rows applied.
+        """
+        if self.failed:
+            self.close()
+            raise self.failed
+        self._flush()
+        conn = self.conn
+        if written_keys is not None:
+            conn.execute("BEGIN")
+            conn.executemany("INSERT OR IGNORE INTO temp.written VALUES (?)", ((str(k),) for k in written_keys))
+            conn.execute("COMMIT")
+            keep = f"WHERE {self.pk} IN (SELECT key FROM temp.written)"
+            keep_links = "WHERE key IN (SELECT key FROM temp.written)"
+        else:
+            keep, keep_links = "", ""
+        names = ", ".join(name for name, _, _ in self.columns)
+        # microseconds: the stamp identifies this run's rows for the derived indexes, even for runs within a second
+        t = time.time()
+        now = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t)) + f".{int(t % 1 * 1e6):06d}Z"
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if replace:
+                conn.execute(f"DELETE FROM {self.feed}")
+                conn.execute("DELETE FROM cve_links WHERE feed = ?", (self.feed,))
+            cur = conn.execute(f"INSERT OR REPLACE INTO {self.feed} ({self.pk}, {names}, item, updated_at) "
+                               f"SELECT {self.pk}, {names}, item, ? FROM temp.stage {keep}", (now,))
+            applied = cur.rowcount
+            if self.feed in LINK_ATTRIBUTES:
+                if not replace:
+                    conn.execute(f"DELETE FROM cve_links WHERE feed = ? AND key IN "
+                                 f"(SELECT {self.pk} FROM temp.stage {keep})", (self.feed,))
+                conn.execute(f"INSERT OR IGNORE INTO cve_links (cve, feed, key) "
+                             f"SELECT cve, ?, key FROM temp.stage_links {keep_links}", (self.feed,))
+            conn.execute("INSERT INTO mirror_runs VALUES (?, ?, ?, ?, ?, ?)",
+                         (self.run_id, self.feed, now, applied, int(replace), changelog_seq))
+            conn.execute("COMMIT")
+            # refresh planner statistics (sampled) so joins start from the small side
+            conn.execute("PRAGMA analysis_limit=1000")
+            conn.execute(f"ANALYZE {self.feed}")
+            conn.execute("ANALYZE cve_links")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            self.close()
+        print(f"🪞 Mirror: {applied} {self.feed} rows applied to {self.path}")
+        _refresh_derived(self.path, self.feed)
+        return applied
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()  # temp staging tables go away with the connection
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # without commit() the staged rows are discarded
+        self.close()
+
+def _refresh_derived(path: str, feed: str):
+    """Incremental update of the files derived from the mirror; failures only warn."""
+    if RISK_RANK:
+        try:
+            from common.risk_rank import update
+            update(path)
+        except Exception as e:
+            print(f"⚠️ Risk ranking update failed (run `python -m common.risk_rank rebuild`): {e}")
+    if TEXT_INDEX and feed != "epss":  # EPSS rows carry no text
+        try:
+            from common.text_search import update
+            update(path)
+        except Exception as e:
+            print(f"⚠️ Text index update failed (run `python -m common.text_search rebuild`): {e}")
+    if MISP_GRAPH and feed == "misp":
+        try:
+            from common.misp_graph import update
+            update(path)
+        except Exception as e:
+            print(f"⚠️ MISP graph update failed (run `python -m common.misp_graph rebuild`): {e}")
+
+def open_mirror(path: Optional[str], feed: str, run_id: Optional[str] = None) -> Optional[MirrorRun]:
+    """MirrorRun for feed, or None when the mirror is disabled (falsy path). Errors only warn."""
+    if not path:
+        return None
+    try:
+        return MirrorRun(path, feed, run_id)
+    except sqlite3.Error as e:
+        print(f"⚠️ Mirror {path} unavailable, skipping: {e}")
+        return None
+
+def apply_run(path: Optional[str], feed: str, items: Iterable[dict], written_keys: Optional[Iterable] = None,
+              changelog=None) -> int:
+    """
+    Loader hook: stage a run's items and apply those whose key was written.
+    Tagged with the change log's run id / last seq when one is given. Returns
+    rows applied; a mirror failure only warns (DynamoDB stays the source of truth).
+    """
+    run = open_mirror(path, feed, changelog.run_id if changelog else None)
+    if run is None:
+        return 0
+    try:
+        with run:
+            run.stage_many(items)
+            return run.commit(written_keys, changelog_seq=changelog.seq if changelog else None)
+    except sqlite3.Error as e:
+        print(f"⚠️ Mirror update for {feed} failed (run `python -m common.mirror rebuild --tables {feed}`): {e}")
+        return 0
+
+def query(sql: str, params: Iterable = (), path: Optional[str] = None) -> List[Dict]:
+    """Run a read-only query against the mirror; rows as dicts."""
+    conn = connect(path, read_only=True)
+    try:
+        return [dict(r) for r in conn.execute(sql, tuple(params))]
+    finally:
+        conn.close()
+
+# ----- rebuild -----
+
+def _scan_items(table_name: str, cfg: dict) -> Iterable[dict]:
+    from common.aws import get_resource
+    ddb = get_resource("dynamodb", region_name=cfg["AWS_REGION"], endpoint_url=cfg["DDB_ENDPOINT"],
+                       aws_access_key_id=cfg["AWS_ACCESS_KEY_ID"], aws_secret_access_key=cfg["AWS_SECRET_ACCESS_KEY"])
+    paginator = ddb.meta.client.get_paginator("scan")  # resource client: native values
+    for page in paginator.paginate(TableName=table_name):
+        yield from page.get("Items", [])
+
+def _snapshot_items(snapshot_dir: str, table_name: str) -> Iterable[dict]:
+    from common.table_snapshot import iter_file_items, read_manifest
+    info = read_manifest(snapshot_dir)["tables"].get(table_name)
+    if info is None:
+        print(f"⚠️ {table_name} is not in snapshot {snapshot_dir}")
+        return
+    for rel in info["files"]:
+        yield from iter_file_items(os.path.join(snapshot_dir, rel))
+
+def rebuild(feeds: Optional[Iterable[str]] = None, path: Optional[str] = None,
+            snapshot_dir: Optional[str] = None, config: Optional[dict] = None) -> Dict[str, int]:
+    """Replace the mirror contents of each feed with a full scan of its table (or a snapshot)."""
+    from common.query import DEFAULT_CONFIG, FEED_TABLES
+    cfg = {**DEFAULT_CONFIG, **(config or {})}
+    counts = {}
+    for feed in feeds or MIRROR_TABLES:
+        table_name = FEED_TABLES[feed][0]
+        source = f"snapshot {snapshot_dir}" if snapshot_dir else f"{table_name} @ {cfg['DDB_ENDPOINT']}"
+        print(f"🔄 Rebuilding mirror table {feed} from {source}...")
+        t0 = time.time()
+        with MirrorRun(path, feed, run_id=f"rebuild-{feed}-{time.strftime('%Y%m%dT%H%M%S')}") as run:
+            run.stage_many(_snapshot_items(snapshot_dir, table_name) if snapshot_dir else _scan_items(table_name, cfg))
+            counts[feed] = run.commit(replace=True)
+        print(f"✅ {feed}: {counts[feed]} rows in {time.time() - t0:.1f}s")
+    return counts
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Query or rebuild the local SQLite mirror of the feed tables")
+    ap.add_argument("--db", default=DEFAULT_MIRROR_DB or None, required=not DEFAULT_MIRROR_DB,
+                    help="mirror file (default: VULN_MIRROR_DB)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    q = sub.add_parser("query", help="run SQL and print rows")
+    q.add_argument("sql")
+    q.add_argument("--json", action="store_true", help="one JSON object per row instead of a table")
+    r = sub.add_parser("rebuild", help="replace mirror contents with the current tables")
+    r.add_argument("--tables", default="", help="comma-separated feeds (default: all)")
+    r.add_argument("--from-snapshot", default=None, help="Parquet snapshot directory instead of DynamoDB")
+    r.add_argument("--endpoint", default=None)
+    args = ap.parse_args(argv)
+
+    if args.command == "rebuild":
+        feeds = [t.strip() for t in args.tables.split(",") if t.strip()] or None
+        rebuild(feeds, args.db, args.from_snapshot, {"DDB_ENDPOINT": args.endpoint} if args.endpoint else None)
+        return
+    t0 = time.perf_counter()
+    rows = query(args.sql, path=args.db)
+    elapsed = (time.perf_counter() - t0) * 1000
+    if args.json:
+        for row in rows:
+            sys.stdout.write(json.dumps(row, ensure_ascii=False) + "\n")
+    elif rows:
+        cols = list(rows[0])
+        widths = [min(40, max(len(c), *(len(str(r[c])) for r in rows))) for c in cols]
+        print("  ".join(c.ljust(w) for c, w in zip(cols, widths)))
+        for row in rows:
+            print("  ".join(str(row[c])[:w].ljust(w) for c, w in zip(cols, widths)))
+    print(f"({len(rows)} rows, {elapsed:.1f} ms)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+# misp_graph.py
+"""
+Alias resolution and relationship graph for the MISP galaxy clusters.
+
+The loader stores each cluster's meta.synonyms and related entries as JSON
+strings. This module keeps them in precomputed form, in one memory-mappable
+file next to the mirror (<mirror>.misp_graph.idx, or VULN_MISP_GRAPH; layout
+in common/array_file.py):
+
+    node_*                 one node per cluster uuid (plus uuids only seen as a related target)
+    uuid_hash / uuid_node  sorted 64-bit hashes of the uuids -> node
+    alias_hash / alias_node / alias_*   sorted hashes of normalized names (value + synonyms) -> node
+    out_indptr / out_dst / out_rel      related edges in CSR form (source -> dest-uuid, relation type)
+    in_indptr / in_src / in_rel         the same edges reversed
+
+Resolving an alias is one binary search over alias_hash, and the matching
+names are checked against the query. A k-hop walk expands the whole frontier
+with vectorized CSR slices per hop.
+
+The mirror triggers update() after each MISP run (MISP_GRAPH=0 turns that
+off). Only clusters written since the file's mirror_runs cursor are re-read.
+Their aliases and outgoing edges are replaced; a run that replaced the table
+rebuilds the graph. Manual use:
+
+    python -m common.misp_graph resolve "Fancy Bear"
+    python -m common.misp_graph related "APT28" [--hops 2] [--direction both] [--relations similar]
+    python -m common.misp_graph update | rebuild
+"""
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import argparse
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.array_file import ReloadingFile, Strings, csr_strings, map_arrays, write_arrays
+from common.mirror import DEFAULT_MIRROR_DB, connect
+
+MAGIC = b"MISPGRF1"
+FORMAT = 1
+NO_TYPE = np.iinfo(np.uint16).max  # node only known as a related target
+DEFAULT_RELATION = "related"
+DIRECTIONS = ("out", "in", "both")
+
+_SEP_RE = re.compile(r"[\W_]+")
+
+def graph_path(mirror_path: Optional[str] = None) -> str:
+    return os.getenv("VULN_MISP_GRAPH") or os.path.splitext(mirror_path or DEFAULT_MIRROR_DB)[0] + ".misp_graph.idx"
+
+def normalize_alias(name) -> str:
+    """Case-folded words ("Fancy-Bear" and "fancy bear" match)."""
+    return " ".join(_SEP_RE.sub(" ", str(name).casefold()).split())
+
+def key_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _hashes(texts: List[str]) -> np.ndarray:
+    return np.fromiter((key_hash(t) for t in texts), dtype=np.uint64, count=len(texts))
+
+def _as_list(value) -> list:
+    """Lists arrive as lists, JSON strings (as written to DynamoDB) or single values."""
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return [value]
+        value = parsed
+    if isinstance(value, dict):
+        return [value]
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+def cluster_aliases(item: dict) -> List[str]:
+    """Display names of a cluster: value, name and meta.synonyms (unique by normalized form)."""
+    seen, out = set(), []
+    for name in [item.get("value"), item.get("name")] + _as_list(item.get("meta.synonyms")):
+        if name is None or isinstance(name, (dict, list)):
+            continue
+        key = normalize_alias(name)
+        if key and key not in seen:
+            seen.add(key)
+            out.append(str(name).strip())
+    return out
+
+def cluster_edges(item: dict) -> List[Tuple[str, str]]:
+    """(dest uuid, relation type) for each related entry."""
+    edges = []
+    for rel in _as_list(item.get("related")):
+        if isinstance(rel, dict):
+            dest = rel.get("dest-uuid") or rel.get("uuid")
+            kind = rel.get("type") or DEFAULT_RELATION
+        else:
+            dest, kind = rel, DEFAULT_RELATION
+        if dest:
+            edges.append((str(dest), str(kind)))
+    return edges
+
+def _gather(indptr: np.ndarray, targets: np.ndarray, rels: np.ndarray, frontier: np.ndarray):
+    """Concatenated CSR rows of all frontier nodes (targets, relation codes)."""
+    starts = indptr[frontier]
+    lens = indptr[frontier + 1] - starts
+    total = int(lens.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    pos = np.repeat(starts - np.cumsum(lens) + lens, lens) + np.arange(total)
+    return targets[pos].astype(np.int64), rels[pos].astype(np.int64)
+
+class MispGraph:
+    """Read-only view of a graph file (memory-mapped)."""
+    def __init__(self, path: str):
+        self.path = path
+        self.header, arrays = map_arrays(path, MAGIC, FORMAT)
+        for name, arr in arrays.items():
+            setattr(self, name, arr)
+        self.uuids = Strings(self.node_bytes, self.node_offsets)
+        self.names = Strings(self.name_bytes, self.name_offsets)
+        self.alias_names = Strings(self.alias_bytes, self.alias_offsets)
+        self.types = self.header["types"]
+        self.relations = self.header["relations"]
+        self.n_nodes = len(self.node_type)
+        self.cursor = self.header["cursor"]
+
+    def node_id(self, uuid: str) -> int:
+        h = np.uint64(key_hash(str(uuid)))
+        lo, hi = np.searchsorted(self.uuid_hash, h, "left"), np.searchsorted(self.uuid_hash, h, "right")
+        for node in self.uuid_node[lo:hi]:
+            if self.uuids.str(node) == uuid:
+                return int(node)
+        return -1
+
+    def node(self, i: int) -> Dict:
+        t = int(self.node_type[i])
+        return {"uuid": self.uuids.str(i), "value": self.names.str(i) or None,
+                "type": self.types[t] if t != NO_TYPE else None}
+
+    def resolve(self, name: str) -> List[Dict]:
+        """Clusters whose value or synonym matches name (normalized); several galaxies may share a name."""
+        key = normalize_alias(name)
+        h = np.uint64(key_hash(key))
+        lo, hi = np.searchsorted(self.alias_hash, h, "left"), np.searchsorted(self.alias_hash, h, "right")
+        nodes = [int(self.alias_node[i]) for i in range(lo, hi) if normalize_alias(self.alias_names.str(i)) == key]
+        return [self.node(n) for n in dict.fromkeys(nodes)]
+
+    def lookup(self, ref: str) -> List[int]:
+        """Node ids for a uuid or an alias."""
+        node = self.node_id(ref)
+        if node >= 0:
+            return [node]
+        return [self.node_id(c["uuid"]) for c in self.resolve(ref)]
+
+    def aliases(self, uuid: str) -> List[str]:
+        node = self.node_id(uuid)
+        return [self.alias_names.str(i) for i in np.flatnonzero(self.alias_node == node)] if node >= 0 else []
+
+    def _step(self, frontier: np.ndarray, direction: str, relations: Optional[np.ndarray]):
+        parts = []
+        if direction in ("out", "both"):
+            parts.append(_gather(self.out_indptr, self.out_dst, self.out_rel, frontier))
+        if direction in ("in", "both"):
+            parts.append(_gather(self.in_indptr, self.in_src, self.in_rel, frontier))
+        nodes = np.concatenate([p[0] for p in parts])
+        rels = np.concatenate([p[1] for p in parts])
+        if relations is not None:
+            keep = np.isin(rels, relations)
+            nodes, rels = nodes[keep], rels[keep]
+        return nodes, rels
+
+    def _relation_codes(self, relations: Optional[Iterable[str]]) -> Optional[np.ndarray]:
+        if not relations:
+            return None
+        return np.array([i for i, r in enumerate(self.relations) if r in set(relations)], dtype=np.int64)
+
+    def neighbors(self, ref: str, direction: str = "out", relations: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Directly related clusters with the relation type of each edge."""
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {DIRECTIONS}")
+        start = np.array(self.lookup(ref), dtype=np.int64)
+        if not len(start):
+            return []
+        nodes, rels = self._step(start, direction, self._relation_codes(relations))
+        return [{**self.node(n), "relation": self.relations[r]} for n, r in zip(nodes.tolist(), rels.tolist())]
+
+    def khop(self, ref: str, hops: int = 2, direction: str = "both",
+             relations: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Clusters reachable within hops edges (breadth-first), each with its distance."""
+        if direction not in DIRECTIONS:
+            raise ValueError(f"direction must be one of {DIRECTIONS}")
+        frontier = np.unique(np.array(self.lookup(ref), dtype=np.int64))
+        if not len(frontier):
+            return []
+        codes = self._relation_codes(relations)
+        visited = np.zeros(self.n_nodes, dtype=bool)
+        visited[frontier] = True
+        out = []
+        for hop in range(1, max(0, hops) + 1):
+            nodes, _ = self._step(frontier, direction, codes)
+            nodes = np.unique(nodes)
+            frontier = nodes[~visited[nodes]]
+            if not len(frontier):
+                break
+            visited[frontier] = True
+            out.extend({**self.node(n), "hops": hop} for n in frontier.tolist())
+        return out
+
+class ReloadingGraph(ReloadingFile):
+    """MispGraph that is re-opened when the file is replaced."""
+    def __init__(self, path: str):
+        super().__init__(path, MispGraph)
+
+# ----- building -----
+
+def _csr(src: np.ndarray, dst: np.ndarray, rel: np.ndarray, n: int):
+    order = np.lexsort((dst, src))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum(np.bincount(src, minlength=n))
+    return indptr, dst[order].astype(np.int32), rel[order].astype(np.uint16)
+
+def update(mirror_path: Optional[str] = None, path: Optional[str] = None, full: bool = False) -> dict:
+    """Bring the graph up to date with the MISP runs applied to the mirror since its cursor."""
+    mirror_path = mirror_path or DEFAULT_MIRROR_DB
+    path = path or graph_path(mirror_path)
+    t0 = time.perf_counter()
+    old = None
+    if not full and os.path.exists(path):
+        try:
+            old = MispGraph(path)
+        except (ValueError, KeyError) as e:
+            print(f"⚠️ MISP graph {path} unreadable, rebuilding: {e}")
+    conn = connect(mirror_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # consistent view of the mirror; one graph writer at a time
+        cursor = old.cursor if old is not None else 0
+        runs = conn.execute("SELECT rowid, feed, applied_at, replaced FROM mirror_runs WHERE rowid > ? ORDER BY rowid",
+                            (cursor,)).fetchall()
+        last = runs[-1][0] if runs else cursor
+        misp_runs = [r for r in runs if r[1] == "misp"]
+        if old is not None and not misp_runs:
+            conn.execute("COMMIT")
+            return {"mode": "unchanged", "nodes": old.n_nodes}
+        if old is not None and any(r[3] for r in misp_runs):
+            old = None  # the table was replaced
+        if old is None:
+            rows = conn.execute("SELECT uuid, item FROM misp").fetchall()
+        else:
+            stamps = sorted({r[2] for r in misp_runs})
+            rows = conn.execute(f"SELECT uuid, item FROM misp WHERE updated_at IN ({', '.join('?' * len(stamps))})",
+                                stamps).fetchall()
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    if old is not None:
+        uuids, names = old.uuids.decode_all(), old.names.decode_all()
+        node_type = old.node_type.astype(np.int64).tolist()
+        types, relations = list(old.types), list(old.relations)
+        alias_node_old, alias_names_old = old.alias_node.astype(np.int64), old.alias_names.decode_all()
+        alias_hash_old = np.array(old.alias_hash)
+        uuid_hash_old = np.zeros(old.n_nodes, dtype=np.uint64)
+        uuid_hash_old[old.uuid_node] = old.uuid_hash
+        edge_src = np.repeat(np.arange(old.n_nodes), np.diff(old.out_indptr))
+        edge_dst, edge_rel = old.out_dst.astype(np.int64), old.out_rel.astype(np.int64)
+    else:
+        uuids, names, node_type, types, relations = [], [], [], [], []
+        alias_node_old, alias_names_old = np.zeros(0, dtype=np.int64), []
+        alias_hash_old = uuid_hash_old = np.zeros(0, dtype=np.uint64)
+        edge_src = edge_dst = edge_rel = np.zeros(0, dtype=np.int64)
+    ids = {u: i for i, u in enumerate(uuids)}
+    type_codes = {t: i for i, t in enumerate(types)}
+    rel_codes = {r: i for i, r in enumerate(relations)}
+
+    def node_for(uuid: str) -> int:
+        if uuid not in ids:
+            ids[uuid] = len(uuids)
+            uuids.append(uuid)
+            names.append("")
+            node_type.append(int(NO_TYPE))
+        return ids[uuid]
+
+    new_alias_node, new_alias_names, new_src, new_dst, new_rel = [], [], [], [], []
+    for uuid, item_json in rows:
+        item = json.loads(item_json) if item_json else {}
+        node = node_for(str(uuid))
+        names[node] = str(item.get("value") or "")
+        galaxy = item.get("type")
+        node_type[node] = type_codes.setdefault(str(galaxy), len(type_codes)) if galaxy else int(NO_TYPE)
+        for alias in cluster_aliases(item):
+            new_alias_node.append(node)
+            new_alias_names.append(alias)
+        for dest, kind in cluster_edges(item):
+            new_src.append(node)
+            new_dst.append(node_for(dest))
+            new_rel.append(rel_codes.setdefault(kind, len(rel_codes)))
+    n = len(uuids)
+
+    # replace the aliases and outgoing edges of the re-read clusters
+    changed = np.zeros(n, dtype=bool)
+    changed[np.array([ids[str(u)] for u, _ in rows], dtype=np.int64)] = True
+    keep_alias = ~changed[alias_node_old]
+    alias_node = np.concatenate([alias_node_old[keep_alias], np.array(new_alias_node, dtype=np.int64)])
+    alias_names = [a for a, k in zip(alias_names_old, keep_alias.tolist()) if k] + new_alias_names
+    # only new names and uuids are hashed
+    alias_hash = np.concatenate([alias_hash_old[keep_alias], _hashes([normalize_alias(a) for a in new_alias_names])])
+    uuid_hash = np.concatenate([uuid_hash_old, _hashes(uuids[len(uuid_hash_old):])])
+    keep_edge = ~changed[edge_src]
+    src = np.concatenate([edge_src[keep_edge], np.array(new_src, dtype=np.int64)])
+    dst = np.concatenate([edge_dst[keep_edge], np.array(new_dst, dtype=np.int64)])
+    rel = np.concatenate([edge_rel[keep_edge], np.array(new_rel, dtype=np.int64)])
+
+    alias_order = np.lexsort((alias_node, alias_hash))
+    uuid_order = np.argsort(uuid_hash, kind="stable")
+    out_indptr, out_dst, out_rel = _csr(src, dst, rel, n)
+    in_indptr, in_src, in_rel = _csr(dst, src, rel, n)
+    node_bytes, node_offsets = csr_strings(uuids)
+    name_bytes, name_offsets = csr_strings(names)
+    alias_bytes, alias_offsets = csr_strings([alias_names[i] for i in alias_order.tolist()])
+    write_arrays(path, MAGIC, FORMAT, {
+        "node_bytes": node_bytes, "node_offsets": node_offsets, "name_bytes": name_bytes, "name_offsets": name_offsets,
+        "node_type": np.array(node_type, dtype=np.uint16),
+        "uuid_hash": uuid_hash[uuid_order], "uuid_node": uuid_order.astype(np.int32),
+        "alias_hash": alias_hash[alias_order], "alias_node": alias_node[alias_order].astype(np.int32),
+        "alias_bytes": alias_bytes, "alias_offsets": alias_offsets,
+        "out_indptr": out_indptr, "out_dst": out_dst, "out_rel": out_rel,
+        "in_indptr": in_indptr, "in_src": in_src, "in_rel": in_rel,
+    }, {"cursor": last, "nodes": n, "edges": int(len(src)), "aliases": len(alias_names),
+        "types": sorted(type_codes, key=type_codes.get), "relations": sorted(rel_codes, key=rel_codes.get),
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())})
+    result = {"mode": "full" if old is None else "incremental", "nodes": n, "edges": int(len(src)),
+              "reread": len(rows), "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+    print(f"🕸️ MISP graph {result['mode']}: {result['reread']} clusters re-read, {n} nodes, "
+          f"{result['edges']} edges in {result['elapsed_ms']} ms")
+    return result
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="MISP alias resolution and related-cluster graph")
+    ap.add_argument("--db", default=DEFAULT_MIRROR_DB or None, required=not DEFAULT_MIRROR_DB,
+                    help="mirror file (default: VULN_MIRROR_DB)")
+    ap.add_argument("--graph", default=None, help="graph file (default: next to the mirror)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("resolve", help="clusters for an alias")
+    r.add_argument("name")
+    rel = sub.add_parser("related", help="clusters within --hops of a uuid or alias")
+    rel.add_argument("ref")
+    rel.add_argument("--hops", type=int, default=1)
+    rel.add_argument("--direction", choices=DIRECTIONS, default="both")
+    rel.add_argument("--relations", default="", help="comma-separated relation types (default: all)")
+    sub.add_parser("update", help="apply MISP runs since the last update")
+    sub.add_parser("rebuild", help="rebuild from every mirrored cluster")
+    args = ap.parse_args(argv)
+    path = args.graph or graph_path(args.db)
+    if args.command in ("update", "rebuild"):
+        update(args.db, path, full=args.command == "rebuild")
+        return
+    graph = MispGraph(path)
+    if args.command == "resolve":
+        rows = [{**c, "aliases": graph.aliases(c["uuid"])} for c in graph.resolve(args.name)]
+    else:
+        rows = graph.khop(args.ref, args.hops, args.direction, [x for x in args.relations.split(",") if x] or None)
+    for row in rows:
+        print(json.dumps(row, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# parallel.py
+"""
+Order-preserving sharded map over a process pool, used by the transforms.
+
+The input list is cut into contiguous shards; each shard is handled by a
+module-level function in a worker process and the per-shard results come
+back in input order. Small inputs (or workers <= 1) run in-process.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Sequence
+
+DEFAULT_MIN_ITEMS = 2000
+SHARDS_PER_WORKER = 4
+
+def resolve_workers(value) -> int:
+    """Worker count from config/env: '', None, 0 or 1 -> serial; 'auto' / -1 -> os.cpu_count()."""
+    if value is None or value == "":
+        return 1
+    if str(value).lower() == "auto" or int(value) < 0:
+        return os.cpu_count() or 1
+    return max(1, int(value))
+
+def shard(items: Sequence, n_shards: int) -> List[Sequence]:
+    """Split items into at most n_shards contiguous, nearly equal slices."""
+    n = len(items)
+    n_shards = max(1, min(n_shards, n))
+    size, extra = divmod(n, n_shards)
+    out = []
+    start = 0
+    for i in range(n_shards):
+        end = start + size + (1 if i < extra else 0)
+        out.append(items[start:end])
+        start = end
+    return out
+
+def map_shards(func: Callable, items: Sequence, workers: int, *args, min_items: int = DEFAULT_MIN_ITEMS) -> list:
+    """
+    Return [func(shard, *args) for shard in shards] computed on a process pool.
+    func must be a picklable module-level function; results keep input order.
+    """
+    if workers <= 1 or len(items) < min_items:
+        return [func(items, *args)]
+    shards = shard(items, workers * SHARDS_PER_WORKER)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(func, s, *args) for s in shards]
+        return [f.result() for f in futures]
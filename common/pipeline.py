@@ -0,0 +1,181 @@
+# pipeline.py
+"""
+Threaded extract -> transform -> load runner with bounded queues.
+
+Each stage runs in its own thread and hands batches to the next one through a
+queue.Queue(maxsize=queue_size). A full queue blocks the upstream stage, so at
+most about queue_size batches per link are in memory, and wall time tends
+toward the slowest stage instead of the sum of all stages. The sink receives an
+iterator over its input queue, so existing batch consumers such as
+write_batches(batches) can be plugged in unchanged.
+
+Network and DynamoDB stages release the GIL while waiting; CPU-heavy transforms
+can shard work with common.parallel.map_shards inside their stage function.
+"""
+import time
+import queue
+import threading
+from typing import Callable, Iterable, List, Sequence, Tuple
+
+DEFAULT_QUEUE_SIZE = 2
+_DONE = object()
+
+class StageMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0  # time spent inside the stage function / source iterator
+        self.blocked = 0.0  # time waiting on a full downstream queue (backpressure)
+        self.started = None
+        self.finished = None
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def as_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy_s": round(self.busy, 3),
+            "blocked_s": round(self.blocked, 3),
+            "items_per_s": round(self.items / self.busy, 2) if self.busy else None,
+        }
+
+class _Aborted(Exception):
+    pass
+
+class Pipeline:
+    """
+    source -> stages... -> sink. Usage:
+
+        result, metrics = Pipeline(queue_size=2).run(
+            ("extract", iter_batches()),
+            [("transform", transform_batch)],
+            ("load", write_batches))
+    """
+    def __init__(self, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.queue_size = max(1, int(queue_size))
+        self._abort = threading.Event()
+        self._errors = []
+
+    def _put(self, q: queue.Queue, item, m: StageMetrics):
+        t0 = time.perf_counter()
+        while True:
+            if self._abort.is_set():
+                raise _Aborted()
+            try:
+                q.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        m.blocked += time.perf_counter() - t0
+
+    def _get(self, q: queue.Queue):
+        while True:
+            if self._abort.is_set():
+                raise _Aborted()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def _fail(self, name: str, e: BaseException):
+        if not isinstance(e, _Aborted):
+            self._errors.append((name, e))
+        self._abort.set()
+
+    def _run_source(self, name: str, iterable: Iterable, out: queue.Queue, m: StageMetrics):
+        m.started = time.perf_counter()
+        try:
+            it = iter(iterable)
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                finally:
+                    m.busy += time.perf_counter() - t0
+                m.items += 1
+                self._put(out, item, m)
+            self._put(out, _DONE, m)
+        except BaseException as e:
+            self._fail(name, e)
+        finally:
+            m.finished = time.perf_counter()
+
+    def _run_stage(self, name: str, func: Callable, inq: queue.Queue, out: queue.Queue, m: StageMetrics):
+        m.started = time.perf_counter()
+        try:
+            while True:
+                item = self._get(inq)
+                if item is _DONE:
+                    break
+                t0 = time.perf_counter()
+                result = func(item)
+                m.busy += time.perf_counter() - t0
+                m.items += 1
+                self._put(out, result, m)
+            self._put(out, _DONE, m)
+        except BaseException as e:
+            self._fail(name, e)
+        finally:
+            m.finished = time.perf_counter()
+
+    def _drain(self, q: queue.Queue, m: StageMetrics):
+        """Iterator the sink consumes; its time outside this generator counts as busy."""
+        t_out = time.perf_counter()
+        while True:
+            m.busy += time.perf_counter() - t_out
+            item = self._get(q)
+            if item is _DONE:
+                return
+            m.items += 1
+            t_out = time.perf_counter()
+            yield item
+
+    def run(self, source: Tuple[str, Iterable], stages: Sequence[Tuple[str, Callable]],
+            sink: Tuple[str, Callable]) -> Tuple[object, List[dict]]:
+        """Run the pipeline to completion; returns (sink result, per-stage metrics). Stage errors are re-raised."""
+        names = [source[0]] + [s[0] for s in stages]
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in names]
+        metrics = [StageMetrics(n) for n in names] + [StageMetrics(sink[0])]
+        threads = [threading.Thread(target=self._run_source, name=source[0], daemon=True,
+                                    args=(source[0], source[1], queues[0], metrics[0]))]
+        for i, (name, func) in enumerate(stages, start=1):
+            threads.append(threading.Thread(target=self._run_stage, name=name, daemon=True,
+                                            args=(name, func, queues[i - 1], queues[i], metrics[i])))
+        wall0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        sink_m = metrics[-1]
+        sink_m.started = time.perf_counter()
+        result = None
+        try:
+            result = sink[1](self._drain(queues[-1], sink_m))
+        except BaseException as e:
+            self._fail(sink[0], e)
+        finally:
+            sink_m.finished = time.perf_counter()
+            # unblocks upstream stages if the sink stopped early or a stage failed
+            self._abort.set()
+            for t in threads:
+                t.join()
+        if self._errors:
+            name, err = self._errors[0]
+            print(f"❌ Pipeline stage '{name}' failed: {err}")
+            raise err
+        wall = time.perf_counter() - wall0
+        report = [m.as_dict() for m in metrics]
+        print(f"ℹ️ Pipeline finished in {wall:.1f}s")
+        for r in report:
+            print(f"   {r['stage']:<12} items={r['items']:<6} busy={r['busy_s']:.1f}s "
+                  f"blocked={r['blocked_s']:.1f}s rate={r['items_per_s']}/s")
+        return result, report
+
+def run_pipeline(source: Tuple[str, Iterable], stages: Sequence[Tuple[str, Callable]],
+                 sink: Tuple[str, Callable], queue_size: int = DEFAULT_QUEUE_SIZE):
+    return Pipeline(queue_size).run(source, stages, sink)
@@ -0,0 +1,213 @@
+# profiling.py
+"""
+Opt-in profiling for the pipeline entry points.
+
+Enable with PIPELINE_PROFILE=cprofile|sample (or --profile / --profile=sample on
+a *_main.py command line). Each stage wrapped in Profiler.stage(name) writes
+into the feed's daily_extract directory (or PROFILE_DIR):
+
+    <feed>_<run>_<stage>.prof        cProfile stats (load with pstats / snakeviz)
+    <feed>_<run>_<stage>.prof.txt    top functions by cumulative time
+    <feed>_<run>_<stage>.folded      sampled stacks, all threads (flamegraph.pl / speedscope)
+    <feed>_<run>_<stage>.alloc.txt   tracemalloc peak + top-N allocation sites for the stage
+
+cProfile sees only the calling thread. The sampling profiler polls every
+thread's stack (PROFILE_INTERVAL_MS, default 5), so it covers pipeline stage
+threads and has much lower overhead. With profiling off, stage() is a no-op.
+One stage is profiled at a time per process: stages and profiled entry points
+entered meanwhile, from any thread, run unprofiled inside it.
+"""
+import os
+import io
+import sys
+import time
+import pstats
+import cProfile
+import functools
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+MODES = ("cprofile", "sample")
+TOP_N = int(os.getenv("PROFILE_TOP_N", "30"))
+
+# name of the stage being profiled, process-wide: a loader entry point called from a
+# pipeline stage thread must see its parent's stage, and tracemalloc is global anyway
+_active_stage = None
+_active_lock = threading.Lock()
+
+def _claim_stage(name: str) -> bool:
+    """Mark name as the profiled stage; False if another stage is already being profiled."""
+    global _active_stage
+    with _active_lock:
+        if _active_stage is not None:
+            return False
+        _active_stage = name
+        return True
+
+def _release_stage():
+    global _active_stage
+    with _active_lock:
+        _active_stage = None
+
+def profile_mode(argv=None) -> Optional[str]:
+    """Mode from --profile[=mode] in argv, else PIPELINE_PROFILE; None when off."""
+    for arg in (sys.argv if argv is None else argv):
+        if arg == "--profile":
+            return "cprofile"
+        if arg.startswith("--profile="):
+            mode = arg.split("=", 1)[1].lower()
+            break
+    else:
+        mode = os.getenv("PIPELINE_PROFILE", "").lower()
+    if mode in ("", "0", "false", "off", "none"):
+        return None
+    if mode in ("1", "true", "on"):
+        return "cprofile"
+    if mode not in MODES:
+        raise ValueError(f"Unknown profile mode: {mode} (expected one of {MODES})")
+    return mode
+
+class StackSampler:
+    """Collects collapsed stacks of every thread but its own at a fixed interval."""
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                parts.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+class Profiler:
+    def __init__(self, feed: str, out_dir: str, mode: Optional[str] = None):
+        self.feed = feed
+        self.mode = mode
+        self.out_dir = os.getenv("PROFILE_DIR") or out_dir
+        self.run_id = time.strftime("%Y-%m-%d_%H%M%S")
+        self.interval = float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000.0
+
+    @classmethod
+    def from_env(cls, feed: str, out_dir: str, argv=None) -> "Profiler":
+        return cls(feed, out_dir, profile_mode(argv))
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not None
+
+    def _path(self, stage: str, suffix: str) -> str:
+        return os.path.join(self.out_dir, f"{self.feed}_{self.run_id}_{stage}{suffix}")
+
+    @contextmanager
+    def stage(self, name: str):
+        if self.enabled:
+            os.makedirs(self.out_dir, exist_ok=True)
+        if not self.enabled or not _claim_stage(name):
+            # off, or already inside a profiled stage (nested entry point, or a stage thread)
+            yield
+            return
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(int(os.getenv("PROFILE_TRACEBACK_DEPTH", "1")))
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        prof = sampler = None
+        if self.mode == "cprofile":
+            prof = cProfile.Profile()
+        else:
+            sampler = StackSampler(self.interval)
+            sampler.start()
+        t0 = time.perf_counter()
+        try:
+            if prof:
+                prof.enable()
+            yield
+        finally:
+            if prof:
+                prof.disable()
+            elapsed = time.perf_counter() - t0
+            _release_stage()
+            if sampler:
+                sampler.stop()
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            written = self._write(name, elapsed, prof, sampler, before, after, current, peak)
+            print(f"🔬 Profiled stage '{name}' ({elapsed:.1f}s, peak {peak / 1e6:.1f} MB): {', '.join(written)}")
+
+    def _write(self, name, elapsed, prof, sampler, before, after, current, peak):
+        written = []
+        if prof:
+            path = self._path(name, ".prof")
+            prof.dump_stats(path)
+            buf = io.StringIO()
+            pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(TOP_N)
+            with open(path + ".txt", "w", encoding="utf-8") as f:
+                f.write(buf.getvalue())
+            written.append(os.path.basename(path))
+        if sampler:
+            path = self._path(name, ".folded")
+            sampler.write(path)
+            written.append(os.path.basename(path))
+        path = self._path(name, ".alloc.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"feed={self.feed} stage={name} mode={self.mode} elapsed={elapsed:.3f}s\n")
+            f.write(f"traced current={current / 1e6:.2f} MB peak={peak / 1e6:.2f} MB\n")
+            if sampler:
+                f.write(f"samples={sampler.samples} interval={self.interval * 1000:.1f}ms\n")
+            f.write(f"\nTop {TOP_N} allocation sites still held at stage end (growth since stage start):\n")
+            for stat in after.compare_to(before, "lineno")[:TOP_N]:
+                f.write(f"{stat}\n")
+        written.append(os.path.basename(path))
+        return written
+
+def profiled_entry(feed: str, stage: str, out_dir: Optional[str] = None):
+    """
+    Decorator for loader entry points called without a *_main.py: profiles the call
+    when PIPELINE_PROFILE is set, into out_dir (default: <module dir>/daily_extract).
+    Inside a profiled main's stage it just calls through.
+    """
+    def wrap(func):
+        target = out_dir or os.path.join(os.path.dirname(os.path.abspath(sys.modules[func.__module__].__file__)),
+                                         "daily_extract")
+
+        @functools.wraps(func)
+        def inner(*args, **kwargs):
+            mode = profile_mode([])  # env only; argv belongs to whoever imported the loader
+            if mode is None or _active_stage is not None:
+                return func(*args, **kwargs)
+            with Profiler(feed, target, mode).stage(stage):
+                return func(*args, **kwargs)
+        return inner
+    return wrap
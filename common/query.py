@@ -0,0 +1,401 @@
+# query.py
+"""
+Read API over the vulnerability tables with an in-process LRU/TTL cache.
+
+    from common.query import get_cve, get_many, get_exploit, get_metasploit
+
+    get_cve("CVE-2021-44228")
+    -> {"cve": ..., "kev": {...} | None, "epss": {...} | None,
+        "exploits": [...], "metasploit": [...]}
+
+Hot keys are served from memory. After a feed run, pass its summary to
+invalidate_from_summary(feed, summary) so stale entries are dropped.
+
+Range lookups (kev_added_between, kev_due_between, kev_by_vendor, epss_above,
+exploits_for_platform, misp_by_type) query the secondary indexes from
+common/indexes.py and are not cached.
+"""
+import os
+import time
+import datetime
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from botocore.exceptions import ClientError
+
+from common.aws import get_resource
+from common.compression import decompress_item
+from common.cve import find_all_cves
+from common.indexes import (KEV_PARTITION, SCORE_INDEX_MIN, bucket, encode_score, query_buckets, query_index,
+                            score)
+
+DEFAULT_CONFIG = {
+    "DDB_ENDPOINT": os.getenv("DDB_ENDPOINT", "http://localhost:8000"),
+    "AWS_REGION": os.getenv("AWS_REGION", "us-east-1"),
+    "AWS_ACCESS_KEY_ID": os.getenv("AWS_ACCESS_KEY_ID"),  # None: common/aws.py credential policy
+    "AWS_SECRET_ACCESS_KEY": os.getenv("AWS_SECRET_ACCESS_KEY"),
+    "CACHE_MAX_ITEMS": 50000,
+    "CACHE_TTL_SECONDS": 3600,
+}
+
+# feed -> (table name, partition key)
+FEED_TABLES = {
+    "cisa": ("cisa_data", "cveID"),
+    "epss": ("epss_data", "cve"),
+    "exploit": ("exploit_data", "id"),
+    "metasploit": ("metasploit_data", "id"),
+    "misp": ("misp_data", "uuid"),
+}
+
+# feeds whose CVE ids are attributes, not the key: feed -> CVE attribute
+CVE_ATTRIBUTES = {
+    "exploit": "CVE_id",
+    "metasploit": "cve_id",
+}
+
+BATCH_GET_LIMIT = 100  # DynamoDB BatchGetItem hard limit
+_MISSING = object()
+
+class TTLCache:
+    """Thread-safe size-bounded LRU cache whose entries also expire after ttl seconds."""
+
+    def __init__(self, max_items: int = 50000, ttl: float = 3600):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=_MISSING):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_items:
+                self._data.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        """Drop every entry (or those whose key matches predicate); returns number dropped."""
+        with self._lock:
+            if predicate is None:
+                n = len(self._data)
+                self._data.clear()
+                return n
+            doomed = [k for k in self._data if predicate(k)]
+            for k in doomed:
+                del self._data[k]
+            return len(doomed)
+
+    def __len__(self):
+        return len(self._data)
+
+class VulnReader:
+    """Cached point and batch reads across the five feed tables."""
+
+    def __init__(self, config: dict = None, ddb_resource=None, table_clients: Dict = None):
+        cfg = DEFAULT_CONFIG.copy()
+        if config:
+            cfg.update(config)
+        self.cfg = cfg
+        self.ddb = ddb_resource or get_resource(
+            "dynamodb",
+            region_name=cfg["AWS_REGION"],
+            aws_access_key_id=cfg["AWS_ACCESS_KEY_ID"],
+            aws_secret_access_key=cfg["AWS_SECRET_ACCESS_KEY"],
+            endpoint_url=cfg["DDB_ENDPOINT"],
+        )
+        # optional feed -> low-level client (e.g. one connection pool per table)
+        self.table_clients = table_clients or {}
+        self.cache = TTLCache(cfg["CACHE_MAX_ITEMS"], cfg["CACHE_TTL_SECONDS"])
+        self._index_lock = threading.Lock()
+
+    def _client(self, feed: str):
+        # resource-backed clients are thread-safe and return deserialized items
+        return self.table_clients.get(feed) or self.ddb.meta.client
+
+    # ---------------- raw item access ----------------
+    def get_item(self, feed: str, key: str) -> Optional[Dict]:
+        """Return one item of a feed by partition key (None if absent); cached, including misses."""
+        ck = (feed, str(key))
+        cached = self.cache.get(ck)
+        if cached is not _MISSING:
+            return cached
+        table_name, pk = FEED_TABLES[feed]
+        try:
+            resp = self._client(feed).get_item(TableName=table_name, Key={pk: str(key)})
+        except ClientError as e:
+            print(f"⚠️ Warning fetching {pk}={key} from {table_name}: {e}")
+            return None
+        item = decompress_item(resp.get("Item"))
+        self.cache.set(ck, item)
+        return item
+
+    def get_items(self, feed: str, keys: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        """Batched variant of get_item; only cache misses go to DynamoDB via BatchGetItem."""
+        out = {}
+        pending = []
+        for key in dict.fromkeys(str(k) for k in keys):
+            cached = self.cache.get((feed, key))
+            if cached is _MISSING:
+                pending.append(key)
+            else:
+                out[key] = cached
+        if not pending:
+            return out
+
+        table_name, pk = FEED_TABLES[feed]
+        fetched = {}
+        failed = set()  # keys without a real response: returned as None but not cached
+        for i in range(0, len(pending), BATCH_GET_LIMIT):
+            chunk = pending[i:i + BATCH_GET_LIMIT]
+            request = {table_name: {"Keys": [{pk: k} for k in chunk]}}
+            attempt = 0
+            while request:
+                try:
+                    resp = self._client(feed).batch_get_item(RequestItems=request)
+                except ClientError as e:
+                    print(f"⚠️ Warning batch-reading {table_name}: {e}")
+                    failed.update(k[pk] for k in request[table_name]["Keys"])
+                    break
+                for it in resp.get("Responses", {}).get(table_name, []):
+                    fetched[str(it[pk])] = decompress_item(it)
+                request = resp.get("UnprocessedKeys") or None
+                if request:
+                    attempt += 1
+                    time.sleep(min(0.05 * (2 ** attempt), 2.0))
+
+        for key in pending:
+            item = fetched.get(key)
+            if key not in failed:
+                self.cache.set((feed, key), item)
+            out[key] = item
+        return out
+
+    # ---------------- CVE -> id index for exploit / metasploit ----------------
+    def _cve_index(self, feed: str) -> Dict[str, List[str]]:
+        """CVE -> [ids] for feeds that only carry CVEs as attributes; built by one projected scan, then cached."""
+        ck = ("__cve_index__", feed)
+        idx = self.cache.get(ck)
+        if idx is not _MISSING:
+            return idx
+        with self._index_lock:
+            idx = self.cache.get(ck)
+            if idx is not _MISSING:
+                return idx
+            table_name, pk = FEED_TABLES[feed]
+            attr = CVE_ATTRIBUTES[feed]
+            idx = {}
+            paginator = self._client(feed).get_paginator("scan")
+            try:
+                for page in paginator.paginate(TableName=table_name,
+                                               ProjectionExpression="#k, #c",
+                                               ExpressionAttributeNames={"#k": pk, "#c": attr}):
+                    for it in page.get("Items", []):
+                        # resource clients return deserialized items
+                        raw = it.get(attr)
+                        rid = it.get(pk)
+                        if not raw or not rid:
+                            continue
+                        for cve in find_all_cves(raw):
+                            idx.setdefault(cve, []).append(str(rid))
+            except ClientError as e:
+                print(f"⚠️ Warning scanning {table_name} for CVE index: {e}")
+            self.cache.set(ck, idx)
+            return idx
+
+    # ---------------- public lookups ----------------
+    def get_cve(self, cve_id: str) -> Dict:
+        cves = normalize_cve_ids([cve_id or ""])
+        if not cves:
+            raise ValueError(f"Not a CVE id: {cve_id!r}")
+        return self.get_many(cves)[cves[0]]
+
+    def get_many(self, cve_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Merged KEV/EPSS/Exploit-DB/Metasploit view for each CVE, read in batches."""
+        cves = normalize_cve_ids(cve_ids)
+        kev = self.get_items("cisa", cves)
+        epss = self.get_items("epss", cves)
+
+        related = {}
+        for feed in CVE_ATTRIBUTES:
+            ids = self.related_ids(feed, cves)
+            items = self.get_items(feed, [i for v in ids.values() for i in v])
+            related[feed] = {c: [items[i] for i in v if items.get(i)] for c, v in ids.items()}
+
+        return merge_cve_views(cves, kev, epss, related["exploit"], related["metasploit"])
+
+    def related_ids(self, feed: str, cves: List[str]) -> Dict[str, List[str]]:
+        """CVE -> ids in an attribute-keyed feed (exploit / metasploit)."""
+        idx = self._cve_index(feed)
+        return {c: idx.get(c, []) for c in cves}
+
+    def get_exploit(self, exploit_id: str) -> Optional[Dict]:
+        return self.get_item("exploit", exploit_id)
+
+    def get_metasploit(self, meta_id: str) -> Optional[Dict]:
+        return self.get_item("metasploit", meta_id)
+
+    def get_misp(self, uuid: str) -> Optional[Dict]:
+        return self.get_item("misp", uuid)
+
+    # ---------------- index range queries ----------------
+    def _query(self, feed: str, index: str, hash_attr: str, hash_value: str, range_attr: str,
+               lower: Optional[str] = None, upper: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        table_name, _ = FEED_TABLES[feed]
+        try:
+            return [decompress_item(it) for it in query_index(self._client(feed), table_name, index, hash_attr,
+                                                               hash_value, range_attr, lower, upper, limit=limit)]
+        except ClientError as e:
+            print(f"⚠️ Warning querying {table_name}/{index}: {e}")
+            return []
+
+    def kev_added_between(self, start: str, end: Optional[str] = None) -> List[Dict]:
+        """KEV entries with start <= dateAdded <= end (ISO dates), oldest first."""
+        return self._query("cisa", "dateAdded-index", "gsi_kev", KEV_PARTITION, "gsi_date_added", start, end)
+
+    def kev_added_last_days(self, days: int) -> List[Dict]:
+        since = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+        return self.kev_added_between(since)
+
+    def kev_due_between(self, start: str, end: Optional[str] = None) -> List[Dict]:
+        """KEV entries with start <= dueDate <= end, earliest due first."""
+        return self._query("cisa", "dueDate-index", "gsi_kev", KEV_PARTITION, "gsi_due_date", start, end)
+
+    def kev_by_vendor(self, vendor: str, since: Optional[str] = None) -> List[Dict]:
+        """KEV entries of one vendorProject (case-insensitive), optionally added on or after since."""
+        return self._query("cisa", "vendor-index", "gsi_vendor", vendor.strip().lower(), "gsi_date_added", since)
+
+    def epss_above(self, threshold=None, percentile=None) -> List[Dict]:
+        """
+        EPSS rows with epss >= threshold, or percentile >= percentile, highest
+        score first. Each bucket partition from the threshold up is queried
+        in parallel. Score thresholds below SCORE_INDEX_MIN are not in the
+        sparse score index and fall back to a filtered scan.
+        """
+        table_name, _ = FEED_TABLES["epss"]
+        client = self._client("epss")
+        if (threshold is None) == (percentile is None):
+            raise ValueError("pass exactly one of threshold / percentile")
+        bound = score(percentile if percentile is not None else threshold)
+        if bound is None:
+            raise ValueError("threshold / percentile must be within [0, 1]")
+        try:
+            if percentile is not None:
+                buckets = [f"{b:03d}" for b in range(int(bucket(bound)), 101)]
+                items = query_buckets(client, table_name, "percentile-index", "gsi_pct_bucket", buckets,
+                                      "gsi_percentile", encode_score(bound))
+            elif bound >= SCORE_INDEX_MIN:
+                buckets = [f"{b:03d}" for b in range(int(bucket(bound)), 101)]
+                items = query_buckets(client, table_name, "score-index", "gsi_score_bucket", buckets,
+                                      "gsi_epss", encode_score(bound))
+            else:
+                print(f"ℹ️ EPSS threshold {bound} is below the score index minimum {SCORE_INDEX_MIN}; scanning")
+                items = []
+                paginator = client.get_paginator("scan")
+                for page in paginator.paginate(TableName=table_name, FilterExpression="#e >= :t",
+                                               ExpressionAttributeNames={"#e": "epss"},
+                                               ExpressionAttributeValues={":t": bound}):
+                    items.extend(page.get("Items", []))
+        except ClientError as e:
+            print(f"⚠️ Warning querying {table_name} by score: {e}")
+            return []
+        return sorted(items, key=lambda it: it.get("epss") if isinstance(it.get("epss"), Decimal) else Decimal(0),
+                      reverse=True)
+
+    def exploits_for_platform(self, platform: str, since: Optional[str] = None,
+                              until: Optional[str] = None) -> List[Dict]:
+        """Exploit-DB entries for a platform (case-insensitive), by date_published."""
+        return self._query("exploit", "platform-index", "gsi_platform", platform.strip().lower(),
+                           "gsi_date_published", since, until)
+
+    def misp_by_type(self, galaxy_type: str, value_prefix: Optional[str] = None) -> List[Dict]:
+        """MISP clusters of a galaxy type, optionally whose value starts with value_prefix (case-insensitive)."""
+        prefix = value_prefix.strip().lower() if value_prefix else None
+        return self._query("misp", "type-index", "gsi_type", galaxy_type.strip().lower(), "gsi_value",
+                           prefix, prefix + "\uffff" if prefix else None)
+
+    # ---------------- invalidation ----------------
+    def invalidate_from_summary(self, feed: str, summary: Dict, keys: Iterable[str] = None) -> int:
+        """
+        Drop cached entries made stale by a feed run.
+        With explicit keys only those items go; otherwise, if the summary reports any writes,
+        every entry of that feed (and its CVE index) is dropped. Returns number of entries dropped.
+        """
+        if keys is not None:
+            doomed = {(feed, str(k)) for k in keys} | {("__cve_index__", feed)}
+            return self.cache.invalidate(lambda k: k in doomed)
+        summary = summary or {}
+        written = summary.get("uploaded", summary.get("written", summary.get("to_write")))
+        if written == 0:
+            return 0
+        return self.cache.invalidate(lambda k: k[0] == feed or k == ("__cve_index__", feed))
+
+def normalize_cve_ids(cve_ids: Iterable[str]) -> List[str]:
+    """Upper-case, strip and de-duplicate CVE ids, keeping input order."""
+    return list(dict.fromkeys(c.strip().upper() for c in cve_ids if c and c.strip()))
+
+def merge_cve_views(cves, kev, epss, exploits, metasploit) -> Dict[str, Dict]:
+    return {
+        c: {
+            "cve": c,
+            "kev": kev.get(c),
+            "epss": epss.get(c),
+            "exploits": exploits.get(c, []),
+            "metasploit": metasploit.get(c, []),
+        }
+        for c in cves
+    }
+
+_default_reader = None
+_default_lock = threading.Lock()
+
+def default_reader() -> VulnReader:
+    global _default_reader
+    with _default_lock:
+        if _default_reader is None:
+            _default_reader = VulnReader()
+        return _default_reader
+
+def get_cve(cve_id: str) -> Dict:
+    return default_reader().get_cve(cve_id)
+
+def get_many(cve_ids: Iterable[str]) -> Dict[str, Dict]:
+    return default_reader().get_many(cve_ids)
+
+def get_exploit(exploit_id: str) -> Optional[Dict]:
+    return default_reader().get_exploit(exploit_id)
+
+def get_metasploit(meta_id: str) -> Optional[Dict]:
+    return default_reader().get_metasploit(meta_id)
+
+def kev_added_between(start: str, end: Optional[str] = None) -> List[Dict]:
+    return default_reader().kev_added_between(start, end)
+
+def kev_due_between(start: str, end: Optional[str] = None) -> List[Dict]:
+    return default_reader().kev_due_between(start, end)
+
+def epss_above(threshold=None, percentile=None) -> List[Dict]:
+    return default_reader().epss_above(threshold, percentile)
+
+def exploits_for_platform(platform: str, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict]:
+    return default_reader().exploits_for_platform(platform, since, until)
+
+def invalidate_from_summary(feed: str, summary: Dict, keys: Iterable[str] = None) -> int:
+    return default_reader().invalidate_from_summary(feed, summary, keys)
@@ -0,0 +1,229 @@
+# risk_rank.py
+"""
+Precomputed "top CVEs to patch" ranking, kept in the local mirror (common/mirror.py).
+
+Each CVE gets a weighted risk score, computed with numpy over arrays of
+features read from the mirror's cve_overview view:
+
+    score = w_kev * in_kev + w_ransomware * (kev ransomware use == "Known")
+          + w_epss * epss + w_percentile * percentile
+          + w_exploit * (has an Exploit-DB entry) + w_metasploit * (has a Metasploit module)
+
+Materialized tables (in the mirror file):
+
+    risk_top     rank, cve, score and the features: the top TOP_K, read by dashboards
+    risk_buffer  the best BUFFER_FACTOR * TOP_K CVEs with their scores
+    risk_meta    floor, mirror_runs cursor, weights, timestamps
+
+Invariant: every CVE outside risk_buffer scores <= floor. An update reads the
+mirror runs applied since the cursor and the CVEs each run touched (the
+feeds' changed-id sets). It re-scores only those CVEs plus the buffer, keeps
+the candidates above floor in score order and trims back to the buffer size,
+raising floor to the best trimmed score. A full recompute (argpartition over
+all CVEs) happens only when the buffer would drop below TOP_K, a run rebuilt a
+whole feed, most CVEs were touched, or the weights changed.
+
+The mirror runs update() after each applied loader run (RISK_RANK=0 turns
+that off). Manual use:
+
+    python -m common.risk_rank top [--k 50] | update | rebuild
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.mirror import DEFAULT_MIRROR_DB, connect
+
+DEFAULT_CONFIG = {
+    "TOP_K": int(os.getenv("RISK_TOP_K", "500")),
+    "BUFFER_FACTOR": 2,  # risk_buffer holds BUFFER_FACTOR * TOP_K CVEs
+    "FULL_RECOMPUTE_FRACTION": 0.2,  # touched / all CVEs above which a full recompute is cheaper
+    "WEIGHTS": {"kev": 0.40, "ransomware": 0.10, "epss": 0.25, "percentile": 0.05, "exploit": 0.08, "metasploit": 0.12},
+}
+
+FEATURES = ("in_kev", "kev_ransomware", "epss", "percentile", "exploits", "metasploit_modules")
+SCORED_FEEDS = ("cisa", "epss", "exploit", "metasploit")
+NO_FLOOR = -1.0  # every CVE is in the buffer
+
+def ensure_schema(conn: sqlite3.Connection):
+    conn.execute("CREATE TABLE IF NOT EXISTS risk_buffer (cve TEXT PRIMARY KEY, score REAL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS risk_top (rank INTEGER PRIMARY KEY, cve TEXT, score REAL, in_kev INTEGER, "
+                 "kev_ransomware TEXT, epss REAL, percentile REAL, exploits INTEGER, metasploit_modules INTEGER)")
+    conn.execute("CREATE TABLE IF NOT EXISTS risk_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+def score_features(f: Dict[str, np.ndarray], weights: Dict[str, float]) -> np.ndarray:
+    """Vectorized risk score for aligned feature arrays."""
+    return (weights["kev"] * f["in_kev"]
+            + weights["ransomware"] * f["ransomware"]
+            + weights["epss"] * f["epss"]
+            + weights["percentile"] * f["percentile"]
+            + weights["exploit"] * (f["exploits"] > 0)
+            + weights["metasploit"] * (f["metasploit_modules"] > 0))
+
+def _features(conn: sqlite3.Connection, candidates: Optional[List[str]] = None):
+    """(rows, feature arrays) from cve_overview for all CVEs or the candidate list."""
+    sql = f"SELECT cve, {', '.join(FEATURES)} FROM cve_overview"
+    if candidates is not None:
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS risk_candidates (cve TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.risk_candidates")
+        conn.executemany("INSERT OR IGNORE INTO temp.risk_candidates VALUES (?)", ((c,) for c in candidates))
+        sql += " WHERE cve IN (SELECT cve FROM temp.risk_candidates)"
+    rows = conn.execute(sql).fetchall()
+    n = len(rows)
+    f = {
+        "in_kev": np.fromiter((r[1] or 0 for r in rows), dtype=np.float64, count=n),
+        "ransomware": np.fromiter((str(r[2] or "").strip().lower() == "known" for r in rows), dtype=np.float64, count=n),
+        "epss": np.fromiter((r[3] or 0.0 for r in rows), dtype=np.float64, count=n),
+        "percentile": np.fromiter((r[4] or 0.0 for r in rows), dtype=np.float64, count=n),
+        "exploits": np.fromiter((r[5] or 0 for r in rows), dtype=np.int64, count=n),
+        "metasploit_modules": np.fromiter((r[6] or 0 for r in rows), dtype=np.int64, count=n),
+    }
+    return rows, f
+
+def _order(scores: np.ndarray, epss: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """idx sorted by score desc, then epss desc (stable, deterministic)."""
+    return idx[np.lexsort((-epss[idx], -scores[idx]))]
+
+def _meta(conn) -> Dict[str, str]:
+    return dict(conn.execute("SELECT key, value FROM risk_meta").fetchall())
+
+def _write(conn, rows, f, scores, ordered: np.ndarray, top_k: int, buffer_n: int, floor: float, cursor: int,
+           weights_key: str, mode: str):
+    keep = ordered[:buffer_n]
+    conn.execute("DELETE FROM risk_buffer")
+    conn.executemany("INSERT INTO risk_buffer VALUES (?, ?)", ((rows[i][0], float(scores[i])) for i in keep))
+    conn.execute("DELETE FROM risk_top")
+    conn.executemany("INSERT INTO risk_top VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                     ((rank, rows[i][0], round(float(scores[i]), 6), *rows[i][1:])
+                      for rank, i in enumerate(keep[:top_k], start=1)))
+    meta = {"floor": repr(floor), "cursor": str(cursor), "weights": weights_key, "top_k": str(top_k),
+            "computed_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "mode": mode}
+    conn.executemany("INSERT OR REPLACE INTO risk_meta VALUES (?, ?)", meta.items())
+
+def _touched(conn, cursor: int):
+    """(touched CVEs, last mirror_runs rowid, full recompute needed) for runs after cursor."""
+    touched, last, full = set(), cursor, False
+    runs = conn.execute("SELECT rowid, feed, applied_at, replaced FROM mirror_runs WHERE rowid > ? ORDER BY rowid",
+                        (cursor,)).fetchall()
+    for rowid, feed, applied_at, replaced in runs:
+        last = rowid
+        if feed not in SCORED_FEEDS:
+            continue
+        if replaced:
+            full = True
+        elif feed in ("cisa", "epss"):
+            touched.update(r[0] for r in conn.execute(f"SELECT cve FROM {feed} WHERE updated_at = ?", (applied_at,)))
+        elif feed in ("exploit", "metasploit"):
+            # rows whose links were dropped only lose score; if buffered they are re-scored anyway
+            touched.update(r[0] for r in conn.execute(
+                f"SELECT l.cve FROM cve_links l JOIN {feed} x ON l.feed = ? AND l.key = x.id WHERE x.updated_at = ?",
+                (feed, applied_at)))
+    return touched, last, full
+
+def _full(conn, cfg, cursor: int, weights_key: str) -> dict:
+    rows, f = _features(conn)
+    scores = score_features(f, cfg["WEIGHTS"])
+    top_k = int(cfg["TOP_K"])
+    buffer_n = top_k * max(1, int(cfg["BUFFER_FACTOR"]))
+    n = len(rows)
+    if n > buffer_n:
+        part = np.argpartition(-scores, buffer_n)[:buffer_n]
+        # best score outside the buffer
+        outside = np.ones(n, dtype=bool)
+        outside[part] = False
+        floor = float(scores[outside].max())
+    else:
+        part, floor = np.arange(n), NO_FLOOR
+    ordered = _order(scores, f["epss"], part)
+    _write(conn, rows, f, scores, ordered, top_k, buffer_n, floor, cursor, weights_key, "full")
+    return {"mode": "full", "scored": n, "floor": floor}
+
+def _incremental(conn, cfg, touched: set, floor: float, cursor: int, weights_key: str) -> Optional[dict]:
+    """Re-score touched + buffered CVEs; None when the buffer no longer covers TOP_K (full recompute needed)."""
+    buffered = [r[0] for r in conn.execute("SELECT cve FROM risk_buffer")]
+    rows, f = _features(conn, list(touched.union(buffered)))
+    scores = score_features(f, cfg["WEIGHTS"])
+    top_k = int(cfg["TOP_K"])
+    buffer_n = top_k * max(1, int(cfg["BUFFER_FACTOR"]))
+    above = np.flatnonzero(scores > floor)
+    if len(above) < top_k and floor != NO_FLOOR:
+        return None
+    ordered = _order(scores, f["epss"], above)
+    if len(ordered) > buffer_n:
+        floor = max(floor, float(scores[ordered[buffer_n:]].max()))
+    _write(conn, rows, f, scores, ordered, top_k, buffer_n, floor, cursor, weights_key, "incremental")
+    return {"mode": "incremental", "scored": len(rows), "floor": floor}
+
+def update(path: Optional[str] = None, config: Optional[dict] = None, force_full: bool = False) -> dict:
+    """Bring risk_top up to date with the mirror runs applied since the last update."""
+    cfg = {**DEFAULT_CONFIG, **(config or {})}
+    weights_key = json.dumps(cfg["WEIGHTS"], sort_keys=True)
+    t0 = time.perf_counter()
+    conn = connect(path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # one updater at a time; loaders' mirror commits wait briefly
+        ensure_schema(conn)
+        meta = _meta(conn)
+        cursor = int(meta.get("cursor", 0))
+        touched, last, replaced = _touched(conn, cursor)
+        if last == cursor and not force_full and meta.get("weights") == weights_key \
+                and meta.get("top_k") == str(cfg["TOP_K"]):
+            conn.execute("COMMIT")
+            return {"mode": "unchanged", "scored": 0}
+        total = conn.execute("SELECT COUNT(*) FROM epss").fetchone()[0] or 1
+        result = None
+        if not (force_full or replaced or "floor" not in meta or meta.get("weights") != weights_key
+                or meta.get("top_k") != str(cfg["TOP_K"])
+                or len(touched) > cfg["FULL_RECOMPUTE_FRACTION"] * total):
+            result = _incremental(conn, cfg, touched, float(meta["floor"]), last, weights_key)
+        if result is None:
+            result = _full(conn, cfg, last, weights_key)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    result.update(touched=len(touched), elapsed_ms=round((time.perf_counter() - t0) * 1000, 1))
+    print(f"🏆 Risk ranking {result['mode']}: {result['touched']} touched, {result['scored']} scored "
+          f"in {result['elapsed_ms']} ms")
+    return result
+
+def top(k: Optional[int] = None, path: Optional[str] = None) -> List[Dict]:
+    """The precomputed ranking (first k rows), best first."""
+    conn = connect(path, read_only=True)
+    try:
+        sql = "SELECT * FROM risk_top ORDER BY rank" + (" LIMIT ?" if k else "")
+        return [dict(r) for r in conn.execute(sql, (int(k),) if k else ())]
+    except sqlite3.OperationalError:
+        return []  # not computed yet
+    finally:
+        conn.close()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Precomputed top-K CVE risk ranking")
+    ap.add_argument("--db", default=DEFAULT_MIRROR_DB or None, required=not DEFAULT_MIRROR_DB,
+                    help="mirror file (default: VULN_MIRROR_DB)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    t = sub.add_parser("top", help="print the current ranking")
+    t.add_argument("--k", type=int, default=20)
+    sub.add_parser("update", help="apply mirror runs since the last update")
+    sub.add_parser("rebuild", help="full recompute")
+    args = ap.parse_args(argv)
+    if args.command == "top":
+        for row in top(args.k, args.db):
+            print(f"{row['rank']:>4}  {row['cve']:<18} {row['score']:.4f}  kev={row['in_kev']} "
+                  f"epss={row['epss'] or 0:.5f} exploits={row['exploits']} msf={row['metasploit_modules']}")
+    else:
+        update(args.db, force_full=args.command == "rebuild")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+# table_snapshot.py
+"""
+Offline snapshots of the feed tables: parallel export to partitioned Parquet
+and bulk restore into any DynamoDB endpoint (DynamoDB Local, staging, ...).
+
+    python -m common.table_snapshot export --out snapshots/2025-01-01 [--tables cisa,epss]
+                                           [--segments 8] [--workers 8] [--compression zstd]
+    python -m common.table_snapshot import --in snapshots/2025-01-01 [--tables ...]
+                                           [--workers 4] [--backend sync|async] [--prefix staging_]
+
+Export runs a parallel Scan (Segment / TotalSegments) per table on a thread
+pool and writes each segment's items as compressed Parquet parts:
+
+    <out>/<table>/segment=0003/part-00000.parquet
+    <out>/_manifest.json       tables, keys, item counts and files (written last)
+
+Columns are typed per part file and tagged with the DynamoDB type in the
+field metadata ("ddb"): S (string), N (decimal as string), B (binary),
+BOOL, or J for anything else (lists, maps, sets, NULLs, columns with mixed
+types), stored as DynamoDB-typed JSON with binary values base64-encoded. An
+attribute missing from an item is a Parquet null, so items round-trip exactly,
+compressed attributes (common/compression.py) included.
+
+Import reads the manifest, creates missing tables and writes every part file
+through common.ddb_io on a pool of workers, so the same sync/async backends as
+the loaders apply. Needs the optional pyarrow package.
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import threading
+import concurrent.futures
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from boto3.dynamodb.types import Binary, TypeDeserializer, TypeSerializer
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional; only needed for snapshots
+    pa = pq = None
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.aws import get_or_create_table, get_resource
+from common.ddb_io import item_io, progress_printer
+from common.indexes import table_indexes
+from common.query import FEED_TABLES
+
+DEFAULT_CONFIG = {
+    "DDB_ENDPOINT": os.getenv("DDB_ENDPOINT", "http://localhost:8000"),
+    "AWS_REGION": os.getenv("AWS_REGION", "us-east-1"),
+    "AWS_ACCESS_KEY_ID": os.getenv("AWS_ACCESS_KEY_ID"),  # None: common/aws.py credential policy
+    "AWS_SECRET_ACCESS_KEY": os.getenv("AWS_SECRET_ACCESS_KEY"),
+    "SEGMENTS": int(os.getenv("SNAPSHOT_SEGMENTS", "8")),
+    "WORKERS": int(os.getenv("SNAPSHOT_WORKERS", "8")),
+    "ROWS_PER_FILE": int(os.getenv("SNAPSHOT_ROWS_PER_FILE", "100000")),
+    "COMPRESSION": os.getenv("SNAPSHOT_COMPRESSION", "zstd"),
+}
+
+MANIFEST = "_manifest.json"
+FORMAT_VERSION = 1
+TYPE_KEY = b"ddb"
+READ_BATCH_ROWS = 5000
+
+_ser = TypeSerializer()
+_de = TypeDeserializer()
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is required for table snapshots (pip install pyarrow)")
+
+def _select(feeds: Optional[Iterable[str]]) -> Dict[str, tuple]:
+    """feed -> (table, key) for the requested feeds or table names (all feeds when empty)."""
+    if not feeds:
+        return dict(FEED_TABLES)
+    by_table = {table: feed for feed, (table, _) in FEED_TABLES.items()}
+    selected = {}
+    for name in feeds:
+        feed = name if name in FEED_TABLES else by_table.get(name)
+        if feed is None:
+            raise ValueError(f"Unknown feed or table: {name} (expected one of {sorted(FEED_TABLES)})")
+        selected[feed] = FEED_TABLES[feed]
+    return selected
+
+def _ddb(cfg: dict, pool_size: Optional[int] = None):
+    return get_resource("dynamodb", region_name=cfg["AWS_REGION"], endpoint_url=cfg["DDB_ENDPOINT"],
+                        aws_access_key_id=cfg["AWS_ACCESS_KEY_ID"], aws_secret_access_key=cfg["AWS_SECRET_ACCESS_KEY"],
+                        pool_size=pool_size)
+
+# ----- value encoding -----
+
+def _b64_wire(wire):
+    """DynamoDB-typed value with B / BS payloads as base64 text (JSON-safe)."""
+    (tag, v), = wire.items()
+    if tag == "B":
+        return {"B": base64.b64encode(v.value if isinstance(v, Binary) else bytes(v)).decode("ascii")}
+    if tag == "BS":
+        return {"BS": [base64.b64encode(b.value if isinstance(b, Binary) else bytes(b)).decode("ascii") for b in v]}
+    if tag == "L":
+        return {"L": [_b64_wire(x) for x in v]}
+    if tag == "M":
+        return {"M": {k: _b64_wire(x) for k, x in v.items()}}
+    return wire
+
+def _unb64_wire(wire):
+    (tag, v), = wire.items()
+    if tag == "B":
+        return {"B": base64.b64decode(v)}
+    if tag == "BS":
+        return {"BS": [base64.b64decode(b) for b in v]}
+    if tag == "L":
+        return {"L": [_unb64_wire(x) for x in v]}
+    if tag == "M":
+        return {"M": {k: _unb64_wire(x) for k, x in v.items()}}
+    return wire
+
+def _tag(value) -> str:
+    if isinstance(value, str):
+        return "S"
+    if isinstance(value, bool):
+        return "BOOL"
+    if isinstance(value, Decimal):
+        return "N"
+    if isinstance(value, (bytes, bytearray, Binary)):
+        return "B"
+    return "J"
+
+_ARROW_TYPES = {"S": lambda: pa.string(), "N": lambda: pa.string(), "B": lambda: pa.binary(),
+                "BOOL": lambda: pa.bool_(), "J": lambda: pa.string()}
+
+def _encode(tag: str, value):
+    if tag == "N":
+        return str(value)
+    if tag == "B":
+        return value.value if isinstance(value, Binary) else bytes(value)
+    if tag == "J":
+        return json.dumps(_b64_wire(_ser.serialize(value)), separators=(",", ":"))
+    return value
+
+def _decode(tag: str, value):
+    if tag == "N":
+        return Decimal(value)
+    if tag == "J":
+        return _de.deserialize(_unb64_wire(json.loads(value)))
+    return value
+
+def items_to_table(items: List[dict], key: str):
+    """Arrow table for a batch of items; one column per attribute, typed when the attribute is uniform."""
+    _require_pyarrow()
+    tags: Dict[str, str] = {key: "S"}
+    for item in items:
+        for name, value in item.items():
+            tag = _tag(value)
+            if tags.setdefault(name, tag) != tag:
+                tags[name] = "J"
+    fields, columns = [], []
+    for name, tag in tags.items():
+        fields.append(pa.field(name, _ARROW_TYPES[tag](), nullable=name != key, metadata={TYPE_KEY: tag.encode()}))
+        columns.append([_encode(tag, item[name]) if name in item else None for item in items])
+    return pa.Table.from_arrays([pa.array(c, type=f.type) for c, f in zip(columns, fields)], schema=pa.schema(fields))
+
+def iter_file_items(path: str, batch_rows: int = READ_BATCH_ROWS) -> Iterator[dict]:
+    """DynamoDB items of one part file, decoded batch by batch."""
+    _require_pyarrow()
+    pf = pq.ParquetFile(path)
+    tags = {f.name: (f.metadata or {}).get(TYPE_KEY, b"J").decode() for f in pf.schema_arrow}
+    for batch in pf.iter_batches(batch_size=batch_rows):
+        columns = {name: batch.column(name).to_pylist() for name in batch.schema.names}
+        for i in range(batch.num_rows):
+            yield {name: _decode(tags[name], values[i]) for name, values in columns.items() if values[i] is not None}
+
+# ----- export -----
+
+def _write_part(items: List[dict], key: str, path: str, compression: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    pq.write_table(items_to_table(items, key), tmp, compression=compression)
+    os.replace(tmp, path)
+
+def _export_segment(cfg: dict, out_dir: str, table: str, key: str, segment: int, total: int,
+                    rows_per_file: int, compression: str) -> dict:
+    client = _ddb(cfg, pool_size=cfg["WORKERS"]).meta.client  # resource client: native values, thread-safe
+    rel_dir = os.path.join(table, f"segment={segment:04d}")
+    files, buffer, count = [], [], 0
+    scan = {"TableName": table, "Segment": segment, "TotalSegments": total}
+
+    def flush():
+        rel = os.path.join(rel_dir, f"part-{len(files):05d}.parquet")
+        _write_part(buffer, key, os.path.join(out_dir, rel), compression)
+        files.append(rel)
+
+    while True:
+        resp = client.scan(**scan)
+        for item in resp.get("Items", []):
+            buffer.append(item)
+            if len(buffer) >= rows_per_file:
+                flush()
+                count += len(buffer)
+                buffer = []
+        if "LastEvaluatedKey" not in resp:
+            break
+        scan["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    if buffer:
+        flush()
+        count += len(buffer)
+    return {"table": table, "segment": segment, "items": count, "files": files}
+
+def export_tables(out_dir: str, feeds: Optional[Iterable[str]] = None, config: Optional[dict] = None) -> dict:
+    """Parallel-scan the selected tables into Parquet under out_dir; returns the manifest."""
+    _require_pyarrow()
+    cfg = {**DEFAULT_CONFIG, **(config or {})}
+    compression = cfg["COMPRESSION"]
+    if compression != "none" and not pa.Codec.is_available(compression):
+        print(f"⚠️ Parquet codec {compression} not available; using snappy")
+        compression = "snappy"
+    selected = _select(feeds)
+    segments = max(1, int(cfg["SEGMENTS"]))
+    os.makedirs(out_dir, exist_ok=True)
+    print(f"📦 Exporting {len(selected)} table(s) to {out_dir} "
+          f"({segments} segments each, {cfg['WORKERS']} workers, {compression})")
+    t0 = time.time()
+    tables = {table: {"feed": feed, "key": key, "segments": segments, "items": 0, "files": []}
+              for feed, (table, key) in selected.items()}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, int(cfg["WORKERS"]))) as pool:
+        futures = [pool.submit(_export_segment, cfg, out_dir, table, info["key"], s, segments,
+                               int(cfg["ROWS_PER_FILE"]), compression)
+                   for table, info in tables.items() for s in range(segments)]
+        for fut in concurrent.futures.as_completed(futures):
+            part = fut.result()
+            info = tables[part["table"]]
+            info["items"] += part["items"]
+            info["files"].extend(part["files"])
+    for table, info in tables.items():
+        info["files"].sort()
+        print(f"✅ {table}: {info['items']} items in {len(info['files'])} file(s)")
+    manifest = {"format": FORMAT_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "source": cfg["DDB_ENDPOINT"], "compression": compression, "tables": tables}
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    print(f"🏁 Export finished in {time.time() - t0:.1f}s")
+    return manifest
+
+# ----- import -----
+
+def read_manifest(in_dir: str) -> dict:
+    path = os.path.join(in_dir, MANIFEST)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found (incomplete or not a snapshot directory)")
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format {manifest.get('format')} in {path}")
+    return manifest
+
+def import_tables(in_dir: str, feeds: Optional[Iterable[str]] = None, prefix: str = "",
+                  backend: Optional[str] = None, concurrency: Optional[int] = None,
+                  config: Optional[dict] = None) -> dict:
+    """
+    Bulk-load a snapshot into the configured endpoint. Target tables are
+    prefix + source table name and are created when missing; existing items
+    with the same keys are overwritten. Returns {table: items written}.
+    """
+    _require_pyarrow()
+    cfg = {**DEFAULT_CONFIG, **(config or {})}
+    manifest = read_manifest(in_dir)
+    wanted = {table for table, _ in _select(feeds).values()}
+    tables = {t: info for t, info in manifest["tables"].items() if t in wanted}
+    workers = max(1, int(cfg["WORKERS"]))
+    ddb = _ddb(cfg, pool_size=max(workers, concurrency or 0) * 2)
+    for table, info in tables.items():
+        get_or_create_table(ddb, prefix + table, info["key"], indexes=table_indexes(info["feed"]))
+    total = sum(info["items"] for info in tables.values())
+    print(f"📥 Importing {total} items of {len(tables)} table(s) from {in_dir} ({workers} workers)")
+    t0 = time.time()
+    written = {prefix + t: 0 for t in tables}
+    lock = threading.Lock()
+    done = [0]
+    progress = progress_printer(max(1, total // 10), total, "  ↳ {}/{} items written")
+
+    def load_file(table: str, key: str, rel: str) -> int:
+        target = ddb.Table(prefix + table)  # one Table object per worker call; resources are not thread-safe
+        ddb_io = item_io(target, key, backend, concurrency)
+        n = ddb_io.put_many(iter_file_items(os.path.join(in_dir, rel)))
+        with lock:
+            written[prefix + table] += n
+            done[0] += n
+            progress(done[0])
+        return n
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(load_file, table, info["key"], rel)
+                   for table, info in tables.items() for rel in info["files"]]
+        for fut in concurrent.futures.as_completed(futures):
+            fut.result()
+    elapsed = time.time() - t0
+    for table, info in tables.items():
+        n = written[prefix + table]
+        mark = "✅" if n == info["items"] else "⚠️"
+        print(f"{mark} {prefix + table}: {n}/{info['items']} items")
+    print(f"🏁 Import finished in {elapsed:.1f}s ({done[0] / elapsed if elapsed else 0:.0f} items/s)")
+    return written
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Export feed tables to Parquet or restore them from a snapshot")
+    sub = ap.add_subparsers(dest="command", required=True)
+    for name in ("export", "import"):
+        p = sub.add_parser(name)
+        p.add_argument("--out" if name == "export" else "--in", dest="path", required=True, help="snapshot directory")
+        p.add_argument("--tables", default="", help="comma-separated feeds or table names (default: all)")
+        p.add_argument("--workers", type=int, default=DEFAULT_CONFIG["WORKERS"])
+        p.add_argument("--endpoint", default=DEFAULT_CONFIG["DDB_ENDPOINT"])
+        p.add_argument("--region", default=DEFAULT_CONFIG["AWS_REGION"])
+    exp = sub.choices["export"]
+    exp.add_argument("--segments", type=int, default=DEFAULT_CONFIG["SEGMENTS"], help="parallel scan segments per table")
+    exp.add_argument("--rows-per-file", type=int, default=DEFAULT_CONFIG["ROWS_PER_FILE"])
+    exp.add_argument("--compression", default=DEFAULT_CONFIG["COMPRESSION"], help="zstd | snappy | gzip | none")
+    imp = sub.choices["import"]
+    imp.add_argument("--backend", default=None, help="sync | async (default: DDB_BACKEND env)")
+    imp.add_argument("--concurrency", type=int, default=None, help="async requests in flight per worker")
+    imp.add_argument("--prefix", default="", help="prepended to every target table name")
+    args = ap.parse_args(argv)
+
+    cfg = {"DDB_ENDPOINT": args.endpoint, "AWS_REGION": args.region, "WORKERS": args.workers}
+    feeds = [t.strip() for t in args.tables.split(",") if t.strip()]
+    if args.command == "export":
+        cfg.update(SEGMENTS=args.segments, ROWS_PER_FILE=args.rows_per_file, COMPRESSION=args.compression)
+        export_tables(args.path, feeds, cfg)
+    else:
+        import_tables(args.path, feeds, prefix=args.prefix, backend=args.backend,
+                      concurrency=args.concurrency, config=cfg)
+
+if __name__ == "__main__":
+    main()
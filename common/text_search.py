@@ -0,0 +1,291 @@
+# text_search.py
+"""
+Full-text search (BM25) over the text fields of the mirrored feeds.
+
+    cisa        vulnerabilityName, shortDescription, vendorProject, product
+    exploit     description
+    metasploit  module_name, description
+    misp        value, description, meta.synonyms
+
+The index is one memory-mappable file next to the mirror
+(<mirror>.text.idx, or VULN_TEXT_INDEX; layout in common/array_file.py) with
+these arrays:
+
+    term_bytes / term_offsets   sorted vocabulary (utf-8, CSR)
+    post_offsets                postings of term i: post_docs/post_tf[post_offsets[i]:post_offsets[i + 1]]
+    post_docs, post_tf          doc ids (int32, ascending per term) and term frequencies (uint16)
+    doc_feed, doc_len           feed code and token count per doc
+    key_bytes / key_offsets     feed primary key per doc (CSR)
+
+Opening the file maps it without reading it. A query binary-searches the
+vocabulary for each term and scores only the docs in their postings.
+
+Updates come from the mirror (common/mirror.py). Each applied run records its
+updated_at stamp in mirror_runs, so only the rows a run wrote are
+re-tokenized. Their old postings are dropped with a vectorized mask, the new
+ones are merged in, and the file is replaced atomically (open readers keep the
+old mapping). A run that replaced a whole feed re-reads that feed. The mirror
+triggers update() after each run (TEXT_INDEX=0 turns that off). Manual use:
+
+    python -m common.text_search search "cisco asa" [--k 10] [--feeds cisa,metasploit]
+    python -m common.text_search update | rebuild
+"""
+import os
+import re
+import sys
+import json
+import time
+import bisect
+import argparse
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.array_file import ReloadingFile, Strings, csr_strings, map_arrays, write_arrays
+from common.mirror import DEFAULT_MIRROR_DB, MIRROR_TABLES, connect
+
+MAGIC = b"VULNTXT1"
+FORMAT = 1
+
+# feed -> attributes of the mirrored item that are indexed
+SEARCH_FIELDS = {
+    "cisa": ("vulnerabilityName", "shortDescription", "vendorProject", "product"),
+    "exploit": ("description",),
+    "metasploit": ("module_name", "description"),
+    "misp": ("value", "description", "meta.synonyms"),
+}
+FEEDS = tuple(SEARCH_FIELDS)  # doc_feed codes
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("a an and are as at be by can for from has in is it its of on or that the this to via was which "
+                      "with".split())
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased alphanumeric runs without stopwords ("Log4j 2.x" -> ["log4j", "2", "x"])."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+def index_path(mirror_path: Optional[str] = None) -> str:
+    return os.getenv("VULN_TEXT_INDEX") or os.path.splitext(mirror_path or DEFAULT_MIRROR_DB)[0] + ".text.idx"
+
+def document_text(feed: str, item: dict) -> str:
+    parts = []
+    for attr in SEARCH_FIELDS[feed]:
+        value = item.get(attr)
+        if isinstance(value, (list, tuple)):
+            parts.extend(str(v) for v in value)
+        elif value is not None:
+            parts.append(str(value))  # JSON-encoded lists (meta.synonyms) tokenize the same way
+    return " ".join(parts)
+
+class TextIndex:
+    """Read-only view of an index file (memory-mapped)."""
+    def __init__(self, path: str):
+        self.path = path
+        self.header, arrays = map_arrays(path, MAGIC, FORMAT)
+        for name, arr in arrays.items():
+            setattr(self, name, arr)
+        self.terms = Strings(self.term_bytes, self.term_offsets)
+        self.keys = Strings(self.key_bytes, self.key_offsets)
+        self.n_docs = len(self.doc_len)
+        self.avgdl = (self.header["total_len"] / self.n_docs) if self.n_docs else 1.0
+        self.cursor = self.header["cursor"]
+
+    def term_id(self, term: str) -> int:
+        """Vocabulary position of term, -1 if absent."""
+        t = term.encode("utf-8")
+        i = bisect.bisect_left(self.terms, t)
+        return i if i < len(self.terms) and self.terms[i] == t else -1
+
+    def search(self, text: str, k: int = 10, feeds: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Top k docs by BM25 for the query's terms (any term matches; docs with more of them rank higher)."""
+        scores = None
+        for term in dict.fromkeys(tokenize(text)):
+            tid = self.term_id(term)
+            if tid < 0:
+                continue
+            lo, hi = int(self.post_offsets[tid]), int(self.post_offsets[tid + 1])
+            docs = self.post_docs[lo:hi]
+            tf = self.post_tf[lo:hi].astype(np.float32)
+            df = hi - lo
+            idf = np.log(1.0 + (self.n_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_len[docs] / self.avgdl)
+            if scores is None:
+                scores = np.zeros(self.n_docs, dtype=np.float32)
+            scores[docs] += idf * tf * (BM25_K1 + 1.0) / (tf + norm)  # docs are unique within one postings list
+        if scores is None or k < 1:
+            return []
+        if feeds:
+            codes = [FEEDS.index(f) for f in feeds if f in FEEDS]
+            scores[~np.isin(self.doc_feed, codes)] = 0
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return [{"feed": FEEDS[self.doc_feed[d]], "key": self.keys.str(d),
+                 "score": round(float(scores[d]), 4)} for d in hits]
+
+class ReloadingIndex(ReloadingFile):
+    """TextIndex that is re-opened when the file is replaced."""
+    def __init__(self, path: str):
+        super().__init__(path, TextIndex)
+
+    def search(self, text: str, k: int = 10, feeds: Optional[Iterable[str]] = None) -> List[Dict]:
+        index = self.get()
+        return index.search(text, k, feeds) if index is not None else []
+
+# ----- building -----
+
+def _assemble(path: str, vocab: List[str], term_ids: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+              doc_feed: np.ndarray, doc_len: np.ndarray, doc_keys: List[str], cursor: int):
+    """Sort the vocabulary, drop unused terms and write postings grouped by term (docs ascending)."""
+    used = np.bincount(term_ids, minlength=len(vocab)) > 0
+    live = np.flatnonzero(used).tolist()
+    live.sort(key=vocab.__getitem__)
+    remap = np.full(len(vocab), -1, dtype=np.int64)
+    remap[live] = np.arange(len(live))
+    term_ids = remap[term_ids]
+    order = np.lexsort((docs, term_ids))
+    post_offsets = np.zeros(len(live) + 1, dtype=np.int64)
+    post_offsets[1:] = np.cumsum(np.bincount(term_ids, minlength=len(live)))
+    term_bytes, term_offsets = csr_strings([vocab[i] for i in live])
+    key_bytes, key_offsets = csr_strings(doc_keys)
+    write_arrays(path, MAGIC, FORMAT, {
+        "term_bytes": term_bytes, "term_offsets": term_offsets, "post_offsets": post_offsets,
+        "post_docs": docs[order].astype(np.int32), "post_tf": np.minimum(tfs[order], 65535).astype(np.uint16),
+        "doc_feed": doc_feed.astype(np.uint8), "doc_len": doc_len.astype(np.uint32),
+        "key_bytes": key_bytes, "key_offsets": key_offsets,
+    }, {"cursor": cursor, "docs": len(doc_keys), "terms": len(live), "postings": int(len(order)),
+        "total_len": int(doc_len.sum()), "feeds": list(FEEDS), "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())})
+
+def _changes(conn, cursor: int, full: bool):
+    """(feeds to re-read entirely, {feed: [applied_at stamps]}, last mirror_runs rowid)."""
+    reread = set(FEEDS) if full else set()
+    stamps: Dict[str, List[str]] = {}
+    last = cursor
+    for rowid, feed, applied_at, replaced in conn.execute(
+            "SELECT rowid, feed, applied_at, replaced FROM mirror_runs WHERE rowid > ? ORDER BY rowid", (cursor,)):
+        last = rowid
+        if feed not in SEARCH_FIELDS:
+            continue
+        if replaced:
+            reread.add(feed)
+        else:
+            stamps.setdefault(feed, []).append(applied_at)
+    return reread, stamps, last
+
+def _rows(conn, feed: str, stamps: Optional[List[str]]):
+    pk = MIRROR_TABLES[feed][0]
+    if stamps is None:
+        return conn.execute(f"SELECT {pk}, item FROM {feed}")
+    marks = ", ".join("?" * len(set(stamps)))
+    return conn.execute(f"SELECT {pk}, item FROM {feed} WHERE updated_at IN ({marks})", sorted(set(stamps)))
+
+def update(mirror_path: Optional[str] = None, path: Optional[str] = None, full: bool = False) -> dict:
+    """Bring the index up to date with the mirror runs applied since its cursor (full=True rebuilds it)."""
+    mirror_path = mirror_path or DEFAULT_MIRROR_DB
+    path = path or index_path(mirror_path)
+    t0 = time.perf_counter()
+    old = None
+    if not full and os.path.exists(path):
+        try:
+            old = TextIndex(path)
+        except (ValueError, KeyError) as e:
+            print(f"⚠️ Text index {path} unreadable, rebuilding: {e}")
+    conn = connect(mirror_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")  # consistent view of the mirror; one index writer at a time
+        reread, stamps, last = _changes(conn, old.cursor if old is not None else 0, old is None)
+        if not reread and not stamps:
+            conn.execute("COMMIT")
+            return {"mode": "unchanged", "docs": old.n_docs if old is not None else 0}
+        # tokenize the changed rows
+        vocab: Dict[str, int] = {}
+        new_terms, new_tfs, new_feed, new_len, new_keys = [], [], [], [], []
+        changed = {feed: set() for feed in FEEDS}
+        for feed in FEEDS:
+            if feed not in reread and feed not in stamps:
+                continue
+            code = FEEDS.index(feed)
+            for key, item_json in _rows(conn, feed, None if feed in reread else stamps[feed]):
+                changed[feed].add(key)
+                counts = Counter(tokenize(document_text(feed, json.loads(item_json) if item_json else {})))
+                new_terms.append([vocab.setdefault(t, len(vocab)) for t in counts])
+                new_tfs.append(list(counts.values()))
+                new_feed.append(code)
+                new_len.append(sum(counts.values()))
+                new_keys.append(key)
+        conn.execute("COMMIT")
+    except Exception:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    # carry over the old postings of docs that were not re-read
+    if old is not None and old.n_docs:
+        old_keys = old.keys.decode_all()
+        keep = np.array([FEEDS[f] not in reread and old_keys[d] not in changed[FEEDS[f]]
+                         for d, f in enumerate(old.doc_feed.tolist())], dtype=bool)
+        old_vocab = old.terms.decode_all()
+        old_to_new = np.array([vocab.setdefault(t, len(vocab)) for t in old_vocab], dtype=np.int64)
+        post_terms = np.repeat(np.arange(len(old_vocab)), np.diff(old.post_offsets))
+        mask = keep[old.post_docs]
+        new_doc_id = np.cumsum(keep) - 1
+        kept_terms = old_to_new[post_terms[mask]]
+        kept_docs = new_doc_id[old.post_docs[mask]]
+        kept_tfs = old.post_tf[mask].astype(np.int64)
+        kept = np.flatnonzero(keep)
+        base_feed, base_len = old.doc_feed[kept], old.doc_len[kept]
+        base_keys = [old_keys[d] for d in kept.tolist()]
+    else:
+        kept_terms = kept_docs = kept_tfs = np.zeros(0, dtype=np.int64)
+        base_feed, base_len, base_keys = np.zeros(0, np.uint8), np.zeros(0, np.uint32), []
+
+    n_base = len(base_keys)
+    sizes = [len(t) for t in new_terms]
+    term_ids = np.concatenate([kept_terms, np.fromiter((t for ts in new_terms for t in ts), np.int64, sum(sizes))])
+    docs = np.concatenate([kept_docs, np.repeat(np.arange(n_base, n_base + len(new_keys)), sizes)])
+    tfs = np.concatenate([kept_tfs, np.fromiter((c for cs in new_tfs for c in cs), np.int64, sum(sizes))])
+    vocab_list = [None] * len(vocab)
+    for t, i in vocab.items():
+        vocab_list[i] = t
+    doc_feed = np.concatenate([base_feed, np.array(new_feed, dtype=np.uint8)])
+    doc_len = np.concatenate([base_len, np.array(new_len, dtype=np.uint32)])
+    _assemble(path, vocab_list, term_ids, docs, tfs, doc_feed, doc_len, base_keys + new_keys, last)
+    result = {"mode": "full" if old is None else "incremental", "docs": len(doc_len),
+              "reindexed": len(new_keys), "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1)}
+    print(f"🔎 Text index {result['mode']}: {result['reindexed']} docs re-indexed, {result['docs']} total "
+          f"in {result['elapsed_ms']} ms")
+    return result
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="BM25 full-text search over the mirrored feeds")
+    ap.add_argument("--db", default=DEFAULT_MIRROR_DB or None, required=not DEFAULT_MIRROR_DB,
+                    help="mirror file (default: VULN_MIRROR_DB)")
+    ap.add_argument("--index", default=None, help="index file (default: next to the mirror)")
+    sub = ap.add_subparsers(dest="command", required=True)
+    s = sub.add_parser("search")
+    s.add_argument("text")
+    s.add_argument("--k", type=int, default=10)
+    s.add_argument("--feeds", default="", help="comma-separated feeds to search (default: all)")
+    sub.add_parser("update", help="index the mirror runs applied since the last update")
+    sub.add_parser("rebuild", help="re-index every mirrored row")
+    args = ap.parse_args(argv)
+    path = args.index or index_path(args.db)
+    if args.command == "search":
+        t0 = time.perf_counter()
+        hits = TextIndex(path).search(args.text, args.k, [f for f in args.feeds.split(",") if f] or None)
+        for hit in hits:
+            print(f"{hit['score']:>8.3f}  {hit['feed']:<11} {hit['key']}")
+        print(f"{len(hits)} hits in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    else:
+        update(args.db, path, full=args.command == "rebuild")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,84 @@
 # epss_main.py
-from extract import extract_epss
+import os
+import sys
+import datetime
+from extract import extract_epss, iter_epss_batches, mark_loaded, shard_csv_path, CHUNK_SIZE
 from transform import transform_epss
-from load import load
+from load import connect_dynamodb, load, write_batches, PROJECT_ROOT
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.leases import ShardLeases, run_shards
+from common.pipeline import run_pipeline
+from common.profiling import Profiler
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("EPSS_PIPELINE_QUEUE", "2"))  # chunks buffered between stages
+
+def _arg_value(name, env, default=None):
+    """--name=value from argv, else the env var, else default."""
+    for arg in sys.argv[1:]:
+        if arg.startswith(f"--{name}="):
+            return arg.split("=", 1)[1]
+    return os.getenv(env, default)
+
+def run_sharded(num_shards, prof):
+    """
+    Sharded mode: claim shards of today's job through leases in the coordination
+    table and run the chunked pipeline (or, with --from-csv, the CSV backfill)
+    for each one. Start the same command on as many nodes as needed.
+    """
+    source = _arg_value("shard-source", "EPSS_SHARD_SOURCE", "csv" if "--from-csv" in sys.argv else "api")
+    job = _arg_value("shard-job", "SHARD_JOB", f"epss-{source}-{datetime.date.today().isoformat()}")
+    leases = ShardLeases(connect_dynamodb(), job, num_shards)
+    print(f"🚀 Starting sharded ETL: job {job}, {num_shards} shards, worker {leases.worker_id}, source {source}")
+
+    def process_shard(index):
+        shard = (index, num_shards)
+        with prof.stage(f"shard{index:04d}"):
+            if source == "csv":
+                uploaded = load(chunk_size=CHUNK_SIZE, shard=shard)
+            else:
+                uploaded, _ = run_pipeline(("extract", iter_epss_batches(CHUNK_SIZE, shard=shard)),
+                                           [("transform", transform_epss)],
+                                           ("load", write_batches),
+                                           queue_size=PIPELINE_QUEUE_SIZE)
+                mark_loaded(shard_csv_path(shard))  # stage errors re-raise above, so every row is loaded
+        return {"uploaded": uploaded}
+
+    return run_shards(leases, process_shard, wait="--no-wait" not in sys.argv)
 
 if __name__ == "__main__":
-    print("🚀 Starting ETL pipeline...")
+    # chunked mode: EPSS_CHUNKED=1 or --chunked; chunk size from EPSS_CHUNK_SIZE
+    chunked = "--chunked" in sys.argv or os.getenv("EPSS_CHUNKED", "").lower() in {"1", "true", "yes"}
+    # profiling: PIPELINE_PROFILE=cprofile|sample or --profile[=sample]; artifacts go to daily_extract/
+    prof = Profiler.from_env("epss", os.path.join(PROJECT_ROOT, "daily_extract"))
+    # sharded mode: --shards=N or EPSS_SHARDS=N; workers on any node coordinate through DynamoDB leases
+    num_shards = int(_arg_value("shards", "EPSS_SHARDS", "0") or 0)
+
+    if num_shards > 0:
+        run_sharded(num_shards, prof)
+    elif chunked:
+        print(f"🚀 Starting chunked ETL pipeline (chunk size {CHUNK_SIZE}, queue {PIPELINE_QUEUE_SIZE})...")
+        # extract, transform and load run concurrently on their own threads; bounded queues
+        # between them cap memory at a few chunks and stall the API fetch while DynamoDB catches up
+        # stages overlap on their own threads, so one profile covers the whole pipeline (use --profile=sample)
+        with prof.stage("pipeline"):
+            run_pipeline(("extract", iter_epss_batches(CHUNK_SIZE)),
+                         [("transform", transform_epss)],
+                         ("load", write_batches),
+                         queue_size=PIPELINE_QUEUE_SIZE)
+        mark_loaded()  # stage errors re-raise above, so every fetched row is in DynamoDB
+    else:
+        print("🚀 Starting ETL pipeline...")
 
-    # Step 1: Extract
-    extracted_data = extract_epss()  # capture returned data
+        # Step 1: Extract
+        with prof.stage("extract"):
+            extracted_data = extract_epss()  # capture returned data
 
-    # Step 2: Transform
-    transformed_data = transform_epss(extracted_data)  # pass extracted data
+        # Step 2: Transform
+        with prof.stage("transform"):
+            transformed_data = transform_epss(extracted_data)  # pass extracted data
 
-    # Step 3: Load to DynamoDB
-    load(transformed_data)
+        # Step 3: Load to DynamoDB
+        with prof.stage("load"):
+            load(transformed_data)
+        mark_loaded()  # load() uploads the whole CSV
@@ -1,8 +1,14 @@
+import io
 import csv
 import requests
 import time
 import os
 import sys
+import pandas as pd
+from processed_set import ProcessedCveSet
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.leases import in_shard
 
 DATA_DIR = r"C:\Users\ShivamChopra\Projects\vuln\epss_db"
 ALL_CVE_CSV = os.path.join(DATA_DIR, "daily_extract", "all_cves.csv")
@@ -10,6 +16,7 @@ EPSs_CSV = os.path.join(DATA_DIR, "epss_extract.csv")
 API_URL = "https://api.first.org/data/v1/epss"
 BATCH_SIZE = 100
 SLEEP_TIME = 0.06  # ~1000 requests/minute
+CHUNK_SIZE = int(os.getenv("EPSS_CHUNK_SIZE", "10000"))  # rows held in memory per pipeline chunk
 
 # Increase CSV field size limit
 max_int = sys.maxsize
@@ -20,85 +27,163 @@ while True:
     except OverflowError:
         max_int = int(max_int / 10)
 
-def extract_epss():
-    # -----------------------------
-    # Step 1: Read all CVEs
-    # -----------------------------
-    all_cves = []
+def _iter_all_cves():
+    """Stream CVE ids from ALL_CVE_CSV without building a list."""
     with open(ALL_CVE_CSV, "r", encoding="utf-8") as f:
         reader = csv.DictReader(f)
         for row in reader:
-            cve_id = row.get("id", "").strip()
+            cve_id = (row.get("id") or "").strip()
             if cve_id:
-                all_cves.append(cve_id)
-
-    print(f"📄 Total CVEs in input: {len(all_cves)}")
-
-    # -----------------------------
-    # Step 2: Read already processed CVEs
-    # -----------------------------
-    processed_cves = set()
-    if os.path.exists(EPSs_CSV):
-        with open(EPSs_CSV, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                cve = row.get("cve", "").strip()
-                if cve:
+                yield cve_id
+
+def shard_csv_path(shard=None):
+    """EPSs_CSV, or a per-shard extract file for shard=(index, num_shards)."""
+    if shard is None:
+        return EPSs_CSV
+    base, ext = os.path.splitext(EPSs_CSV)
+    return f"{base}.shard-{shard[0]:04d}-of-{shard[1]:04d}{ext}"
+
+def _load_processed_cves(csv_path=EPSs_CSV):
+    """Packed set of CVEs already in csv_path, resumed from the index saved next to it."""
+    return ProcessedCveSet.load_or_build(csv_path)
+
+def loaded_marker_path(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".loaded"
+
+def mark_loaded(csv_path=None, offset=None):
+    """Record that csv_path (default EPSs_CSV) rows up to offset (default: its size) are in DynamoDB."""
+    csv_path = csv_path or EPSs_CSV
+    if offset is None:
+        offset = os.path.getsize(csv_path) if os.path.exists(csv_path) else 0
+    marker = loaded_marker_path(csv_path)
+    with open(marker + ".tmp", "w", encoding="utf-8") as f:
+        f.write(str(int(offset)))
+    os.replace(marker + ".tmp", marker)
+
+def _iter_unloaded_rows(csv_path, chunk_size):
+    """
+    Rows appended to csv_path after the last mark_loaded, chunk_size at a time. They
+    were fetched (so they count as processed) by a run that stopped before loading them.
+    Without a marker the whole CSV is replayed once; the writes are idempotent.
+    """
+    if not os.path.exists(csv_path):
+        return
+    try:
+        with open(loaded_marker_path(csv_path), encoding="utf-8") as f:
+            loaded = int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        loaded = 0
+    with open(csv_path, "rb") as f:
+        header_line = f.readline()
+        start = max(loaded, len(header_line))
+        if start >= os.path.getsize(csv_path):
+            return
+        header = next(csv.reader([header_line.decode("utf-8")]))
+        f.seek(start)
+        tail = io.TextIOWrapper(f, encoding="utf-8", newline="")
+        replayed = 0
+        for rows in pd.read_csv(tail, names=header, header=None, dtype=str, keep_default_na=False,
+                                chunksize=chunk_size):
+            replayed += len(rows)
+            # same shape as API items: empty fields -> None
+            yield rows.astype(object).where(rows != "", None).to_dict("records")
+        print(f"🔁 Replayed {replayed} rows fetched but not loaded by an earlier run")
+
+def _fetch_batch(batch, processed_cves, batch_no, csv_path=EPSs_CSV):
+    """Fetch one API batch, append new rows to csv_path and return the new items."""
+    batch_str = ",".join(batch)
+    url = f"{API_URL}?cve={batch_str}&pretty=true"
+    new_items = []
+    try:
+        resp = requests.get(url)
+        if resp.status_code == 429:
+            print("⚠️ Rate limit exceeded. Sleeping for 120 seconds...")
+            time.sleep(120)
+            return new_items
+        elif resp.status_code != 200:
+            print(f"❌ Error {resp.status_code} for batch {batch_no}")
+            time.sleep(SLEEP_TIME)
+            return new_items
+
+        data = resp.json().get("data", [])
+        with open(csv_path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            for item in data:
+                cve = item["cve"]
+                if cve not in processed_cves:
+                    writer.writerow([cve, item.get("epss"), item.get("percentile"), item.get("date")])
+                    new_items.append(item)
                     processed_cves.add(cve)
 
-    print(f"📂 Already processed: {len(processed_cves)} CVEs")
+        print(f"✅ Batch {batch_no}: {len(new_items)} CVEs processed. Total so far: {len(processed_cves)}")
+        time.sleep(SLEEP_TIME)
 
-    # -----------------------------
-    # Step 3: Remaining CVEs
-    # -----------------------------
-    remaining_cves = [cve for cve in all_cves if cve not in processed_cves]
-    print(f"🟡 Remaining CVEs: {len(remaining_cves)}")
-    if not remaining_cves:
-        return []
+    except Exception as e:
+        print(f"❌ Exception during batch {batch_no}: {e}")
+        time.sleep(SLEEP_TIME)
+    return new_items
 
-    # -----------------------------
-    # Step 4: Fetch EPSs data in batches
-    # -----------------------------
-    results = []
-    if not os.path.exists(EPSs_CSV):
-        with open(EPSs_CSV, "w", newline="", encoding="utf-8") as f:
+def iter_epss_batches(chunk_size: int = CHUNK_SIZE, shard=None):
+    """
+    Chunked extract: stream the CVE list, fetch remaining CVEs from the API and
+    yield lists of at most ~chunk_size new items. Only the current chunk is held
+    in memory; every fetched row is still appended to EPSs_CSV for resumption.
+    With shard=(index, num_shards) only that shard's CVEs are fetched, and
+    rows and resume state go to the shard's own CSV (shard_csv_path).
+    Rows an earlier run fetched but did not load are yielded first; call
+    mark_loaded(csv_path) once the load stage has finished.
+    """
+    csv_path = shard_csv_path(shard)
+    yield from _iter_unloaded_rows(csv_path, chunk_size)
+    processed_cves = _load_processed_cves(csv_path)
+    print(f"📂 Already processed: {len(processed_cves)} CVEs" + (f" ({os.path.basename(csv_path)})" if shard else ""))
+
+    if not os.path.exists(csv_path):
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
             writer = csv.writer(f)
             writer.writerow(["cve", "epss", "percentile", "date"])
+        processed_cves.save(csv_path)
 
-    for i in range(0, len(remaining_cves), BATCH_SIZE):
-        batch = remaining_cves[i:i+BATCH_SIZE]
-        batch_str = ",".join(batch)
-        url = f"{API_URL}?cve={batch_str}&pretty=true"
-
-        try:
-            resp = requests.get(url)
-            if resp.status_code == 429:
-                print("⚠️ Rate limit exceeded. Sleeping for 120 seconds...")
-                time.sleep(120)
-                continue
-            elif resp.status_code != 200:
-                print(f"❌ Error {resp.status_code} for batch {i//BATCH_SIZE + 1}")
-                time.sleep(SLEEP_TIME)
-                continue
-
-            data = resp.json().get("data", [])
-            new_count = 0
-            with open(EPSs_CSV, "a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                for item in data:
-                    cve = item["cve"]
-                    if cve not in processed_cves:
-                        writer.writerow([cve, item.get("epss"), item.get("percentile"), item.get("date")])
-                        results.append(item)
-                        processed_cves.add(cve)
-                        new_count += 1
-
-            print(f"✅ Batch {i//BATCH_SIZE + 1}: {new_count} CVEs processed. Total so far: {len(processed_cves)}")
-            time.sleep(SLEEP_TIME)
+    total_input = 0
+    remaining = 0
+    fetched = 0
+    batch_no = 0
+    pending = []
+    chunk = []
+    for cve in _iter_all_cves():
+        if not in_shard(cve, shard):
+            continue
+        total_input += 1
+        if cve in processed_cves:
+            continue
+        remaining += 1
+        pending.append(cve)
+        if len(pending) < BATCH_SIZE:
+            continue
+        batch_no += 1
+        chunk.extend(_fetch_batch(pending, processed_cves, batch_no, csv_path))
+        pending = []
+        if len(chunk) >= chunk_size:
+            fetched += len(chunk)
+            # persist resume state before handing the chunk on
+            processed_cves.save(csv_path)
+            yield chunk
+            chunk = []
+    if pending:
+        batch_no += 1
+        chunk.extend(_fetch_batch(pending, processed_cves, batch_no, csv_path))
+    processed_cves.save(csv_path)
+    if chunk:
+        fetched += len(chunk)
+        yield chunk
 
-        except Exception as e:
-            print(f"❌ Exception during batch {i//BATCH_SIZE + 1}: {e}")
-            time.sleep(SLEEP_TIME)
+    print(f"📄 Total CVEs in input: {total_input}")
+    print(f"🟡 Remaining CVEs this run: {remaining}")
+    print(f"✅ Extraction complete. Total new CVEs fetched: {fetched}")
 
-    print(f"✅ Extraction complete. Total new CVEs fetched: {len(results)}")
+def extract_epss():
+    """Fetch all remaining CVEs and return the new items as one list."""
+    results = []
+    for chunk in iter_epss_batches():
+        results.extend(chunk)
     return results
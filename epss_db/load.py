@@ -1,12 +1,20 @@
 # load.py
 import os
+import sys
 import math
 import re
 import time
+import sqlite3
 import pandas as pd
-import boto3
 from decimal import Decimal, InvalidOperation
-from botocore.exceptions import ClientError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.aws import get_or_create_table, get_resource
+from common.ddb_io import item_io
+from common.indexes import index_attributes, table_indexes
+from common.leases import filter_rows
+from common.mirror import DEFAULT_MIRROR_DB, open_mirror
+from common.profiling import profiled_entry
 
 # Config - adjust paths if needed
 PROJECT_ROOT = r"C:\Users\ShivamChopra\Projects\vuln\epss_db"
@@ -15,6 +23,12 @@ DDB_ENDPOINT = "http://localhost:8000"
 AWS_REGION = "us-east-1"
 TABLE_NAME = "epss_data"
 PROGRESS_INTERVAL = 500  # print progress every N rows
+CHUNK_SIZE = int(os.getenv("EPSS_CHUNK_SIZE", "10000"))  # rows per chunk in chunked mode
+# DynamoDB I/O backend: "sync" (boto3) or "async" (aiobotocore); unset -> DDB_BACKEND env
+DDB_BACKEND = os.getenv("EPSS_DDB_BACKEND")
+DDB_ASYNC_CONCURRENCY = int(os.getenv("EPSS_DDB_ASYNC_CONCURRENCY", "64"))
+# local SQLite query mirror updated with the rows written (common/mirror.py); "" -> off
+MIRROR_DB = os.getenv("EPSS_MIRROR_DB", DEFAULT_MIRROR_DB)
 
 # helpers
 _num_re = re.compile(r"^-?\d+(\.\d+)?$")
@@ -53,79 +67,121 @@ def to_ddb_value(v):
     return s
 
 def connect_dynamodb():
-    return boto3.resource(
+    return get_resource(
         "dynamodb",
         region_name=AWS_REGION,
-        aws_access_key_id="dummy",
-        aws_secret_access_key="dummy",
         endpoint_url=DDB_ENDPOINT
     )
 
 def ensure_table(ddb_resource):
-    existing_tables = ddb_resource.meta.client.list_tables().get("TableNames", [])
-    if TABLE_NAME not in existing_tables:
-        print(f"⚡ Creating local DynamoDB table '{TABLE_NAME}' ...")
-        table = ddb_resource.create_table(
-            TableName=TABLE_NAME,
-            KeySchema=[{"AttributeName": "cve", "KeyType": "HASH"}],
-            AttributeDefinitions=[{"AttributeName": "cve", "AttributeType": "S"}],
-            ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
-        )
-        table.meta.client.get_waiter("table_exists").wait(TableName=TABLE_NAME)
-        print("✅ Table created.")
-    else:
-        table = ddb_resource.Table(TABLE_NAME)
-        print(f"ℹ️ Table '{TABLE_NAME}' exists.")
-    return ddb_resource.Table(TABLE_NAME)
+    return get_or_create_table(ddb_resource, TABLE_NAME, "cve", indexes=table_indexes("epss"))
+
+def _row_to_item(row):
+    """Build a DynamoDB item from one CSV/transformed row; None if it has no 'cve'."""
+    item = {}
+    for col, val in row.items():
+        # convert to DDB friendly
+        item[col] = to_ddb_value(val)
+    if item.get("cve") is None:
+        return None
+    # Dynamo requires the partition key to be a string (we can stringify if it's Decimal)
+    if isinstance(item["cve"], Decimal):
+        item["cve"] = str(item["cve"])
+    item.update(index_attributes("epss", item))  # GSI keys (percentile / score buckets)
+    return item
+
+def iter_csv_batches(path=EPSS_CSV, chunk_size=CHUNK_SIZE):
+    """Stream the EPSS CSV as lists of row dicts, chunk_size rows at a time."""
+    # read as strings to avoid unintended numeric casting
+    for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_size):
+        # ensure the 'cve' column exists
+        if "cve" not in chunk.columns:
+            raise ValueError("CSV must contain a 'cve' column (case-sensitive).")
+        yield chunk.to_dict("records")
+
+@profiled_entry("epss", "load", os.path.join(PROJECT_ROOT, "daily_extract"))
+def write_batches(batches, table=None, total=None):
+    """
+    Consume an iterable of row-dict batches (CSV chunks or transformed API batches)
+    and batch-write them. Only the current batch is held in memory. Returns rows uploaded.
+    """
+    if table is None:
+        table = ensure_table(connect_dynamodb())
+    of_total = f"/{total}" if total is not None else ""
+    ddb_io = item_io(table, "cve", DDB_BACKEND, DDB_ASYNC_CONCURRENCY)
+    seen = 0
+    uploaded = 0
+    start = time.time()
+    last = [0]
+
+    def progress(done):
+        # progress every PROGRESS_INTERVAL rows (async reports once per 25-item batch)
+        if done // PROGRESS_INTERVAL != last[0] // PROGRESS_INTERVAL:
+            elapsed = time.time() - start
+            print(f"⬆️ Uploaded {done}{of_total} rows ({elapsed:.1f}s elapsed)")
+        last[0] = done
+
+    for rows in batches:
+        # one mirror run per batch, applied for its written keys only, so nothing grows with the input
+        mirror = open_mirror(MIRROR_DB, "epss")
+        items = []
+        for row in rows:
+            seen += 1
+            item = _row_to_item(row)
+            if item is None:
+                print(f"⚠️ Skipping row {seen - 1} missing 'cve'")
+                continue
+            if mirror:
+                mirror.stage(item)
+            items.append(item)
+        written = []
+        uploaded += ddb_io.put_many(items, lambda n, base=uploaded: progress(base + n), written.extend)
+        if mirror:
+            try:
+                with mirror:
+                    mirror.commit(written)
+            except sqlite3.Error as e:
+                print(f"⚠️ Mirror update for epss failed (run `python -m common.mirror rebuild --tables epss`): {e}")
+
+    elapsed = time.time() - start
+    print(f"✅ Finished upload: {uploaded}/{total if total is not None else seen} rows uploaded in {elapsed:.1f}s")
+    return uploaded
 
-def load():
+@profiled_entry("epss", "load", os.path.join(PROJECT_ROOT, "daily_extract"))
+def load(transformed_data=None, chunk_size=None, shard=None):
+    """
+    Upload EPSS_CSV (which already contains every extracted row) to DynamoDB.
+    With chunk_size the CSV is streamed via pd.read_csv(chunksize=...) so peak
+    memory is bounded by the chunk, not the file. transformed_data is accepted for
+    the epss_main call signature; the CSV is the source of truth.
+    With shard=(index, num_shards) only that shard's rows are uploaded (sharded backfill).
+    """
     # 1) read CSV
     if not os.path.exists(EPSS_CSV):
         raise FileNotFoundError(f"EPSs CSV not found: {EPSS_CSV}")
-    print(f"📄 Reading CSV: {EPSS_CSV}")
-    # read as strings to avoid unintended numeric casting
-    df = pd.read_csv(EPSS_CSV, dtype=str, keep_default_na=False)
-    total = len(df)
-    print(f"ℹ️ Rows in CSV: {total}")
-
-    # ensure the 'cve' column exists
-    if "cve" not in df.columns:
-        raise ValueError("CSV must contain a 'cve' column (case-sensitive).")
+    print(f"📄 Reading CSV: {EPSS_CSV}" + (f" (chunks of {chunk_size})" if chunk_size else ""))
+    if chunk_size:
+        batches = iter_csv_batches(EPSS_CSV, chunk_size)
+        total = None
+    else:
+        # read as strings to avoid unintended numeric casting
+        df = pd.read_csv(EPSS_CSV, dtype=str, keep_default_na=False)
+        total = len(df)
+        print(f"ℹ️ Rows in CSV: {total}")
+        # ensure the 'cve' column exists
+        if "cve" not in df.columns:
+            raise ValueError("CSV must contain a 'cve' column (case-sensitive).")
+        batches = [df.to_dict("records")]
+    if shard is not None:
+        batches = filter_rows(batches, shard)
+        total = None
 
     # 2) connect and ensure table
     ddb = connect_dynamodb()
     table = ensure_table(ddb)
 
     # 3) batch write all rows
-    uploaded = 0
-    start = time.time()
-    with table.batch_writer(overwrite_by_pkeys=["cve"]) as batch:
-        for idx, row in df.iterrows():
-            # build item dict
-            item = {}
-            for col in df.columns:
-                val = row.get(col)
-                # convert to DDB friendly
-                item[col] = to_ddb_value(val)
-            # ensure partition key 'cve' is a string and present
-            if item.get("cve") is None:
-                print(f"⚠️ Skipping row {idx} missing 'cve'")
-                continue
-            # Dynamo requires the partition key to be a string (we can stringify if it's Decimal)
-            if isinstance(item["cve"], Decimal):
-                item["cve"] = str(item["cve"])
-            try:
-                batch.put_item(Item=item)
-                uploaded += 1
-            except ClientError as e:
-                print(f"❌ Failed to write cve={item.get('cve')}: {e}")
-            # progress
-            if uploaded % PROGRESS_INTERVAL == 0:
-                elapsed = time.time() - start
-                print(f"⬆️ Uploaded {uploaded}/{total} rows ({elapsed:.1f}s elapsed)")
-
-    elapsed = time.time() - start
-    print(f"✅ Finished upload: {uploaded}/{total} rows uploaded in {elapsed:.1f}s")
+    uploaded = write_batches(batches, table=table, total=total)
 
     # optional verify: count items in table (scan)
     try:
@@ -133,6 +189,7 @@ def load():
         print("ℹ️ DynamoDB table status:", resp["Table"]["TableStatus"])
     except Exception:
         pass
+    return uploaded
 
 if __name__ == "__main__":
     load()
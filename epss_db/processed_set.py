@@ -0,0 +1,119 @@
+# processed_set.py
+"""
+Compact membership set of already-processed CVEs for extract resumption.
+
+CVE ids are packed with the shared codec (common/cve.py) into a sorted numpy int64 array
+(8 bytes per CVE instead of a ~60-byte Python str). The array is persisted next
+to the EPSS CSV together with the CSV size it covers, so a resumed run loads the
+array and only parses rows appended to the CSV after the last save.
+"""
+import io
+import os
+import sys
+import csv
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.cve import INVALID, pack_cve, pack_many
+
+def index_path_for(csv_path: str) -> str:
+    return os.path.splitext(csv_path)[0] + ".cves.npz"
+
+class ProcessedCveSet:
+    """Set-like (in / add / len) view over packed CVE keys; new keys are buffered until compact()."""
+
+    def __init__(self, keys=None, irregular=None):
+        self._sorted = np.unique(np.asarray(keys if keys is not None else [], dtype=np.int64))
+        self._new = set()
+        self._irregular = set(irregular or ())
+
+    def __contains__(self, cve) -> bool:
+        key = pack_cve(cve)
+        if key is None:
+            return cve in self._irregular
+        if key in self._new:
+            return True
+        i = int(np.searchsorted(self._sorted, key))
+        return i < len(self._sorted) and int(self._sorted[i]) == key
+
+    def add(self, cve):
+        if cve in self:
+            return
+        key = pack_cve(cve)
+        if key is None:
+            self._irregular.add(cve)
+        else:
+            self._new.add(key)
+
+    def __len__(self):
+        return len(self._sorted) + len(self._new) + len(self._irregular)
+
+    def compact(self):
+        """Merge buffered keys into the sorted array."""
+        if self._new:
+            merged = np.concatenate([self._sorted, np.fromiter(self._new, dtype=np.int64, count=len(self._new))])
+            self._sorted = np.unique(merged)
+            self._new = set()
+
+    def _add_values(self, values: pd.Series):
+        """Vectorized bulk add of raw CVE strings (one CSV column)."""
+        values = values.astype(str).str.strip()
+        values = values[values != ""]
+        keys = pack_many(values)
+        ok = keys != INVALID
+        if (~ok).any():
+            self._irregular.update(values[~ok].tolist())
+        if ok.any():
+            self._sorted = np.unique(np.concatenate([self._sorted, keys[ok]]))
+
+    # ---------------- persistence ----------------
+    def save(self, csv_path: str, index_path: str = None):
+        """Persist the set with the CSV size it covers (atomic replace)."""
+        self.compact()
+        index_path = index_path or index_path_for(csv_path)
+        csv_size = os.path.getsize(csv_path) if os.path.exists(csv_path) else 0
+        tmp = index_path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, keys=self._sorted, irregular=np.array(sorted(self._irregular), dtype=str),
+                     csv_size=np.int64(csv_size))
+        os.replace(tmp, index_path)
+
+    @classmethod
+    def load_or_build(cls, csv_path: str, index_path: str = None) -> "ProcessedCveSet":
+        """
+        Load the persisted set and parse only CSV rows appended since it was saved.
+        Falls back to a full CSV parse (and saves the result) if the index is missing or stale.
+        """
+        index_path = index_path or index_path_for(csv_path)
+        if not os.path.exists(csv_path):
+            return cls()
+        csv_size = os.path.getsize(csv_path)
+
+        if os.path.exists(index_path):
+            try:
+                with np.load(index_path) as data:
+                    covered = int(data["csv_size"])
+                    s = cls(data["keys"], data["irregular"].tolist())
+                if covered <= csv_size:
+                    if covered < csv_size:
+                        with open(csv_path, "rb") as f:
+                            header_line = f.readline()
+                            header = next(csv.reader([header_line.decode("utf-8")]))
+                            f.seek(max(covered, len(header_line)))
+                            tail = io.TextIOWrapper(f, encoding="utf-8", newline="")
+                            rows = pd.read_csv(tail, names=header, header=None, usecols=["cve"],
+                                               dtype=str, keep_default_na=False)
+                            s._add_values(rows["cve"])
+                        s.save(csv_path, index_path)
+                    return s
+                print("⚠️ Processed-CVE index is newer than the CSV; rebuilding")
+            except Exception as e:
+                print(f"⚠️ Failed to read processed-CVE index ({e}); rebuilding")
+
+        s = cls()
+        rows = pd.read_csv(csv_path, usecols=["cve"], dtype=str, keep_default_na=False)
+        s._add_values(rows["cve"])
+        s.save(csv_path, index_path)
+        return s
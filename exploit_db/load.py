@@ -1,12 +1,22 @@
 # load.py
 import os
+import sys
 import math
 import json
 import time
+import sqlite3
 import pandas as pd
-import boto3
 from decimal import Decimal
-from botocore.exceptions import ClientError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.hashing import frame_hashes
+from common.aws import get_or_create_table, get_resource
+from common.profiling import profiled_entry
+from common.extdiff import CHANGED, NEW, external_diff
+from common.ddb_io import item_io, progress_printer
+from common.changelog import INSERT, RESTORE, UPDATE, changed_fields, open_changelog
+from common.mirror import DEFAULT_MIRROR_DB, open_mirror
+from common.indexes import index_attributes, table_indexes
 
 # Configuration (leave as-is or pass config from exploit_main later)
 TABLE_NAME = "exploit_data"
@@ -16,33 +26,32 @@ PROJECT_ROOT = r"C:\Users\ShivamChopra\Projects\vuln\exploit_db"
 DAILY_DIR = os.path.join(PROJECT_ROOT, "daily_extract")
 BASELINE_FILE = os.path.join(DAILY_DIR, "exploit_extract.csv")
 BATCH_PROGRESS_INTERVAL = 100
+# low-memory diff: stream both CSVs in chunks and diff via on-disk sorted runs (common/extdiff.py)
+EXTERNAL_DIFF = os.getenv("EXPLOIT_EXTERNAL_DIFF", "").lower() in {"1", "true", "yes"}
+DIFF_CHUNK_ROWS = int(os.getenv("EXPLOIT_DIFF_CHUNK_ROWS", "50000"))
+# DynamoDB I/O backend: "sync" (boto3) or "async" (aiobotocore); unset -> DDB_BACKEND env
+DDB_BACKEND = os.getenv("EXPLOIT_DDB_BACKEND")
+DDB_ASYNC_CONCURRENCY = int(os.getenv("EXPLOIT_DDB_ASYNC_CONCURRENCY", "64"))
+MISSING_CHECK_BATCH = 1000  # baseline ids checked against DynamoDB per get_many call (external diff)
+# change log (NDJSON segments) of each run's inserts/updates/restores; unset -> DAILY_DIR/changelog, "" -> off
+CHANGELOG_DIR = os.getenv("EXPLOIT_CHANGELOG_DIR")
+# local SQLite query mirror updated with each run's written rows (common/mirror.py); "" -> off
+MIRROR_DB = os.getenv("EXPLOIT_MIRROR_DB", DEFAULT_MIRROR_DB)
 
 # ---------- Helpers ----------
 def ensure_daily_dir():
     os.makedirs(DAILY_DIR, exist_ok=True)
 
 def get_table():
-    dynamodb = boto3.resource(
+    dynamodb = get_resource(
         "dynamodb",
         region_name=AWS_REGION,
-        aws_access_key_id="dummy",
-        aws_secret_access_key="dummy",
         endpoint_url=DDB_ENDPOINT,
     )
-    existing = dynamodb.meta.client.list_tables().get("TableNames", [])
-    if TABLE_NAME not in existing:
-        print(f"⚡ Creating DynamoDB table '{TABLE_NAME}' locally...")
-        table = dynamodb.create_table(
-            TableName=TABLE_NAME,
-            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
-            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
-            ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
-        )
-        table.meta.client.get_waiter("table_exists").wait(TableName=TABLE_NAME)
-        print("✅ Table created.")
-    else:
-        table = dynamodb.Table(TABLE_NAME)
-    return table
+    return get_or_create_table(dynamodb, TABLE_NAME, "id", indexes=table_indexes("exploit"))
+
+def get_item_io(table):
+    return item_io(table, "id", DDB_BACKEND, DDB_ASYNC_CONCURRENCY)
 
 def normalize_value(v):
     """Normalize value for robust comparison"""
@@ -78,27 +87,17 @@ def rows_differ(csv_row, ddb_item):
     """Compare normalized versions (ignore uploaded_date)."""
     return normalize_row(csv_row) != normalize_row(ddb_item)
 
-def write_uploaded_ids_file(ids, tag):
-    os.makedirs(DAILY_DIR, exist_ok=True)
-    path = os.path.join(DAILY_DIR, f"uploaded_ids_{tag}.txt")
-    with open(path, "w", encoding="utf-8") as f:
-        for _id in ids:
-            f.write(f"{_id}\n")
-    print(f"ℹ️ Wrote uploaded ids: {path}")
+def id_hash_map(df, fields):
+    """id -> vectorized content hash of each row over fields (same normalization as normalize_value)."""
+    ids = df["id"].astype("string").str.strip()
+    valid = (ids.notna() & (ids != "")).to_numpy()
+    return dict(zip(ids[valid].tolist(), frame_hashes(df[valid], fields)))
 
-# ---------- Main exported function ----------
-def sync_today_with_dynamodb(current_csv_path: str):
+def _in_memory_changes(current_csv_path, ddb_io):
     """
-    Sync behaviour:
-      - Compare incoming transformed CSV with existing baseline (if present) to compute changed_ids.
-      - Ensure baseline rows missing in DynamoDB are re-added.
-      - Upload only true missing/changed rows to DynamoDB.
-      - Overwrite baseline file so only exploit_extract.csv exists in daily_extract/.
-      - Return a summary dict and write a sync_log JSON and uploaded_ids TXT.
+    Changed/missing detection over both CSVs held in memory.
+    Returns (row count, changed_ids, new_map, base_map, changes) with changes[id] = (op, hash, old row).
     """
-    ensure_daily_dir()
-    table = get_table()
-
     # --- Load incoming CSV (transformed)
     df_new = pd.read_csv(current_csv_path, dtype=str)
     new_count = len(df_new)
@@ -126,45 +125,105 @@ def sync_today_with_dynamodb(current_csv_path: str):
     else:
         print("ℹ️ No baseline found (first run)")
 
-    # --- Compute changed_ids by comparing new_map vs base_map (ignore uploaded_date)
-    changed_ids = []
-    for rid, new_row in new_map.items():
-        base_row = base_map.get(rid)
-        if base_row is None:
-            changed_ids.append(rid)
-        else:
-            if rows_differ(new_row, base_row):
-                changed_ids.append(rid)
+    # --- Compute changed_ids by comparing row hashes of new vs baseline (ignore uploaded_date)
+    columns = set(df_new.columns) | (set(df_base.columns) if baseline_exists else set())
+    hash_fields = sorted(columns - {"uploaded_date"})
+    new_hashes = id_hash_map(df_new, hash_fields)
+    base_hashes = id_hash_map(df_base, hash_fields) if baseline_exists else {}
+    changed_ids = [rid for rid in new_map if base_hashes.get(rid) != new_hashes.get(rid)]
+    changes = {rid: (UPDATE, new_hashes.get(rid), base_map[rid]) if rid in base_map else (INSERT, new_hashes.get(rid), None)
+               for rid in changed_ids}
 
     # --- Additionally check baseline rows missing from DynamoDB (re-add deleted rows)
     # We'll fetch from DynamoDB only for baseline ids (to detect deletions).
     missing_from_ddb_ids = []
     if baseline_exists:
-        # For efficiency, fetch per-id for baseline (could be optimized in batches)
-        for rid in base_map.keys():
-            try:
-                resp = table.get_item(Key={"id": rid})
-                if "Item" not in resp:
-                    missing_from_ddb_ids.append(rid)
-            except ClientError as e:
-                print(f"⚠️ Warning fetching id={rid} from DDB: {e}")
+        # batched key-only reads for the baseline ids
+        present = ddb_io.get_many(base_map.keys(), attributes=["id"])
+        missing_from_ddb_ids = [rid for rid in base_map if rid not in present]
     # merge missing ids so they will be written
     for mid in missing_from_ddb_ids:
-        if mid not in changed_ids:
+        if mid not in changes:
             changed_ids.append(mid)
+            changes[mid] = (RESTORE, new_hashes.get(mid) or base_hashes.get(mid), None)
 
-    # If no changes at all, we still overwrite baseline with incoming file (per requirement)
-    if not changed_ids:
-        print("✅ No changes detected vs baseline and no missing rows in DDB.")
+    return new_count, changed_ids, new_map, base_map, changes
+
+def _iter_hashed_rows(path, fields, counter=None, chunk_rows=DIFF_CHUNK_ROWS):
+    """Stream (id, content hash, row dict) from a CSV, chunk_rows rows at a time."""
+    for chunk in pd.read_csv(path, dtype=str, chunksize=chunk_rows):
+        if counter is not None:
+            counter[0] += len(chunk)
+        ids = chunk["id"].astype("string").str.strip()
+        valid = (ids.notna() & (ids != "")).to_numpy()
+        chunk = chunk[valid]
+        rows = chunk.astype(object).where(chunk.notna(), None).to_dict("records")
+        yield from zip(ids[valid].tolist(), frame_hashes(chunk, fields), rows)
+
+def _external_changes(current_csv_path, ddb_io, new_count):
+    """
+    EXTERNAL_DIFF variant of the changed/missing detection with bounded memory.
+    Yields batches of about MISSING_CHECK_BATCH (id, row, change) entries, change as in
+    _in_memory_changes; new_count[0] holds the incoming row count once exhausted.
+    """
+    columns = set(pd.read_csv(current_csv_path, dtype=str, nrows=0).columns)
+    baseline_exists = os.path.exists(BASELINE_FILE)
+    if baseline_exists:
+        columns |= set(pd.read_csv(BASELINE_FILE, dtype=str, nrows=0).columns)
+        print("ℹ️ Baseline found; diffing via external sort-merge")
     else:
-        print(f"ℹ️ Total changed/missing ids to consider: {len(changed_ids)}")
+        print("ℹ️ No baseline found (first run)")
+    hash_fields = sorted(columns - {"uploaded_date"})
+    old = _iter_hashed_rows(BASELINE_FILE, hash_fields) if baseline_exists else iter(())
+    batch = []
+    unchanged = {}  # baseline rows waiting for the batched DynamoDB existence check
+
+    def check_unchanged():
+        # baseline rows missing from DynamoDB are re-added (same rule as the in-memory path)
+        present = ddb_io.get_many(unchanged.keys(), attributes=["id"])
+        for rid, (row_hash, payload) in unchanged.items():
+            if rid not in present:
+                batch.append((rid, payload, (RESTORE, row_hash, None)))
+        unchanged.clear()
+
+    for row in external_diff(old, _iter_hashed_rows(current_csv_path, hash_fields, new_count), emit_unchanged=True):
+        payload = (row.new or row.old)[1]
+        if row.status in (NEW, CHANGED):
+            change = (INSERT, row.new[0], None) if row.status == NEW else (UPDATE, row.new[0], row.old[1])
+            batch.append((row.key, payload, change))
+        elif row.old is not None:
+            unchanged[row.key] = (row.old[0], payload)
+            if len(unchanged) >= MISSING_CHECK_BATCH:
+                check_unchanged()
+        if len(batch) >= MISSING_CHECK_BATCH:
+            yield batch
+            batch = []
+    if unchanged:
+        check_unchanged()
+    if batch:
+        yield batch
 
-    # --- Prepare items to write by checking each changed_id against DynamoDB
+def _safe_item(item):
+    # DynamoDB rejects empty strings: convert '' -> None
+    safe_item = {k: (None if (isinstance(v, str) and v == "") else v) for k, v in item.items()}
+    # convert any floats (should be strings mostly) to Decimal if present
+    for k, v in list(safe_item.items()):
+        if isinstance(v, float):
+            if math.isnan(v) or math.isinf(v):
+                safe_item[k] = None
+            else:
+                safe_item[k] = Decimal(str(v))
+    safe_item.update(index_attributes("exploit", safe_item))  # GSI keys (platform / date_published)
+    return safe_item
+
+def _write_batch(batch, ddb_io, changelog, mirror):
+    """
+    Compare one batch of (id, row, change) entries with DynamoDB, write the rows that differ,
+    and log / stage them. Returns (rows to write, uploaded ids).
+    """
+    existing = ddb_io.get_many([rid for rid, _, _ in batch])
     to_write = []
-    for rid in changed_ids:
-        csv_row = new_map.get(rid) or base_map.get(rid)
-        if csv_row is None:
-            continue
+    for rid, csv_row, _ in batch:
         # normalize for id and clean
         csv_row_prepared = {}
         for k, v in csv_row.items():
@@ -174,46 +233,92 @@ def sync_today_with_dynamodb(current_csv_path: str):
                 csv_row_prepared[k] = v
         csv_row_prepared["id"] = str(csv_row_prepared["id"])
 
-        # compare with existing DDB item (if any)
-        try:
-            resp = table.get_item(Key={"id": csv_row_prepared["id"]})
-            ddb_item = resp.get("Item")
-        except ClientError as e:
-            print(f"⚠️ Warning fetching id={csv_row_prepared['id']} from DDB: {e}")
-            ddb_item = None
-
-        if ddb_item is None:
+        # compare with existing DDB item (if any); write when missing or different
+        ddb_item = existing.get(csv_row_prepared["id"])
+        if ddb_item is None or rows_differ(csv_row_prepared, ddb_item):
             to_write.append(csv_row_prepared)
-        else:
-            if rows_differ(csv_row_prepared, ddb_item):
-                to_write.append(csv_row_prepared)
-            else:
-                # already up-to-date
-                pass
 
-    # --- Batch write to DynamoDB
     uploaded_ids = []
     if to_write:
-        print(f"⬆️ Writing {len(to_write)} item(s) to DynamoDB...")
-        with table.batch_writer(overwrite_by_pkeys=["id"]) as batch:
-            count = 0
-            for item in to_write:
-                # DynamoDB rejects empty strings: convert '' -> None
-                safe_item = {k: (None if (isinstance(v, str) and v == "") else v) for k, v in item.items()}
-                # convert any floats (should be strings mostly) to Decimal if present
-                for k, v in list(safe_item.items()):
-                    if isinstance(v, float):
-                        if math.isnan(v) or math.isinf(v):
-                            safe_item[k] = None
-                        else:
-                            safe_item[k] = Decimal(str(v))
-                batch.put_item(Item=safe_item)
-                uploaded_ids.append(safe_item["id"])
-                count += 1
-                if count % BATCH_PROGRESS_INTERVAL == 0 or count == len(to_write):
-                    print(f"⬆️ Batch wrote {count}/{len(to_write)}")
+        print(f"⬆️ Writing {len(to_write)} item(s) to DynamoDB ({ddb_io.name} backend)...")
+        progress = progress_printer(BATCH_PROGRESS_INTERVAL, len(to_write), "⬆️ Batch wrote {}/{}")
+        ddb_io.put_many((_safe_item(item) for item in to_write), progress, uploaded_ids.extend)
+
+    # change log: every changed/restored id except those whose write failed
+    if changelog:
+        failed = {item["id"] for item in to_write} - set(uploaded_ids)
+        for rid, row, (op, row_hash, old_row) in batch:
+            if rid in failed:
+                continue
+            new_row = normalize_row(row)
+            changed = changed_fields(normalize_row(old_row), new_row) if op == UPDATE else None
+            changelog.append(op, rid, row_hash, changed, item=new_row)
+    if mirror:
+        mirror.stage_many(to_write)  # applied after the last batch, for written keys only
+    return len(to_write), uploaded_ids
+
+def write_uploaded_ids_file(ids, tag):
+    os.makedirs(DAILY_DIR, exist_ok=True)
+    path = os.path.join(DAILY_DIR, f"uploaded_ids_{tag}.txt")
+    with open(path, "w", encoding="utf-8") as f:
+        for _id in ids:
+            f.write(f"{_id}\n")
+    print(f"ℹ️ Wrote uploaded ids: {path}")
+
+# ---------- Main exported function ----------
+@profiled_entry("exploit", "load")
+def sync_today_with_dynamodb(current_csv_path: str):
+    """
+    Sync behaviour:
+      - Compare incoming transformed CSV with existing baseline (if present) to compute changed_ids.
+      - Ensure baseline rows missing in DynamoDB are re-added.
+      - Upload only true missing/changed rows to DynamoDB.
+      - Overwrite baseline file so only exploit_extract.csv exists in daily_extract/.
+      - Return a summary dict and write a sync_log JSON and uploaded_ids TXT.
+    """
+    ensure_daily_dir()
+    table = get_table()
+    ddb_io = get_item_io(table)
+
+    if EXTERNAL_DIFF:
+        # batches are diffed, compared with DynamoDB and written one at a time
+        new_count = [0]
+        batches = _external_changes(current_csv_path, ddb_io, new_count)
     else:
+        new_count, changed_ids, new_map, base_map, changes = _in_memory_changes(current_csv_path, ddb_io)
+        batches = [[(rid, new_map.get(rid) or base_map.get(rid), changes[rid]) for rid in changed_ids]]
+
+    changelog = open_changelog(CHANGELOG_DIR if CHANGELOG_DIR is not None else os.path.join(DAILY_DIR, "changelog"),
+                               "exploit")
+    # local query mirror: rows staged per batch, the written ones applied in one SQLite transaction at the end
+    mirror = open_mirror(MIRROR_DB, "exploit", changelog.run_id if changelog else None)
+    considered, to_write, uploaded_ids = 0, 0, []
+    for batch in batches:
+        if not batch:
+            continue
+        considered += len(batch)
+        written, uploaded = _write_batch(batch, ddb_io, changelog, mirror)
+        to_write += written
+        uploaded_ids.extend(uploaded)
+    if EXTERNAL_DIFF:
+        new_count = new_count[0]
+        print(f"ℹ️ Incoming transformed rows: {new_count}")
+
+    if not considered:
+        print("✅ No changes detected vs baseline and no missing rows in DDB.")
         print("ℹ️ Nothing to write to DynamoDB.")
+    else:
+        print(f"ℹ️ Total changed/missing ids considered: {considered}")
+
+    if changelog:
+        changelog.commit({"uploaded": len(uploaded_ids), "total_incoming": new_count})
+    mirror_rows = 0
+    if mirror:
+        try:
+            with mirror:
+                mirror_rows = mirror.commit(uploaded_ids, changelog_seq=changelog.seq if changelog else None)
+        except sqlite3.Error as e:
+            print(f"⚠️ Mirror update for exploit failed (run `python -m common.mirror rebuild --tables exploit`): {e}")
 
     # --- Overwrite baseline with incoming file so only exploit_extract.csv remains
     try:
@@ -256,9 +361,11 @@ def sync_today_with_dynamodb(current_csv_path: str):
     log = {
         "timestamp": timestamp_tag,
         "total_incoming": new_count,
-        "changed_ids_considered": len(changed_ids),
-        "to_write": len(to_write),
+        "changed_ids_considered": considered,
+        "to_write": to_write,
         "uploaded": len(uploaded_ids),
+        "changelog_entries": changelog.count if changelog else 0,
+        "mirror_rows": mirror_rows,
     }
     log_path = os.path.join(DAILY_DIR, f"sync_log_{timestamp_tag}.json")
     try:
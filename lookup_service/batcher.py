@@ -0,0 +1,81 @@
+# batcher.py
+import asyncio
+from functools import partial
+from typing import Dict, Iterable, Optional
+
+from common.query import BATCH_GET_LIMIT
+
+_NOT_CACHED = object()
+
+class BatchCoalescer:
+    """
+    Merges the keys requested by concurrent callers for one feed into shared
+    BatchGetItem calls. Keys already cached by the reader never leave the
+    process; keys already in flight for another request are awaited, not refetched.
+    """
+
+    def __init__(self, reader, feed: str, executor, max_wait_ms: float = 2.0, max_keys: int = BATCH_GET_LIMIT):
+        self.reader = reader
+        self.feed = feed
+        self.executor = executor
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_keys = max_keys
+        self._pending: Dict[str, asyncio.Future] = {}  # waiting for the next flush
+        self._in_flight: Dict[str, asyncio.Future] = {}  # sent, until _resolve sets the result
+        self._timer = None
+        self.batches_sent = 0
+
+    async def get_many(self, keys: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        loop = asyncio.get_running_loop()
+        out = {}
+        waits = {}
+        for key in keys:
+            cached = self.reader.cache.get((self.feed, key), _NOT_CACHED)
+            if cached is not _NOT_CACHED:
+                out[key] = cached
+                continue
+            fut = self._in_flight.get(key) or self._pending.get(key)
+            if fut is None:
+                fut = loop.create_future()
+                self._pending[key] = fut
+            waits[key] = fut
+
+        if len(self._pending) >= self.max_keys:
+            self._flush()
+        elif self._pending and self._timer is None:
+            # wait a moment so concurrent requests can share the same batches
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        if waits:
+            results = await asyncio.gather(*waits.values())
+            out.update(zip(waits.keys(), results))
+        return out
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        self._in_flight.update(pending)
+        loop = asyncio.get_running_loop()
+        keys = list(pending)
+        for i in range(0, len(keys), self.max_keys):
+            chunk = keys[i:i + self.max_keys]
+            task = loop.run_in_executor(self.executor, self.reader.get_items, self.feed, chunk)
+            task.add_done_callback(partial(self._resolve, {k: pending[k] for k in chunk}))
+            self.batches_sent += 1
+
+    def _resolve(self, futures: Dict[str, asyncio.Future], task):
+        exc = task.exception()
+        result = None if exc else task.result()
+        for key, fut in futures.items():
+            if self._in_flight.get(key) is fut:
+                del self._in_flight[key]
+            if fut.done():
+                continue
+            if exc:
+                fut.set_exception(exc)
+            else:
+                fut.set_result(result.get(key))
@@ -0,0 +1,258 @@
+# lookup_main.py
+"""
+Local HTTP lookup service over the loaded feed tables.
+
+    POST /lookup      {"cves": ["CVE-2021-44228", ...]}  -> merged KEV/EPSS/Exploit-DB/Metasploit per CVE
+    GET  /cve/{id}    single CVE
+    GET  /top?k=50    precomputed risk ranking from the local mirror (common/risk_rank.py)
+    GET  /search?q=cisco+asa&k=20&feeds=cisa,metasploit   BM25 full-text search (common/text_search.py)
+    GET  /misp/resolve?alias=Fancy+Bear                   MISP clusters for an alias (common/misp_graph.py)
+    GET  /misp/related/{uuid or alias}?hops=2&direction=both&relations=similar
+    POST /invalidate  {"feed": "cisa", "summary": {...}, "keys": [...]}  (keys optional)
+    GET  /health      cache and batching counters
+
+Concurrent requests are coalesced into shared BatchGetItem calls per table;
+each table has its own thread pool and connection pool.
+"""
+import os
+import sys
+import json
+import asyncio
+import time
+from decimal import Decimal
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from aiohttp import web
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.aws import client_config, get_session, resolve_credentials
+from common.query import FEED_TABLES, CVE_ATTRIBUTES, VulnReader, normalize_cve_ids, merge_cve_views
+from common.mirror import DEFAULT_MIRROR_DB
+from common import risk_rank
+from common.text_search import ReloadingIndex, index_path
+from common.misp_graph import DIRECTIONS, ReloadingGraph, graph_path
+from batcher import BatchCoalescer
+
+LOOKUP_CONFIG = {
+    "HOST": os.getenv("LOOKUP_HOST", "127.0.0.1"),
+    "PORT": int(os.getenv("LOOKUP_PORT", "8080")),
+    "DDB_ENDPOINT": os.getenv("DDB_ENDPOINT", "http://localhost:8000"),
+    "AWS_REGION": os.getenv("AWS_REGION", "us-east-1"),
+    "AWS_ACCESS_KEY_ID": os.getenv("AWS_ACCESS_KEY_ID"),  # None: common/aws.py credential policy
+    "AWS_SECRET_ACCESS_KEY": os.getenv("AWS_SECRET_ACCESS_KEY"),
+    "MAX_CVES_PER_REQUEST": int(os.getenv("LOOKUP_MAX_CVES", "5000")),
+    "POOL_SIZE_PER_TABLE": int(os.getenv("LOOKUP_POOL_SIZE", "16")),
+    "COALESCE_WAIT_MS": float(os.getenv("LOOKUP_COALESCE_WAIT_MS", "2")),
+    "CACHE_MAX_ITEMS": int(os.getenv("LOOKUP_CACHE_MAX_ITEMS", "200000")),
+    "CACHE_TTL_SECONDS": int(os.getenv("LOOKUP_CACHE_TTL_SECONDS", "3600")),
+    "MIRROR_DB": DEFAULT_MIRROR_DB,
+}
+
+LOOKUP_FEEDS = ("cisa", "epss", "exploit", "metasploit")
+
+def _json_default(v):
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (set, frozenset)):
+        return sorted(v)
+    return str(v)
+
+_dumps = partial(json.dumps, default=_json_default, ensure_ascii=False)
+
+class LookupService:
+    def __init__(self, cfg: dict):
+        self.cfg = cfg
+        pool = cfg["POOL_SIZE_PER_TABLE"]
+        session = get_session(*resolve_credentials(cfg["DDB_ENDPOINT"], cfg["AWS_ACCESS_KEY_ID"],
+                                                   cfg["AWS_SECRET_ACCESS_KEY"]), cfg["AWS_REGION"])
+        clients = {}
+        self.executors = {}
+        for feed in FEED_TABLES:
+            # one keep-alive connection pool per table, sized to its worker threads
+            res = session.resource("dynamodb", endpoint_url=cfg["DDB_ENDPOINT"], config=client_config(pool))
+            clients[feed] = res.meta.client
+            self.executors[feed] = ThreadPoolExecutor(max_workers=pool, thread_name_prefix=f"ddb-{feed}")
+        self.reader = VulnReader(cfg, ddb_resource=res, table_clients=clients)
+        self.text_index = ReloadingIndex(index_path(cfg["MIRROR_DB"])) if cfg.get("MIRROR_DB") else None
+        self.misp_graph = ReloadingGraph(graph_path(cfg["MIRROR_DB"])) if cfg.get("MIRROR_DB") else None
+        self.coalescers = {
+            feed: BatchCoalescer(self.reader, feed, self.executors[feed], cfg["COALESCE_WAIT_MS"])
+            for feed in LOOKUP_FEEDS
+        }
+
+    async def warm_up(self):
+        """Build the CVE indexes for exploit/metasploit before the first request arrives."""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self.executors[feed], self.reader.related_ids, feed, [])
+            for feed in CVE_ATTRIBUTES
+        ))
+
+    async def _related(self, feed: str, cves):
+        loop = asyncio.get_running_loop()
+        ids = await loop.run_in_executor(self.executors[feed], self.reader.related_ids, feed, cves)
+        items = await self.coalescers[feed].get_many([i for v in ids.values() for i in v])
+        return {c: [items[i] for i in v if items.get(i)] for c, v in ids.items()}
+
+    async def lookup(self, cve_ids):
+        cves = normalize_cve_ids(cve_ids)
+        kev, epss, exploits, msf = await asyncio.gather(
+            self.coalescers["cisa"].get_many(cves),
+            self.coalescers["epss"].get_many(cves),
+            self._related("exploit", cves),
+            self._related("metasploit", cves),
+        )
+        return merge_cve_views(cves, kev, epss, exploits, msf)
+
+    def close(self):
+        for ex in self.executors.values():
+            ex.shutdown(wait=False)
+
+# ---------------- HTTP handlers ----------------
+async def handle_lookup(request):
+    svc = request.app["service"]
+    try:
+        body = await request.json()
+    except Exception:
+        raise web.HTTPBadRequest(text="body must be JSON")
+    cves = body.get("cves") if isinstance(body, dict) else body
+    if not isinstance(cves, list):
+        raise web.HTTPBadRequest(text='expected {"cves": [...]} or a JSON list')
+    if len(cves) > svc.cfg["MAX_CVES_PER_REQUEST"]:
+        raise web.HTTPRequestEntityTooLarge(max_size=svc.cfg["MAX_CVES_PER_REQUEST"], actual_size=len(cves))
+    t0 = time.perf_counter()
+    results = await svc.lookup(str(c) for c in cves)
+    payload = {"count": len(results), "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
+               "results": list(results.values())}
+    return web.json_response(payload, dumps=_dumps)
+
+async def handle_cve(request):
+    svc = request.app["service"]
+    results = await svc.lookup([request.match_info["cve_id"]])
+    return web.json_response(next(iter(results.values()), None), dumps=_dumps)
+
+async def handle_top(request):
+    svc = request.app["service"]
+    try:
+        k = int(request.query.get("k", "100"))
+    except ValueError:
+        raise web.HTTPBadRequest(text="k must be an integer")
+    if not svc.cfg.get("MIRROR_DB"):
+        raise web.HTTPServiceUnavailable(text="mirror disabled")
+    loop = asyncio.get_running_loop()
+    try:
+        rows = await loop.run_in_executor(svc.executors["epss"], risk_rank.top, max(1, k), svc.cfg["MIRROR_DB"])
+    except FileNotFoundError as e:
+        raise web.HTTPServiceUnavailable(text=str(e))
+    return web.json_response({"count": len(rows), "results": rows}, dumps=_dumps)
+
+async def handle_search(request):
+    svc = request.app["service"]
+    text = request.query.get("q", "").strip()
+    if not text:
+        raise web.HTTPBadRequest(text="q is required")
+    try:
+        k = int(request.query.get("k", "20"))
+    except ValueError:
+        raise web.HTTPBadRequest(text="k must be an integer")
+    if svc.text_index is None:
+        raise web.HTTPServiceUnavailable(text="mirror disabled")
+    feeds = [f for f in request.query.get("feeds", "").split(",") if f] or None
+    t0 = time.perf_counter()
+    hits = svc.text_index.search(text, max(1, k), feeds)  # memory-mapped, a few ms: no executor hop
+    return web.json_response({"count": len(hits), "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
+                              "results": hits}, dumps=_dumps)
+
+def _misp_graph(request):
+    svc = request.app["service"]
+    graph = svc.misp_graph.get() if svc.misp_graph is not None else None
+    if graph is None:
+        raise web.HTTPServiceUnavailable(text="MISP graph not built (python -m common.misp_graph rebuild)")
+    return graph
+
+async def handle_misp_resolve(request):
+    alias = request.query.get("alias", "").strip()
+    if not alias:
+        raise web.HTTPBadRequest(text="alias is required")
+    graph = _misp_graph(request)
+    clusters = [{**c, "aliases": graph.aliases(c["uuid"])} for c in graph.resolve(alias)]
+    return web.json_response({"count": len(clusters), "results": clusters}, dumps=_dumps)
+
+async def handle_misp_related(request):
+    direction = request.query.get("direction", "both")
+    if direction not in DIRECTIONS:
+        raise web.HTTPBadRequest(text=f"direction must be one of {', '.join(DIRECTIONS)}")
+    try:
+        hops = min(int(request.query.get("hops", "1")), 6)
+    except ValueError:
+        raise web.HTTPBadRequest(text="hops must be an integer")
+    relations = [r for r in request.query.get("relations", "").split(",") if r] or None
+    graph = _misp_graph(request)
+    ref = request.match_info["ref"]
+    start = [graph.node(i) for i in graph.lookup(ref)]
+    if not start:
+        raise web.HTTPNotFound(text=f"unknown MISP cluster: {ref}")
+    related = graph.khop(ref, hops, direction, relations)
+    return web.json_response({"clusters": start, "count": len(related), "results": related}, dumps=_dumps)
+
+async def handle_invalidate(request):
+    svc = request.app["service"]
+    try:
+        body = await request.json()
+    except Exception:
+        raise web.HTTPBadRequest(text="body must be JSON")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text='expected {"feed": ..., "summary": {...}, "keys": [...]}')
+    feed = body.get("feed")
+    if not isinstance(feed, str) or feed not in FEED_TABLES:
+        raise web.HTTPBadRequest(text=f"unknown feed: {feed}")
+    summary, keys = body.get("summary") or {}, body.get("keys")
+    if not isinstance(summary, dict) or not (keys is None or isinstance(keys, list)):
+        raise web.HTTPBadRequest(text="summary must be an object and keys a list")
+    dropped = svc.reader.invalidate_from_summary(feed, summary, keys)
+    return web.json_response({"feed": feed, "dropped": dropped})
+
+async def handle_health(request):
+    svc = request.app["service"]
+    cache = svc.reader.cache
+    return web.json_response({
+        "status": "ok",
+        "cache_items": len(cache),
+        "cache_hits": cache.hits,
+        "cache_misses": cache.misses,
+        "batches_sent": {f: c.batches_sent for f, c in svc.coalescers.items()},
+    })
+
+def build_app(cfg: dict = None) -> web.Application:
+    cfg = cfg or LOOKUP_CONFIG
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+
+    async def on_startup(app):
+        app["service"] = LookupService(cfg)
+        try:
+            await app["service"].warm_up()
+        except Exception as e:
+            print(f"⚠️ CVE index warm-up failed (will retry on first request): {e}")
+
+    async def on_cleanup(app):
+        app["service"].close()
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/lookup", handle_lookup)
+    app.router.add_get("/cve/{cve_id}", handle_cve)
+    app.router.add_get("/top", handle_top)
+    app.router.add_get("/search", handle_search)
+    app.router.add_get("/misp/resolve", handle_misp_resolve)
+    app.router.add_get("/misp/related/{ref}", handle_misp_related)
+    app.router.add_post("/invalidate", handle_invalidate)
+    app.router.add_get("/health", handle_health)
+    return app
+
+def main():
+    print(f"🚀 Starting lookup service on http://{LOOKUP_CONFIG['HOST']}:{LOOKUP_CONFIG['PORT']}")
+    web.run_app(build_app(LOOKUP_CONFIG), host=LOOKUP_CONFIG["HOST"], port=LOOKUP_CONFIG["PORT"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# id_registry.py
+"""
+Persisted module_key -> META id registry for metasploit_db.
+
+The registry lives in S3 next to the baseline. It replaces the full
+`ProjectionExpression="id"` scan of metasploit_data that every run used to do.
+New ids are assigned from a per-year high-water mark, and the registry is saved
+before each write batch (write-ahead). A crash can therefore leave an id with
+no item, but never an item whose id could be handed out again.
+"""
+import re
+import json
+from typing import Dict, Optional
+
+META_ID_PREFIX = "META"
+META_ID_RE = re.compile(rf"^{META_ID_PREFIX}-(\d{{4}})-0*(\d+)$")
+REGISTRY_VERSION = 1
+
+class MetaIdRegistry:
+    def __init__(self, ids: Dict[str, str] = None, max_seq: Dict[int, int] = None):
+        self.ids = dict(ids or {})  # module_key -> META id
+        self.max_seq = {int(y): int(s) for y, s in (max_seq or {}).items()}
+        for mid in self.ids.values():
+            self._observe(mid)
+        self.dirty = False
+
+    def _observe(self, mid):
+        m = META_ID_RE.match(str(mid))
+        if not m:
+            return
+        y, seq = int(m.group(1)), int(m.group(2))
+        if seq > self.max_seq.get(y, 0):
+            self.max_seq[y] = seq
+
+    def get(self, module_key: str) -> Optional[str]:
+        return self.ids.get(module_key)
+
+    def assign(self, module_key: str, year: int) -> str:
+        """Existing id for module_key, or the next free id for year."""
+        mid = self.ids.get(module_key)
+        if mid:
+            return mid
+        seq = self.max_seq.get(year, 0) + 1
+        mid = f"{META_ID_PREFIX}-{year}-{str(seq).zfill(6)}"
+        self.max_seq[year] = seq
+        self.ids[module_key] = mid
+        self.dirty = True
+        return mid
+
+    def __len__(self):
+        return len(self.ids)
+
+    # ---------------- (de)serialization ----------------
+    def to_bytes(self) -> bytes:
+        doc = {
+            "version": REGISTRY_VERSION,
+            "max_seq": {str(y): s for y, s in sorted(self.max_seq.items())},
+            "ids": self.ids,
+        }
+        return json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def from_text(cls, text: str) -> "MetaIdRegistry":
+        doc = json.loads(text)
+        return cls(doc.get("ids"), doc.get("max_seq"))
+
+    @classmethod
+    def from_table_scan(cls, table, baseline_hashes: Dict[str, str] = None) -> "MetaIdRegistry":
+        """
+        Repair mode: rebuild the registry from a projected scan of the table (id, module_id, content_hash).
+        Ids with no module_id still count toward the per-year high-water mark.
+        If a module has several items, the one whose content_hash matches the baseline
+        (module_key -> content_hash) is kept, otherwise the newest (highest) id; the rest are reported.
+        """
+        baseline_hashes = baseline_hashes or {}
+        best = {}  # module_key -> (rank, id)
+        dupes = 0
+        reg = cls()
+        paginator = table.meta.client.get_paginator("scan")
+        for page in paginator.paginate(TableName=table.name, ProjectionExpression="id, module_id, content_hash"):
+            for it in page.get("Items", []):
+                mid = it.get("id")
+                if not mid:
+                    continue
+                mid = str(mid)
+                reg._observe(mid)
+                mk = it.get("module_id")
+                if not mk:
+                    continue
+                mk = str(mk)
+                base_hash = baseline_hashes.get(mk)
+                rank = (base_hash is not None and it.get("content_hash") == base_hash, _id_order(mid))
+                if mk in best:
+                    dupes += 1
+                    if rank <= best[mk][0]:
+                        continue
+                best[mk] = (rank, mid)
+        if dupes:
+            print(f"⚠️ Repair scan found {dupes} stale item(s) sharing a module_id; kept the baseline-matching "
+                  f"or newest id per module")
+        reg.ids = {mk: mid for mk, (_, mid) in best.items()}
+        reg.dirty = True
+        return reg
+
+def _id_order(mid: str):
+    """Sort key for META ids: (year, seq); ids that do not parse sort first."""
+    m = META_ID_RE.match(mid)
+    return (int(m.group(1)), int(m.group(2))) if m else (0, 0)
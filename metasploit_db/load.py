@@ -1,15 +1,23 @@
 # load_metasploit.py
 import os
 import re
+import sys
 import time
 import math
-import json
-import io
-import hashlib
 from decimal import Decimal, InvalidOperation
 from typing import List, Dict
-import boto3
-from botocore.exceptions import ClientError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.compression import compress_item, compression_settings
+from common.cve import find_cve
+from common.hashing import content_hash, record_hashes, resolve_algorithm, same_algorithm
+from common.aws import get_client, get_or_create_table, get_resource
+from common.ddb_io import item_io, progress_printer
+from common.changelog import INSERT, UPDATE, changed_fields, open_changelog
+from common.mirror import DEFAULT_MIRROR_DB, apply_run
+from common.profiling import profiled_entry
+from id_registry import MetaIdRegistry
+from s3_store import BaselineStore, S3TransferSettings, bytes_hash, s3_get_bytes_if_exists, s3_put_bytes
 
 # Config defaults (override via user_cfg)
 DEFAULT_CONFIG = {
@@ -19,15 +27,40 @@ DEFAULT_CONFIG = {
     "S3_BUCKET": None,
     "S3_PREFIX": "vuln-raw-source/metasploit/",
     "BASELINE_FILENAME": "metasploit_baseline.json",
+    "ID_REGISTRY_FILENAME": "metasploit_id_registry.json",
+    "ID_REGISTRY_REPAIR": False,  # True: rebuild the registry from a full table scan
+    "WRITE_CHUNK_SIZE": 500,  # registry is checkpointed before each chunk is written
     "CANONICAL_FILENAME": "metasploit.json",
+    # compressed, delta-based S3 storage (see s3_store.py); BASELINE_FILENAME is only read for migration
+    "MANIFEST_FILENAME": "metasploit_manifest.json",
+    "S3_CODEC": "gzip",  # "gzip" or "zstd"
+    "COMPACT_AFTER_DELTAS": 7,
+    "COMPACT_DELTA_RATIO": 0.2,
+    # S3 transfer: multipart uploads above the threshold, ranged parallel GETs above S3_RANGE_MB
+    "S3_MULTIPART_THRESHOLD_MB": 16,
+    "S3_MULTIPART_CHUNK_MB": 8,
+    "S3_RANGE_MB": 8,
+    "S3_MAX_CONCURRENCY": 8,
     "BATCH_PROGRESS_INTERVAL": 100,
     "AWS_ACCESS_KEY_ID": None,
     "AWS_SECRET_ACCESS_KEY": None,
+    "MAX_POOL_CONNECTIONS": 32,  # botocore pool size (default would be 10)
+    "DDB_BACKEND": os.getenv("METASPLOIT_DDB_BACKEND"),  # "sync" | "async" (aiobotocore); None -> DDB_BACKEND env
+    "DDB_ASYNC_CONCURRENCY": 64,  # in-flight batch requests with the async backend
+    # opt-in: large text attributes stored as compressed Binary (empty list = disabled)
+    "COMPRESS_FIELDS": [],  # e.g. ["description", "references"]
+    "COMPRESS_CODEC": "zlib",  # "zlib" or "zstd"
+    "COMPRESS_MIN_BYTES": 512,
+    # content hash for change detection: "blake2b", "xxh3" (needs xxhash) or "sha256"
+    "HASH_ALGORITHM": "blake2b",
+    # local change log (NDJSON segments) of each run's inserts/updates; None/"" -> off (metasploit_main enables it)
+    "CHANGELOG_DIR": os.getenv("METASPLOIT_CHANGELOG_DIR"),
+    "CHANGELOG_SEGMENT_MB": 64,
+    "CHANGELOG_INCLUDE_ITEMS": False,
+    # local SQLite query mirror updated with each run's written rows (common/mirror.py); "" -> off
+    "MIRROR_DB": DEFAULT_MIRROR_DB,
 }
 
-META_ID_PREFIX = "META"
-CVE_RE = re.compile(r"(CVE-\d{4}-\d{4,7})", re.IGNORECASE)
-
 # ---------------- utils ----------------
 def _resolve_config(user_cfg: Dict) -> Dict:
     cfg = DEFAULT_CONFIG.copy()
@@ -37,29 +70,11 @@ def _resolve_config(user_cfg: Dict) -> Dict:
         cfg["S3_PREFIX"] = cfg["S3_PREFIX"] + "/"
     return cfg
 
-def _clean_for_hash(v) -> str:
-    """Canonicalize a field value for hashing: None -> '', collapse whitespace, strip."""
-    if v is None:
-        return ""
-    s = str(v)
-    s = s.replace("\r", " ").replace("\n", " ")
-    # collapse whitespace
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
-
-def _compute_content_hash_for_record(rec: Dict, canonical_fields: List[str]) -> str:
-    pieces = []
-    for f in canonical_fields:
-        pieces.append(_clean_for_hash(rec.get(f)))
-    data = "|".join(pieces)
-    h = hashlib.sha256(data.encode("utf-8")).hexdigest()
-    return h
+def _compute_content_hash_for_record(rec: Dict, canonical_fields: List[str], algorithm: str = "sha256") -> str:
+    return content_hash(rec, canonical_fields, algorithm)
 
 def _extract_cve(refs):
-    if not refs:
-        return None
-    m = CVE_RE.search(str(refs))
-    return m.group(1).upper() if m else None
+    return find_cve(refs)
 
 def _normalize_for_ddb(v):
     """Convert values to types safe for DynamoDB (Decimal for numbers)."""
@@ -95,35 +110,38 @@ def _normalize_for_ddb(v):
         return None
 
 # ---------------- S3 helpers ----------------
-def _s3_put_bytes(s3_client, bucket: str, key: str, data: bytes):
-    s3_client.put_object(Bucket=bucket, Key=key, Body=data)
+def _s3_put_bytes(s3_client, bucket: str, key: str, data: bytes, transfer: S3TransferSettings = None):
+    s3_put_bytes(s3_client, bucket, key, data, transfer)
 
-def _s3_get_text_if_exists(s3_client, bucket: str, key: str):
-    try:
-        res = s3_client.get_object(Bucket=bucket, Key=key)
-        return res["Body"].read().decode("utf-8")
-    except ClientError as e:
-        code = e.response.get("Error", {}).get("Code", "")
-        if code in ("NoSuchKey", "404", "NoSuchBucket", "NoSuchKey"):
-            return None
-        raise
+def _s3_get_text_if_exists(s3_client, bucket: str, key: str, transfer: S3TransferSettings = None):
+    data = s3_get_bytes_if_exists(s3_client, bucket, key, transfer)
+    return data.decode("utf-8") if data is not None else None
 
-# ---------------- meta-id helpers ----------------
-def _next_meta_id_for_year(existing_ids_set, year: int) -> str:
-    max_seq = 0
-    for mid in existing_ids_set:
-        m = re.match(rf"^{META_ID_PREFIX}-(\d{{4}})-0*(\d+)$", str(mid))
-        if not m:
-            continue
-        try:
-            y = int(m.group(1)); seq = int(m.group(2))
-        except Exception:
-            continue
-        if y == year and seq > max_seq:
-            max_seq = seq
-    return f"{META_ID_PREFIX}-{year}-{str(max_seq + 1).zfill(6)}"
+# ---------------- meta-id registry ----------------
+def _load_id_registry(s3_client, bucket: str, key: str, table, baseline_map: Dict, repair: bool,
+                      transfer: S3TransferSettings = None) -> MetaIdRegistry:
+    """
+    Load the module_key -> META id registry from S3. The table is scanned only in
+    repair mode, or once to bootstrap when a baseline exists but no registry was ever saved.
+    """
+    if not repair:
+        text = _s3_get_text_if_exists(s3_client, bucket, key, transfer)
+        if text:
+            registry = MetaIdRegistry.from_text(text)
+            print(f"ℹ️ Id registry loaded with {len(registry)} modules")
+            return registry
+        if not baseline_map:
+            print("ℹ️ No id registry found (first run)")
+            return MetaIdRegistry()
+        print("⚠️ Baseline exists but no id registry; bootstrapping from a one-time table scan")
+    else:
+        print("🔧 Repair mode: rebuilding id registry from a table scan")
+    registry = MetaIdRegistry.from_table_scan(table, {mk: b.get("content_hash") for mk, b in baseline_map.items()})
+    print(f"ℹ️ Id registry rebuilt with {len(registry)} modules")
+    return registry
 
 # ---------------- main function ----------------
+@profiled_entry("metasploit", "load")
 def sync_records_to_dynamodb_and_store_baseline(records: List[Dict], json_bytes: bytes, user_cfg: Dict) -> Dict:
     """
     records: list of normalized dicts (each must include 'module_key' and canonical fields)
@@ -133,40 +151,34 @@ def sync_records_to_dynamodb_and_store_baseline(records: List[Dict], json_bytes:
     cfg = _resolve_config(user_cfg)
     s3_bucket = cfg["S3_BUCKET"]
     s3_prefix = cfg["S3_PREFIX"]
-    baseline_key = f"{s3_prefix}{cfg['BASELINE_FILENAME']}"
-    canonical_key = f"{s3_prefix}{cfg['CANONICAL_FILENAME']}"
+    registry_key = f"{s3_prefix}{cfg['ID_REGISTRY_FILENAME']}"
 
     if not s3_bucket:
         raise RuntimeError("S3_BUCKET must be set in config/env")
 
-    # boto3 clients
-    s3 = boto3.client(
+    # shared, cached clients; the S3 pool covers the transfer manager's concurrent parts
+    s3 = get_client(
         "s3",
         aws_access_key_id=cfg.get("AWS_ACCESS_KEY_ID"),
         aws_secret_access_key=cfg.get("AWS_SECRET_ACCESS_KEY"),
-        region_name=cfg.get("AWS_REGION")
+        region_name=cfg.get("AWS_REGION"),
+        pool_size=max(int(cfg.get("S3_MAX_CONCURRENCY") or 8) + 2, int(cfg.get("MAX_POOL_CONNECTIONS") or 0))
     )
-    ddb = boto3.resource(
+    ddb = get_resource(
         "dynamodb",
         aws_access_key_id=cfg.get("AWS_ACCESS_KEY_ID"),
         aws_secret_access_key=cfg.get("AWS_SECRET_ACCESS_KEY"),
         region_name=cfg.get("AWS_REGION"),
-        endpoint_url=cfg.get("DDB_ENDPOINT")
+        endpoint_url=cfg.get("DDB_ENDPOINT"),
+        pool_size=cfg.get("MAX_POOL_CONNECTIONS")
     )
 
-    # Upload canonical JSON to S3 (overwrite)
-    if json_bytes:
-        print(f"⬆️ Uploading transformed JSON to s3://{s3_bucket}/{canonical_key}")
-        _s3_put_bytes(s3, s3_bucket, canonical_key, json_bytes)
-        print("✅ Canonical JSON upload complete")
-
-    # Load baseline JSON from S3 (if exists)
-    print(f"🔁 Fetching baseline from s3://{s3_bucket}/{baseline_key}")
-    baseline_text = _s3_get_text_if_exists(s3, s3_bucket, baseline_key)
+    # Load baseline from S3 (manifest snapshot + deltas, or the legacy baseline JSON)
+    store = BaselineStore(s3, s3_bucket, s3_prefix, cfg)
     baseline_map = {}  # module_key -> baseline dict
-    if baseline_text:
+    baseline_list = store.load_baseline()
+    if baseline_list:
         try:
-            baseline_list = json.loads(baseline_text)
             for b in baseline_list:
                 mk = b.get("module_key")
                 if mk:
@@ -178,32 +190,13 @@ def sync_records_to_dynamodb_and_store_baseline(records: List[Dict], json_bytes:
     else:
         print("ℹ️ No baseline found (first run)")
 
-    # Ensure DDB table exists (create if missing)
+    # Ensure DDB table exists (create if missing; checked once per process)
     table_name = cfg["TABLE_NAME"]
-    existing_tables = ddb.meta.client.list_tables().get("TableNames", [])
-    if table_name not in existing_tables:
-        print(f"⚡ Creating DynamoDB table '{table_name}'...")
-        t = ddb.create_table(
-            TableName=table_name,
-            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
-            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
-            ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5}
-        )
-        t.meta.client.get_waiter("table_exists").wait(TableName=table_name)
-        print("✅ Table created.")
-    table = ddb.Table(table_name)
+    table = get_or_create_table(ddb, table_name, "id")
 
-    # scan existing ids from DDB to avoid META id collisions
-    existing_generated_ids = set()
-    try:
-        paginator = table.meta.client.get_paginator("scan")
-        for page in paginator.paginate(TableName=table_name, ProjectionExpression="id"):
-            for it in page.get("Items", []):
-                if "id" in it:
-                    existing_generated_ids.add(it["id"])
-    except Exception:
-        # ignore scan errors (e.g., empty table)
-        pass
+    # module_key -> META id registry (no table reads unless repairing)
+    registry = _load_id_registry(s3, s3_bucket, registry_key, table, baseline_map,
+                                 bool(cfg.get("ID_REGISTRY_REPAIR")), store.transfer)
 
     # canonical fields: determine from records (exclude generated fields)
     if records:
@@ -216,16 +209,21 @@ def sync_records_to_dynamodb_and_store_baseline(records: List[Dict], json_bytes:
     else:
         canonical_fields = []
 
-    # Build current_map (module_key -> record) and compute content_hash
+    # Build current_map (module_key -> record) and compute content_hash in one batch
+    hash_algorithm = resolve_algorithm(cfg.get("HASH_ALGORITHM"))
+    keyed = [rec for rec in records if rec.get("module_key")]
+    hashes = record_hashes(keyed, canonical_fields, hash_algorithm) if canonical_fields else [""] * len(keyed)
     current_map = {}
-    for rec in records:
-        mk = rec.get("module_key")
-        if not mk:
-            continue
-        # compute content_hash (based on canonical_fields)
-        rec_hash = _compute_content_hash_for_record(rec, canonical_fields) if canonical_fields else ""
+    for rec, rec_hash in zip(keyed, hashes):
         rec["content_hash"] = rec_hash
-        current_map[str(mk)] = rec
+        current_map[str(rec["module_key"])] = rec
+
+    # Upload canonical JSON to S3 unless its content (module keys + hashes) is unchanged
+    if json_bytes:
+        content_key = bytes_hash("\n".join(f"{mk}\t{current_map[mk]['content_hash']}"
+                                           for mk in sorted(current_map)).encode("utf-8"))
+        if store.put_canonical(json_bytes, content_key):
+            print("✅ Canonical JSON upload complete")
 
     # Determine changed keys by comparing content_hash (fast)
     changed_keys = []
@@ -235,9 +233,9 @@ def sync_records_to_dynamodb_and_store_baseline(records: List[Dict], json_bytes:
             changed_keys.append(mk)
             continue
         base_hash = base.get("content_hash")
-        # if baseline doesn't have content_hash, compute it from baseline entry using same canonical_fields
-        if not base_hash:
-            base_hash = _compute_content_hash_for_record(base, canonical_fields) if canonical_fields else ""
+        # if baseline has no content_hash, or one from another algorithm, recompute it from the baseline entry
+        if canonical_fields and not same_algorithm(base_hash, hash_algorithm):
+            base_hash = _compute_content_hash_for_record(base, canonical_fields, hash_algorithm)
         if rec.get("content_hash") != base_hash:
             changed_keys.append(mk)
 
@@ -263,70 +261,104 @@ def sync_records_to_dynamodb_and_store_baseline(records: List[Dict], json_bytes:
                 year = None
         if year is None:
             year = int(time.strftime("%Y"))
-        # reuse baseline id if present
-        baseline_entry = baseline_map.get(mk, {}) or {}
-        existing_id = baseline_entry.get("id")
-        if existing_id and existing_id in existing_generated_ids:
-            gen_id = existing_id
-        else:
-            gen_id = _next_meta_id_for_year(existing_generated_ids, year)
-            existing_generated_ids.add(gen_id)
-        rec["id"] = gen_id
+        # id is assigned when the item's write chunk is checkpointed (see below)
         rec["module_id"] = mk
         rec["content_hash"] = rec.get("content_hash")
         rec["uploaded_date"] = rec.get("uploaded_date") or time.strftime("%Y-%m-%d")
+        rec["_year"] = year
         to_write.append(rec)
 
     # Batch write with safe conversion
+    compress_fields, compress_codec, compress_min = compression_settings(cfg)
     uploaded = []
+    chunk_size = max(1, int(cfg.get("WRITE_CHUNK_SIZE") or 500))
     if to_write:
-        print(f"⬆️ Writing {len(to_write)} items to DynamoDB...")
-        with table.batch_writer() as batch:
-            cnt = 0
-            for item in to_write:
-                safe_item = {}
-                for k, v in item.items():
-                    safe_item[k] = _normalize_for_ddb(v)
-                try:
-                    batch.put_item(Item=safe_item)
-                    uploaded.append(safe_item.get("id"))
-                except Exception as e:
-                    print(f"❌ Failed to write id={safe_item.get('id')}: {e}")
-                cnt += 1
-                if cnt % cfg.get("BATCH_PROGRESS_INTERVAL", 100) == 0 or cnt == len(to_write):
-                    print(f"⬆️ Batch wrote {cnt}/{len(to_write)}")
+        ddb_io = item_io(table, "id", cfg.get("DDB_BACKEND"), cfg.get("DDB_ASYNC_CONCURRENCY"))
+        print(f"⬆️ Writing {len(to_write)} items to DynamoDB ({ddb_io.name} backend)...")
+        progress = progress_printer(cfg.get("BATCH_PROGRESS_INTERVAL", 100), len(to_write), "⬆️ Batch wrote {}/{}")
+        cnt = 0
+        for start in range(0, len(to_write), chunk_size):
+            chunk = to_write[start:start + chunk_size]
+            # assign ids and persist the registry before the chunk is written (write-ahead)
+            for item in chunk:
+                item["id"] = registry.assign(item["module_id"], item.pop("_year"))
+            if registry.dirty:
+                _s3_put_bytes(s3, s3_bucket, registry_key, registry.to_bytes(), store.transfer)
+                registry.dirty = False
+            safe_chunk = [compress_item({k: _normalize_for_ddb(v) for k, v in item.items()},
+                                        compress_fields, compress_codec, compress_min) for item in chunk]
+            ddb_io.put_many(safe_chunk, lambda n, base=cnt: progress(base + n), uploaded.extend)
+            cnt += len(chunk)
         print(f"✅ Uploaded {len(uploaded)} items")
     else:
         print("ℹ️ Nothing to write to DynamoDB.")
+    if registry.dirty:
+        # repair/bootstrap rebuilt the registry but nothing needed writing
+        _s3_put_bytes(s3, s3_bucket, registry_key, registry.to_bytes(), store.transfer)
+        registry.dirty = False
+
+    # Change log keyed by module_key, for the modules whose write succeeded
+    changelog = open_changelog(cfg.get("CHANGELOG_DIR"), "metasploit", cfg)
+    if changelog:
+        written_ids = set(uploaded)
+        meta_fields = ("uploaded_date", "id", "module_id", "cve_id", "content_hash")
+        for item in to_write:
+            mk = item["module_id"]
+            if item.get("id") not in written_ids:
+                continue
+            base = baseline_map.get(mk)
+            if base is None:
+                changelog.append(INSERT, mk, item.get("content_hash"), item=item)
+            else:
+                changelog.append(UPDATE, mk, item.get("content_hash"), changed_fields(base, current_map[mk], meta_fields),
+                                 item=item)
+        changelog.commit({"uploaded": len(uploaded), "total_current": len(current_map)})
 
-    # Merge baseline_map and current_map; ensure content_hash included and baseline stores module_key
+    # Local query mirror: the rows written this run, applied in one SQLite transaction
+    mirror_rows = apply_run(cfg.get("MIRROR_DB"), "metasploit", to_write, uploaded, changelog)
+
+    # Merge baseline_map and current_map; only entries that differ from the baseline go into the delta
     merged = baseline_map.copy()
+    delta = []
+    changed_set = set(changed_keys)
     for mk, rec in current_map.items():
-        # prefer baseline id if present
-        base_entry = baseline_map.get(mk, {}) or {}
-        merged_entry = dict(rec)  # contains content_hash
-        if not merged_entry.get("id") and base_entry.get("id"):
-            merged_entry["id"] = base_entry.get("id")
+        base_entry = baseline_map.get(mk)
+        rec_id = registry.get(mk) or rec.get("id") or (base_entry or {}).get("id")
+        if base_entry is not None and mk not in changed_set:
+            # unchanged content: keep the baseline entry, refreshing id / hash if they moved
+            if base_entry.get("id") == rec_id and base_entry.get("content_hash") == rec.get("content_hash"):
+                continue
+            merged_entry = dict(base_entry)
+            merged_entry["content_hash"] = rec.get("content_hash")
+        else:
+            merged_entry = dict(rec)  # contains content_hash
+            # ensure cve_id present
+            if not merged_entry.get("cve_id"):
+                merged_entry["cve_id"] = _extract_cve(merged_entry.get("references"))
+        merged_entry["id"] = rec_id
         merged_entry["module_key"] = mk
-        # ensure cve_id present
-        if not merged_entry.get("cve_id"):
-            merged_entry["cve_id"] = _extract_cve(merged_entry.get("references"))
         merged[mk] = merged_entry
+        delta.append(merged_entry)
 
-    baseline_list = list(merged.values())
-    baseline_bytes = json.dumps(baseline_list, ensure_ascii=False, indent=2).encode("utf-8")
-
-    # Upload baseline to S3 (overwrite)
-    print(f"⬆️ Uploading baseline JSON to s3://{s3_bucket}/{baseline_key}")
-    _s3_put_bytes(s3, s3_bucket, baseline_key, baseline_bytes)
-    print("✅ Baseline upload complete")
+    baseline_write = store.save_baseline(merged, delta)
+    store.flush()
+    if baseline_write != "skipped":
+        print(f"✅ Baseline {baseline_write} upload complete")
 
     summary = {
         "uploaded": len(uploaded),
         "changed_keys": len(changed_keys),
         "total_current": len(current_map),
-        "s3_canonical": f"s3://{s3_bucket}/{canonical_key}",
-        "s3_baseline": f"s3://{s3_bucket}/{baseline_key}"
+        "id_registry_size": len(registry),
+        "baseline_write": baseline_write,
+        "baseline_delta": len(delta),
+        "changelog_entries": changelog.count if changelog else 0,
+        "mirror_rows": mirror_rows,
+        "s3_bytes_uploaded": store.bytes_uploaded,
+        "s3_puts": store.puts,
+        "s3_canonical": f"s3://{s3_bucket}/{store.canonical_key}",
+        "s3_manifest": f"s3://{s3_bucket}/{store.manifest_key}",
+        "s3_id_registry": f"s3://{s3_bucket}/{registry_key}"
     }
     print("ℹ️ Sync summary:", summary)
     return summary
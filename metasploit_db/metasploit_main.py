@@ -1,5 +1,6 @@
 # metasploit_main.py
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -7,7 +8,10 @@ load_dotenv()
 from extract import download_raw_json_to_text
 from transform import transform_json_text_to_records_and_json_bytes
 from load import sync_records_to_dynamodb_and_store_baseline
+from common.parallel import resolve_workers
+from common.profiling import Profiler
 
+DAILY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "daily_extract")
 RAW_JSON_URL = "https://raw.githubusercontent.com/rapid7/metasploit-framework/master/db/modules_metadata_base.json"
 
 METASPLOIT_CONFIG = {
@@ -18,9 +22,26 @@ METASPLOIT_CONFIG = {
     "S3_PREFIX": os.getenv("S3_PREFIX", "vuln-raw-source/metasploit/"),
     "BASELINE_FILENAME": os.getenv("BASELINE_FILENAME", "metasploit_baseline.json"),
     "CANONICAL_FILENAME": os.getenv("CANONICAL_FILENAME", "metasploit.json"),
+    "MANIFEST_FILENAME": os.getenv("MANIFEST_FILENAME", "metasploit_manifest.json"),
+    "S3_CODEC": os.getenv("METASPLOIT_S3_CODEC", "gzip"),
+    "COMPACT_AFTER_DELTAS": int(os.getenv("COMPACT_AFTER_DELTAS", "7")),
+    "COMPACT_DELTA_RATIO": float(os.getenv("COMPACT_DELTA_RATIO", "0.2")),
+    "S3_MULTIPART_THRESHOLD_MB": float(os.getenv("S3_MULTIPART_THRESHOLD_MB", "16")),
+    "S3_MULTIPART_CHUNK_MB": float(os.getenv("S3_MULTIPART_CHUNK_MB", "8")),
+    "S3_RANGE_MB": float(os.getenv("S3_RANGE_MB", "8")),
+    "S3_MAX_CONCURRENCY": int(os.getenv("S3_MAX_CONCURRENCY", "8")),
+    "ID_REGISTRY_FILENAME": os.getenv("ID_REGISTRY_FILENAME", "metasploit_id_registry.json"),
+    "CHANGELOG_DIR": os.getenv("METASPLOIT_CHANGELOG_DIR", os.path.join(DAILY_DIR, "changelog")),
+    "ID_REGISTRY_REPAIR": os.getenv("ID_REGISTRY_REPAIR", "").lower() in {"1", "true", "yes"} or "--repair-ids" in sys.argv,
     "AWS_ACCESS_KEY_ID": os.getenv("AWS_ACCESS_KEY_ID"),
     "AWS_SECRET_ACCESS_KEY": os.getenv("AWS_SECRET_ACCESS_KEY"),
-    "BATCH_PROGRESS_INTERVAL": int(os.getenv("BATCH_PROGRESS_INTERVAL", "100"))
+    "MAX_POOL_CONNECTIONS": int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "32")),
+    "BATCH_PROGRESS_INTERVAL": int(os.getenv("BATCH_PROGRESS_INTERVAL", "100")),
+    "TRANSFORM_WORKERS": resolve_workers(os.getenv("METASPLOIT_TRANSFORM_WORKERS", "1")),
+    "COMPRESS_FIELDS": os.getenv("METASPLOIT_COMPRESS_FIELDS", ""),
+    "COMPRESS_CODEC": os.getenv("COMPRESS_CODEC", "zlib"),
+    "COMPRESS_MIN_BYTES": int(os.getenv("COMPRESS_MIN_BYTES", "512")),
+    "HASH_ALGORITHM": os.getenv("HASH_ALGORITHM", "blake2b")
 }
 
 def main():
@@ -28,9 +49,16 @@ def main():
     if not METASPLOIT_CONFIG["S3_BUCKET"]:
         raise RuntimeError("S3_BUCKET must be set in environment or .env")
 
-    raw_text = download_raw_json_to_text(RAW_JSON_URL)
-    records, json_bytes = transform_json_text_to_records_and_json_bytes(raw_text)
-    summary = sync_records_to_dynamodb_and_store_baseline(records, json_bytes, METASPLOIT_CONFIG)
+    # profiling: PIPELINE_PROFILE=cprofile|sample or --profile[=sample]; artifacts go to daily_extract/
+    prof = Profiler.from_env("metasploit", DAILY_DIR)
+
+    with prof.stage("extract"):
+        raw_text = download_raw_json_to_text(RAW_JSON_URL)
+    with prof.stage("transform"):
+        records, json_bytes = transform_json_text_to_records_and_json_bytes(
+            raw_text, workers=METASPLOIT_CONFIG["TRANSFORM_WORKERS"])
+    with prof.stage("load"):
+        summary = sync_records_to_dynamodb_and_store_baseline(records, json_bytes, METASPLOIT_CONFIG)
     print("✅ ETL finished.")
     return summary
 
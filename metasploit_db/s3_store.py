@@ -0,0 +1,292 @@
+# s3_store.py
+"""
+Compressed, delta-based S3 storage for the Metasploit baseline and canonical JSON.
+
+Layout under S3_PREFIX:
+    metasploit_manifest.json            pointer to everything below (written last)
+    metasploit.json.gz                  canonical transformed JSON (compact, compressed)
+    baseline/snapshot-<gen>.ndjson.gz   full baseline
+    baseline/delta-<gen>.ndjson.gz      baseline entries upserted by one run
+
+A baseline is the snapshot with its deltas applied in order. Deltas are folded
+into a new snapshot after COMPACT_AFTER_DELTAS runs, or once they hold more than
+COMPACT_DELTA_RATIO of the snapshot's entries. Uploads whose content hash matches
+the manifest are skipped, so a run with no changes writes nothing.
+
+Snapshots and deltas are NDJSON (one entry per line) and are parsed line by line
+from the decompressing response stream. Uploads go through the boto3 transfer
+manager (multipart above S3_MULTIPART_THRESHOLD_MB); objects larger than
+S3_RANGE_MB are downloaded as concurrent ranged GETs.
+"""
+import io
+import gzip
+import json
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+MANIFEST_VERSION = 1
+OBJECT_CODECS = {"gzip": ".gz", "zstd": ".zst"}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 10
+MB = 1024 * 1024
+
+# ---------------- S3 helpers ----------------
+class S3TransferSettings:
+    """Multipart upload and ranged download settings (S3_* config keys)."""
+    def __init__(self, cfg: Dict = None):
+        cfg = cfg or {}
+        threshold = int(float(cfg.get("S3_MULTIPART_THRESHOLD_MB") or 16) * MB)
+        chunk = int(float(cfg.get("S3_MULTIPART_CHUNK_MB") or 8) * MB)
+        self.concurrency = max(1, int(cfg.get("S3_MAX_CONCURRENCY") or 8))
+        self.config = TransferConfig(multipart_threshold=threshold, multipart_chunksize=chunk,
+                                     max_concurrency=self.concurrency, use_threads=self.concurrency > 1)
+        self.range_bytes = max(1, int(float(cfg.get("S3_RANGE_MB") or 8) * MB))
+
+DEFAULT_TRANSFER = S3TransferSettings()
+
+def s3_put_bytes(s3_client, bucket: str, key: str, data: bytes, transfer: S3TransferSettings = None, **extra):
+    """Upload via the transfer manager: one PUT below the threshold, concurrent multipart above it."""
+    transfer = transfer or DEFAULT_TRANSFER
+    s3_client.upload_fileobj(io.BytesIO(data), bucket, key, ExtraArgs=extra or None, Config=transfer.config)
+
+def _is_missing(e: ClientError) -> bool:
+    return e.response.get("Error", {}).get("Code", "") in ("NoSuchKey", "404", "NoSuchBucket")
+
+def s3_open_if_exists(s3_client, bucket: str, key: str, transfer: S3TransferSettings = None):
+    """
+    Binary file-like object for key, or None if missing. The first GET asks for one
+    range; if the object fits, its body is returned as a stream. Otherwise the
+    remaining ranges are fetched concurrently and returned as one buffer.
+    """
+    transfer = transfer or DEFAULT_TRANSFER
+    step = transfer.range_bytes
+    try:
+        res = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes=0-{step - 1}")
+    except ClientError as e:
+        if _is_missing(e):
+            return None
+        if e.response.get("Error", {}).get("Code", "") == "InvalidRange":  # empty object
+            return io.BytesIO(b"")
+        raise
+    content_range = res.get("ContentRange")  # "bytes 0-N/TOTAL", absent if Range was ignored
+    total = int(content_range.rsplit("/", 1)[1]) if content_range else None
+    if total is None or total <= step:
+        return res["Body"]
+
+    def fetch(start):
+        end = min(start + step, total) - 1
+        part = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")
+        return part["Body"].read()
+
+    starts = range(step, total, step)
+    with ThreadPoolExecutor(max_workers=min(transfer.concurrency, len(starts))) as pool:
+        rest = list(pool.map(fetch, starts))
+    buf = bytearray(res["Body"].read())
+    for part in rest:
+        buf += part
+    if len(buf) != total:
+        raise IOError(f"Ranged download of s3://{bucket}/{key} returned {len(buf)} of {total} bytes")
+    return io.BytesIO(bytes(buf))
+
+def s3_get_bytes_if_exists(s3_client, bucket: str, key: str, transfer: S3TransferSettings = None) -> Optional[bytes]:
+    fp = s3_open_if_exists(s3_client, bucket, key, transfer)
+    return fp.read() if fp is not None else None
+
+def s3_delete_keys(s3_client, bucket: str, keys: List[str]):
+    for i in range(0, len(keys), 1000):
+        objs = [{"Key": k} for k in keys[i:i + 1000]]
+        s3_client.delete_objects(Bucket=bucket, Delete={"Objects": objs, "Quiet": True})
+
+# ---------------- codecs ----------------
+def resolve_object_codec(name: str) -> str:
+    name = (name or "gzip").lower()
+    if name not in OBJECT_CODECS:
+        raise ValueError(f"Unknown S3 object codec: {name}")
+    if name == "zstd" and zstandard is None:
+        print("⚠️ zstandard not installed; falling back to gzip S3 objects")
+        return "gzip"
+    return name
+
+def encode_object(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    # mtime=0 keeps the output (and its hash) stable for identical input
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+def decode_stream(fp, codec: Optional[str]):
+    """Wrap a binary stream so reads return decompressed bytes."""
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstd-compressed S3 object found but zstandard is not installed")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(fp))
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=fp, mode="rb")
+    return fp
+
+def iter_ndjson(fp) -> Iterator[Dict]:
+    """Entries of a decompressed NDJSON stream (see decode_stream), one line at a time."""
+    for line in fp:
+        if line.strip():
+            yield json.loads(line)
+
+def dumps_compact(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def dumps_ndjson(entries) -> bytes:
+    return b"".join(dumps_compact(e) + b"\n" for e in entries)
+
+def bytes_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# ---------------- store ----------------
+class BaselineStore:
+    def __init__(self, s3_client, bucket: str, prefix: str, cfg: Dict):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.codec = resolve_object_codec(cfg.get("S3_CODEC"))
+        self.ext = OBJECT_CODECS[self.codec]
+        self.manifest_key = f"{prefix}{cfg.get('MANIFEST_FILENAME') or 'metasploit_manifest.json'}"
+        self.canonical_key = f"{prefix}{cfg.get('CANONICAL_FILENAME') or 'metasploit.json'}{self.ext}"
+        self.legacy_baseline_key = f"{prefix}{cfg.get('BASELINE_FILENAME') or 'metasploit_baseline.json'}"
+        self.compact_after = int(cfg.get("COMPACT_AFTER_DELTAS") or 7)
+        self.compact_ratio = float(cfg.get("COMPACT_DELTA_RATIO") or 0.2)
+        self.transfer = S3TransferSettings(cfg)
+        self.bytes_uploaded = 0
+        self.puts = 0
+        self.manifest = None
+        self._manifest_dirty = False
+
+    def _put(self, key: str, data: bytes, content_type: str = "application/json", encoded: bool = True):
+        extra = {"ContentType": content_type}
+        if encoded and self.codec == "gzip":
+            extra["ContentEncoding"] = "gzip"
+        s3_put_bytes(self.s3, self.bucket, key, data, self.transfer, **extra)
+        self.bytes_uploaded += len(data)
+        self.puts += 1
+
+    def _open(self, key: str, codec: Optional[str]):
+        fp = s3_open_if_exists(self.s3, self.bucket, key, self.transfer)
+        return decode_stream(fp, codec) if fp is not None else None
+
+    def _get_json(self, key: str, codec: Optional[str]):
+        fp = self._open(key, codec)
+        return json.load(fp) if fp is not None else None
+
+    def _iter_part(self, part: Dict) -> Iterator[Dict]:
+        fp = self._open(part["key"], part.get("codec"))
+        if fp is None:
+            raise RuntimeError(f"Manifest points at missing object s3://{self.bucket}/{part['key']}")
+        if part.get("format") == "ndjson":
+            return iter_ndjson(fp)
+        return iter(json.load(fp))  # parts written before NDJSON
+
+    def load_manifest(self) -> Dict:
+        if self.manifest is None:
+            self.manifest = self._get_json(self.manifest_key, None) or {}
+        return self.manifest
+
+    # ---------------- canonical ----------------
+    def put_canonical(self, json_bytes: bytes, content_key: str) -> bool:
+        """
+        Upload the canonical JSON unless content_key (a hash of the records' content)
+        matches the manifest. Returns True when uploaded.
+        """
+        manifest = self.load_manifest()
+        prev = manifest.get("canonical") or {}
+        if prev.get("content_key") == content_key and prev.get("key") == self.canonical_key:
+            print("ℹ️ Canonical JSON unchanged; upload skipped")
+            return False
+        body = encode_object(json_bytes, self.codec)
+        print(f"⬆️ Uploading transformed JSON to s3://{self.bucket}/{self.canonical_key} "
+              f"({len(json_bytes)} -> {len(body)} bytes)")
+        self._put(self.canonical_key, body)
+        manifest["canonical"] = {"key": self.canonical_key, "codec": self.codec,
+                                 "content_key": content_key, "bytes": len(body)}
+        self._manifest_dirty = True
+        return True
+
+    # ---------------- baseline ----------------
+    def load_baseline(self) -> Optional[List[Dict]]:
+        """Baseline entries (snapshot + deltas), falling back to the legacy uncompressed baseline."""
+        manifest = self.load_manifest()
+        snap = manifest.get("snapshot")
+        if not snap:
+            print(f"🔁 No manifest; fetching legacy baseline from s3://{self.bucket}/{self.legacy_baseline_key}")
+            return self._get_json(self.legacy_baseline_key, None)
+        print(f"🔁 Fetching baseline snapshot + {len(manifest.get('deltas', []))} delta(s)")
+        entries = {}
+        for part in [snap] + list(manifest.get("deltas", [])):
+            for e in self._iter_part(part):
+                entries[e.get("module_key")] = e
+        return list(entries.values())
+
+    def _due_for_compaction(self, n_delta: int) -> bool:
+        manifest = self.manifest
+        snap = manifest.get("snapshot")
+        if not snap:
+            return True
+        deltas = manifest.get("deltas", [])
+        if len(deltas) + 1 > self.compact_after:
+            return True
+        pending = sum(d.get("count", 0) for d in deltas) + n_delta
+        return pending > self.compact_ratio * max(1, snap.get("count", 0))
+
+    def save_baseline(self, merged: Dict[str, Dict], delta: List[Dict]) -> str:
+        """
+        Persist the run's baseline changes: nothing, a delta object, or a compacted snapshot.
+        Returns "skipped", "delta" or "snapshot".
+        """
+        manifest = self.load_manifest()
+        if not delta and manifest.get("snapshot"):
+            print("ℹ️ Baseline unchanged; upload skipped")
+            return "skipped"
+        gen = int(manifest.get("generation", 0)) + 1
+        stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        stale = []
+        if self._due_for_compaction(len(delta)):
+            key = f"{self.prefix}baseline/snapshot-{gen:06d}-{stamp}.ndjson{self.ext}"
+            body = encode_object(dumps_ndjson(merged.values()), self.codec)
+            print(f"⬆️ Uploading baseline snapshot ({len(merged)} entries, {len(body)} bytes) to s3://{self.bucket}/{key}")
+            self._put(key, body)
+            if manifest.get("snapshot"):
+                stale.append(manifest["snapshot"]["key"])
+            stale.extend(d["key"] for d in manifest.get("deltas", []))
+            manifest["snapshot"] = {"key": key, "codec": self.codec, "format": "ndjson",
+                                    "count": len(merged), "bytes": len(body)}
+            manifest["deltas"] = []
+            kind = "snapshot"
+        else:
+            key = f"{self.prefix}baseline/delta-{gen:06d}-{stamp}.ndjson{self.ext}"
+            body = encode_object(dumps_ndjson(delta), self.codec)
+            print(f"⬆️ Uploading baseline delta ({len(delta)} entries, {len(body)} bytes) to s3://{self.bucket}/{key}")
+            self._put(key, body)
+            manifest.setdefault("deltas", []).append(
+                {"key": key, "codec": self.codec, "format": "ndjson", "count": len(delta), "bytes": len(body)})
+            kind = "delta"
+        manifest["generation"] = gen
+        self._manifest_dirty = True
+        self.flush()
+        # old objects are only removed once the new manifest no longer points at them
+        if stale:
+            s3_delete_keys(self.s3, self.bucket, stale)
+        return kind
+
+    def flush(self):
+        """Write the manifest if anything changed."""
+        if not self._manifest_dirty:
+            return
+        self.manifest["version"] = MANIFEST_VERSION
+        self.manifest["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self._put(self.manifest_key, dumps_compact(self.manifest), encoded=False)
+        self._manifest_dirty = False
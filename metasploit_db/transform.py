@@ -1,9 +1,14 @@
 # transform_metasploit.py
+import os
+import sys
 import json
 import re
 from datetime import datetime
 from typing import Tuple, List, Dict
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.parallel import map_shards
+
 CLEAN_RE = re.compile(r"\s+")
 
 def _clean_text(x):
@@ -26,37 +31,60 @@ def _to_semicolon(value):
         return ";".join(parts) if parts else None
     return _clean_text(value)
 
-def transform_json_text_to_records_and_json_bytes(json_text: str) -> Tuple[List[Dict], bytes]:
+# Output field order of a normalized record
+RECORD_FIELDS = (
+    "module_key", "id", "module_name", "fullname", "aliases", "rank", "type", "author",
+    "description", "references", "platform", "autofilter_services", "rport", "path",
+    "ref_name", "uploaded_date",
+)
+
+def _normalize_module(module_key, meta, uploaded_date):
+    return {
+        "module_key": module_key,
+        "id": None,  # placeholder for generated META-id (filled in loader)
+        "module_name": _clean_text(meta.get("name") or ""),
+        "fullname": _clean_text(meta.get("fullname") or module_key),
+        "aliases": _to_semicolon(meta.get("aliases")),
+        "rank": _clean_text(meta.get("rank")),
+        "type": _clean_text(meta.get("type")),
+        "author": _to_semicolon(meta.get("author")),
+        "description": _clean_text(meta.get("description")),
+        "references": _to_semicolon(meta.get("references")),
+        "platform": _to_semicolon(meta.get("platform")),
+        "autofilter_services": _to_semicolon(meta.get("autofilter_services")),
+        "rport": _clean_text(meta.get("rport")),
+        "path": _clean_text(meta.get("path")),
+        "ref_name": _clean_text(meta.get("ref_name") or module_key),
+        "uploaded_date": uploaded_date
+    }
+
+def _normalize_shard(items, uploaded_date):
+    """Worker: normalize a shard of (module_key, meta) pairs and return column lists (cheaper to pickle than dicts)."""
+    columns = {f: [] for f in RECORD_FIELDS}
+    for module_key, meta in items:
+        rec = _normalize_module(module_key, meta, uploaded_date)
+        for f in RECORD_FIELDS:
+            columns[f].append(rec[f])
+    return columns
+
+def transform_json_text_to_records_and_json_bytes(json_text: str, workers: int = 1) -> Tuple[List[Dict], bytes]:
     """
     Accept raw metasploit JSON text and return:
       - list of normalized dict records
       - bytes of the canonical transformed JSON (utf-8)
+    With workers > 1 the modules are sharded across a process pool; record order is preserved.
     """
     print("🔄 Transforming JSON (in memory)...")
     raw = json.loads(json_text)
+    uploaded_date = datetime.utcnow().strftime("%Y-%m-%d")
 
     records = []
-    for module_key, meta in raw.items():
-        rec = {
-            "module_key": module_key,
-            "id": None,  # placeholder for generated META-id (filled in loader)
-            "module_name": _clean_text(meta.get("name") or ""),
-            "fullname": _clean_text(meta.get("fullname") or module_key),
-            "aliases": _to_semicolon(meta.get("aliases")),
-            "rank": _clean_text(meta.get("rank")),
-            "type": _clean_text(meta.get("type")),
-            "author": _to_semicolon(meta.get("author")),
-            "description": _clean_text(meta.get("description")),
-            "references": _to_semicolon(meta.get("references")),
-            "platform": _to_semicolon(meta.get("platform")),
-            "autofilter_services": _to_semicolon(meta.get("autofilter_services")),
-            "rport": _clean_text(meta.get("rport")),
-            "path": _clean_text(meta.get("path")),
-            "ref_name": _clean_text(meta.get("ref_name") or module_key),
-            "uploaded_date": datetime.utcnow().strftime("%Y-%m-%d")
-        }
-        records.append(rec)
-
-    json_bytes = json.dumps(records, ensure_ascii=False, indent=2).encode("utf-8")
+    items = list(raw.items())
+    if workers > 1:
+        print(f"ℹ️ Parallel transform: {len(items)} modules across {workers} workers")
+    for columns in map_shards(_normalize_shard, items, workers, uploaded_date):
+        records.extend(dict(zip(RECORD_FIELDS, row)) for row in zip(*(columns[f] for f in RECORD_FIELDS)))
+
+    json_bytes = json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
     print(f"✅ Transformation complete: records={len(records)} (json size={len(json_bytes)} bytes)")
     return records, json_bytes
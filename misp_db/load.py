@@ -1,42 +1,54 @@
 # load.py
 import os
+import sys
 import json
 import math
 import time
-import boto3
 import pandas as pd
 from decimal import Decimal
-from botocore.exceptions import ClientError
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.compression import compress_item, compression_settings
+from common.hashing import content_hash, resolve_algorithm
+from common.aws import get_or_create_table, get_resource
+from common.ddb_io import item_io, progress_printer
+from common.changelog import INSERT, UPDATE, open_changelog
+from common.mirror import DEFAULT_MIRROR_DB, apply_run
+from common.indexes import index_attributes, table_indexes
+from common.profiling import profiled_entry
 
 DEFAULT_CONFIG = {
     "TABLE_NAME": "misp_data",
     "DDB_ENDPOINT": "http://localhost:8000",
     "AWS_REGION": "us-east-1",
-    "BATCH_PROGRESS_INTERVAL": 100
+    "MAX_POOL_CONNECTIONS": 32,  # botocore pool size (default would be 10)
+    "DDB_BACKEND": os.getenv("MISP_DDB_BACKEND"),  # "sync" | "async" (aiobotocore); None -> DDB_BACKEND env
+    "DDB_ASYNC_CONCURRENCY": 64,  # in-flight batch requests with the async backend
+    "BATCH_PROGRESS_INTERVAL": 100,
+    # opt-in: large text attributes stored as compressed Binary (empty list = disabled)
+    "COMPRESS_FIELDS": [],  # e.g. ["description", "meta.refs"]
+    "COMPRESS_CODEC": "zlib",  # "zlib" or "zstd"
+    "COMPRESS_MIN_BYTES": 512,
+    # content hash stored on each item; comparing it avoids reading whole items back
+    "HASH_ALGORITHM": "blake2b",
+    # change log (NDJSON segments) of each run's inserts/updates; None/"" -> off (misp_main enables it)
+    "CHANGELOG_DIR": os.getenv("MISP_CHANGELOG_DIR"),
+    "CHANGELOG_SEGMENT_MB": 64,
+    "CHANGELOG_INCLUDE_ITEMS": False,
+    # local SQLite query mirror updated with each run's written rows (common/mirror.py); "" -> off
+    "MIRROR_DB": DEFAULT_MIRROR_DB,
 }
 
 def connect_dynamodb(cfg):
-    return boto3.resource(
+    return get_resource(
         "dynamodb",
         region_name=cfg["AWS_REGION"],
-        aws_access_key_id="dummy",
-        aws_secret_access_key="dummy",
         endpoint_url=cfg["DDB_ENDPOINT"],
+        pool_size=cfg.get("MAX_POOL_CONNECTIONS"),
     )
 
 def create_table_if_missing(ddb_resource, table_name):
-    existing = ddb_resource.meta.client.list_tables().get("TableNames", [])
-    if table_name not in existing:
-        print(f"⚡ Creating DynamoDB table '{table_name}' locally...")
-        table = ddb_resource.create_table(
-            TableName=table_name,
-            KeySchema=[{"AttributeName": "uuid", "KeyType": "HASH"}],
-            AttributeDefinitions=[{"AttributeName": "uuid", "AttributeType": "S"}],
-            ProvisionedThroughput={"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
-        )
-        table.meta.client.get_waiter("table_exists").wait(TableName=table_name)
-        print("✅ Table created.")
-    return ddb_resource.Table(table_name)
+    return get_or_create_table(ddb_resource, table_name, "uuid", indexes=table_indexes("misp"))
 
 def _normalize_for_compare(value):
     """Normalize a value to be comparable and DynamoDB-safe."""
@@ -63,24 +75,24 @@ def _normalize_for_compare(value):
         return None
     return s
 
-def _scan_table_to_map(table):
-    """Scan DynamoDB table and return uuid -> item dict."""
+def _scan_table_hashes(table):
+    """Scan only uuid + content_hash; returns uuid -> stored hash (None for items written without one)."""
     client = table.meta.client
     paginator = client.get_paginator("scan")
     existing = {}
-    for page in paginator.paginate(TableName=table.name):
+    for page in paginator.paginate(TableName=table.name, ProjectionExpression="#u, content_hash",
+                                   ExpressionAttributeNames={"#u": "uuid"}):
         for it in page.get("Items", []):
-            uuid = it.get("uuid") or it.get("UUID") or it.get("id")
+            uuid = it.get("uuid")
             if uuid:
-                existing[str(uuid)] = it
+                existing[str(uuid)] = it.get("content_hash")
     return existing
 
-def rows_differ(csv_row: dict, ddb_item: dict) -> bool:
-    """Return True if normalized rows differ."""
-    norm_csv = {k: _normalize_for_compare(v) for k, v in csv_row.items()}
-    norm_ddb = {k: _normalize_for_compare(v) for k, v in (ddb_item or {}).items()}
-    return norm_csv != norm_ddb
+def _hash_value(v):
+    # rows are already normalized to str / None; hash them exactly
+    return "" if v is None else v
 
+@profiled_entry("misp", "load")
 def load_misp_incremental(df: pd.DataFrame, config: dict = None):
     """Load transformed DataFrame into DynamoDB incrementally."""
     if df is None or df.empty:
@@ -106,37 +118,47 @@ def load_misp_incremental(df: pd.DataFrame, config: dict = None):
     total_rows = len(rows)
     print(f"ℹ️ Prepared {total_rows} rows for comparison/upload")
 
-    existing_map = _scan_table_to_map(table)
-    print(f"ℹ️ DynamoDB currently has {len(existing_map)} items")
+    existing_hashes = _scan_table_hashes(table)
+    print(f"ℹ️ DynamoDB currently has {len(existing_hashes)} items")
+
+    hash_algorithm = resolve_algorithm(cfg["HASH_ALGORITHM"])
+    hash_fields = [c for c in df.columns if c != "content_hash"]
 
     to_write = []
+    ops = {}
     skipped = 0
     inserted = 0
     updated = 0
 
     for i, row in enumerate(rows, start=1):
         uuid = row["uuid"]
-        existing = existing_map.get(uuid)
-        if existing is None:
+        row["content_hash"] = content_hash(row, hash_fields, hash_algorithm, canonical=_hash_value)
+        if uuid not in existing_hashes:
             to_write.append(row)
+            ops[uuid] = INSERT
             inserted += 1
+        elif existing_hashes[uuid] != row["content_hash"]:
+            # also covers items written before content_hash existed (rewritten once)
+            to_write.append(row)
+            ops[uuid] = UPDATE
+            updated += 1
         else:
-            if rows_differ(row, existing):
-                to_write.append(row)
-                updated += 1
-            else:
-                skipped += 1
+            skipped += 1
 
         if i % max(1, cfg["BATCH_PROGRESS_INTERVAL"]) == 0:
             print(f"ℹ️ Compared {i}/{total_rows} rows (to_write={len(to_write)}, skipped={skipped})")
 
     print(f"ℹ️ Totals -> new: {inserted}, updated: {updated}, skipped(same): {skipped}")
 
+    compress_fields, compress_codec, compress_min = compression_settings(cfg)
     written = 0
+    written_uuids = []
     if to_write:
-        print(f"⬆️ Writing {len(to_write)} items to DynamoDB (batch_writer)...")
-        with table.batch_writer() as batch:
-            for i, it in enumerate(to_write, start=1):
+        ddb_io = item_io(table, "uuid", cfg.get("DDB_BACKEND"), cfg.get("DDB_ASYNC_CONCURRENCY"))
+        print(f"⬆️ Writing {len(to_write)} items to DynamoDB ({ddb_io.name} backend)...")
+
+        def safe_items():
+            for it in to_write:
                 safe_item = {}
                 for k, v in it.items():
                     if isinstance(v, (list, dict)):
@@ -147,22 +169,34 @@ def load_misp_incremental(df: pd.DataFrame, config: dict = None):
                     else:
                         safe_item[k] = v
                 safe_item["uuid"] = str(safe_item["uuid"])
-                try:
-                    batch.put_item(Item=safe_item)
-                    written += 1
-                except ClientError as e:
-                    print(f"❌ Failed to put item uuid={safe_item.get('uuid')}: {e}")
-                if i % cfg["BATCH_PROGRESS_INTERVAL"] == 0 or i == len(to_write):
-                    print(f"⬆️ Batch wrote {i}/{len(to_write)} items")
+                safe_item.update(index_attributes("misp", safe_item))  # GSI keys (galaxy type / value)
+                yield compress_item(safe_item, compress_fields, compress_codec, compress_min)
+
+        progress = progress_printer(cfg["BATCH_PROGRESS_INTERVAL"], len(to_write), "⬆️ Batch wrote {}/{} items")
+        written = ddb_io.put_many(safe_items(), progress, written_uuids.extend)
     else:
         print("ℹ️ Nothing to write to DynamoDB.")
 
+    # change log of the rows actually written (only hashes are kept in the table, so no per-field diff)
+    changelog = open_changelog(cfg.get("CHANGELOG_DIR"), "misp", cfg)
+    if changelog:
+        done = set(written_uuids)
+        for row in to_write:
+            if row["uuid"] in done:
+                changelog.append(ops[row["uuid"]], row["uuid"], row["content_hash"], item=row)
+        changelog.commit({"written": written, "total_rows": total_rows})
+
+    # local query mirror: the rows written this run, applied in one SQLite transaction
+    mirror_rows = apply_run(cfg.get("MIRROR_DB"), "misp", to_write, written_uuids, changelog)
+
     summary = {
         "total_rows": total_rows,
         "new": inserted,
         "updated": updated,
         "skipped": skipped,
         "written": written,
+        "changelog_entries": changelog.count if changelog else 0,
+        "mirror_rows": mirror_rows,
     }
     print("✅ Load summary:", summary)
     return summary
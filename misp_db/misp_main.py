@@ -3,21 +3,29 @@ import os
 from extract import extract_misp
 from transform import transform_misp
 from load import load_misp_incremental
+from common.parallel import resolve_workers
+from common.profiling import Profiler
 
 BASE_DIR = os.path.dirname(__file__)
 DAILY_DIR = os.path.join(BASE_DIR, "daily_extract")
+TRANSFORM_WORKERS = resolve_workers(os.getenv("MISP_TRANSFORM_WORKERS", "1"))
 
 def main():
     print("🚀 Starting MISP ETL pipeline...")
+    # profiling: PIPELINE_PROFILE=cprofile|sample or --profile[=sample]; artifacts go to DAILY_DIR
+    prof = Profiler.from_env("misp", DAILY_DIR)
 
     # 1) extract
-    json_path = extract_misp()
+    with prof.stage("extract"):
+        json_path = extract_misp()
 
     # 2) transform
-    df = transform_misp(json_path)
+    with prof.stage("transform"):
+        df = transform_misp(json_path, workers=TRANSFORM_WORKERS)
 
     # 3) load (incremental compare + write)
-    result = load_misp_incremental(df)
+    with prof.stage("load"):
+        result = load_misp_incremental(df, {"CHANGELOG_DIR": os.getenv("MISP_CHANGELOG_DIR", os.path.join(DAILY_DIR, "changelog"))})
 
     # 4) cleanup - remove the downloaded JSON
     try:
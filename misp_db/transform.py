@@ -1,9 +1,13 @@
 # transform.py
 import os
+import sys
 import json
 import pandas as pd
 from typing import Any, Dict, List
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.parallel import map_shards
+
 BASE_DIR = os.path.dirname(__file__)
 
 def _ensure_list(x):
@@ -50,10 +54,24 @@ def _flatten_cluster(cluster: Dict[str, Any]) -> Dict[str, Any]:
 
     return out
 
-def transform_misp(json_file_path: str) -> pd.DataFrame:
+def _flatten_shard(clusters: List[Dict]) -> pd.DataFrame:
+    """Worker: flatten a shard of clusters into a column-oriented frame (shipped back pickled)."""
+    rows = []
+    for c in clusters:
+        if not isinstance(c, dict):
+            continue
+        flat = _flatten_cluster(c)
+        # ensure uuid exists; fallback to value if missing
+        if not flat.get("uuid"):
+            flat["uuid"] = c.get("uuid") or c.get("id") or c.get("value")
+        rows.append(flat)
+    return pd.DataFrame(rows)
+
+def transform_misp(json_file_path: str, workers: int = 1) -> pd.DataFrame:
     """
     Read the downloaded MISP JSON and return a flattened DataFrame.
     The DataFrame contains a 'uuid' column (used as partition key).
+    With workers > 1 clusters are sharded across a process pool; row order is preserved.
     """
     if not os.path.exists(json_file_path):
         raise FileNotFoundError(json_file_path)
@@ -107,21 +125,12 @@ def transform_misp(json_file_path: str) -> pd.DataFrame:
         print("⚠️ No clusters found in JSON")
         return pd.DataFrame()  # empty
 
-    rows = []
-    for c in clusters:
-        if not isinstance(c, dict):
-            continue
-        flat = _flatten_cluster(c)
-        # ensure uuid exists; fallback to value if missing
-        if not flat.get("uuid"):
-            flat["uuid"] = c.get("uuid") or c.get("id") or c.get("value")
-        rows.append(flat)
-
-    if not rows:
+    frames = [f for f in map_shards(_flatten_shard, clusters, workers) if not f.empty]
+    if not frames:
         print("⚠️ No usable rows after flattening")
         return pd.DataFrame()
 
-    df = pd.DataFrame(rows)
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True, sort=False)
     # rearrange columns: description, related, uuid, value, then meta.* sorted, then others
     cols = []
     for c in ("description", "related", "uuid", "value"):
@@ -0,0 +1,32 @@
+# conftest.py
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def feed_path(feed: str):
+    """Put a feed folder on sys.path so its script-style modules import as in production."""
+    path = os.path.join(ROOT, feed)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+@pytest.fixture
+def aws_env(monkeypatch):
+    """Fake credentials and region for moto; never the real AWS."""
+    for name in ("AWS_PROFILE", "AWS_SESSION_TOKEN", "AWS_SECURITY_TOKEN"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+
+@pytest.fixture
+def s3(aws_env):
+    from moto import mock_aws
+    import boto3
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket="test")
+        yield client
@@ -0,0 +1,45 @@
+# test_aws.py
+import pytest
+from botocore.exceptions import ClientError
+
+from common import aws
+
+@pytest.fixture
+def ddb(aws_env, monkeypatch):
+    from moto import mock_aws
+    monkeypatch.setattr(aws, "_known_tables", set())
+    with mock_aws():
+        yield aws.get_resource("dynamodb", region_name="us-east-1")
+
+INDEXES = [("by_a", "a", None), ("by_b", "b", "a")]
+
+def index_names(ddb, table_name):
+    table = ddb.meta.client.describe_table(TableName=table_name)["Table"]
+    return {g["IndexName"] for g in table.get("GlobalSecondaryIndexes", [])}
+
+def test_new_table_created_with_indexes_and_cached(ddb):
+    aws.get_or_create_table(ddb, "t", "id", indexes=INDEXES)
+    assert index_names(ddb, "t") == {"by_a", "by_b"}
+    assert ("https://dynamodb.us-east-1.amazonaws.com", "us-east-1", "t") in aws._known_tables
+
+@pytest.mark.parametrize("code", ["ResourceInUseException", "LimitExceededException"])
+def test_table_not_cached_until_indexes_added(ddb, monkeypatch, code):
+    aws.get_or_create_table(ddb, "t", "id")
+    aws.forget_table(ddb, "t")
+    client = ddb.meta.client
+    update_table = client.update_table
+    calls = []
+
+    def busy(**kwargs):
+        calls.append(kwargs)
+        raise ClientError({"Error": {"Code": code, "Message": "busy"}}, "UpdateTable")
+
+    monkeypatch.setattr(client, "update_table", busy)
+    aws.get_or_create_table(ddb, "t", "id", indexes=INDEXES)
+    assert len(calls) == 2 and not aws._known_tables
+
+    # the next call retries and, once the indexes exist, caches the table
+    monkeypatch.setattr(client, "update_table", update_table)
+    aws.get_or_create_table(ddb, "t", "id", indexes=INDEXES)
+    assert index_names(ddb, "t") == {"by_a", "by_b"}
+    assert len(aws._known_tables) == 1
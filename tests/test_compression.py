@@ -0,0 +1,49 @@
+# test_compression.py
+import pytest
+from boto3.dynamodb.types import Binary
+
+from common import compression
+from common.compression import (compress_item, compress_value, compression_settings, decompress_item,
+                                decompress_value, resolve_codec)
+
+TEXT = "This module exploits a stack buffer overflow in the service. " * 40
+
+@pytest.mark.parametrize("codec,marker", [("zlib", b"z"), ("zstd", b"s")])
+def test_round_trip(codec, marker):
+    packed = compress_value(TEXT, codec)
+    assert isinstance(packed, bytes) and packed[:1] == marker and len(packed) < len(TEXT)
+    assert decompress_value(packed) == TEXT
+    # as read back through boto3
+    assert decompress_value(Binary(packed)) == TEXT
+
+def test_small_incompressible_and_non_string_values_unchanged():
+    assert compress_value("short") == "short"
+    # just over the threshold: the codec framing costs more than it saves
+    assert compress_value("qXv3-Lp9zRw2_Kt7", min_bytes=16) == "qXv3-Lp9zRw2_Kt7"
+    assert compress_value(42) == 42
+    assert compress_value(None) is None
+
+def test_decompress_leaves_other_values_alone():
+    for value in ("text", 7, None, b"", b"xunmarked"):
+        assert decompress_value(value) == value
+
+def test_items():
+    item = {"id": "1", "description": TEXT, "name": "n"}
+    packed = compress_item(item, ["description", "missing"])
+    assert packed is not item and item["description"] == TEXT
+    assert isinstance(packed["description"], bytes) and packed["name"] == "n"
+    assert decompress_item(packed) == item
+    assert compress_item(item, []) is item
+
+def test_settings():
+    assert compression_settings({}) == ([], "zlib", 512)
+    cfg = {"COMPRESS_FIELDS": "description, notes", "COMPRESS_CODEC": "ZSTD", "COMPRESS_MIN_BYTES": "64"}
+    assert compression_settings(cfg) == (["description", "notes"], "zstd", 64)
+    with pytest.raises(ValueError):
+        resolve_codec("lz4")
+
+def test_zstd_falls_back_without_zstandard(monkeypatch):
+    monkeypatch.setattr(compression, "zstandard", None)
+    assert resolve_codec("zstd") == "zlib"
+    with pytest.raises(RuntimeError):
+        decompress_value(b"s" + b"\x00" * 8)
@@ -0,0 +1,46 @@
+# test_cve.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from common.cve import (INVALID, find_all_cves, find_cve, normalize_cve, pack_cve, pack_many, unpack_cve,
+                        unpack_many)
+
+CANONICAL = ["CVE-1999-0001", "CVE-2014-0160", "CVE-2021-44228", "CVE-2024-123456789"]
+INVALID_IDS = [None, "", "CVE-2021-123", "CVE-2021-01234", "CVE-21-1234", "CVE-2021-1234567890",
+               "2021-44228", "CVE-2021-44228x", "xCVE-2021-44228"]
+
+@pytest.mark.parametrize("cve", CANONICAL)
+def test_pack_unpack_round_trip(cve):
+    key = pack_cve(cve)
+    assert key == (int(cve[4:8]) << 32) | int(cve[9:])
+    assert unpack_cve(key) == cve
+    assert pack_cve(f"  {cve.lower()} ") == key
+
+@pytest.mark.parametrize("value", INVALID_IDS)
+def test_invalid_ids(value):
+    assert pack_cve(value) is None
+    assert normalize_cve(value) is None
+
+def test_packed_keys_sort_by_year_then_sequence():
+    ids = ["CVE-2021-44228", "CVE-2020-99999", "CVE-2021-1000", "CVE-2021-0999"]
+    assert [unpack_cve(k) for k in sorted(pack_cve(c) for c in ids)] == \
+        ["CVE-2020-99999", "CVE-2021-0999", "CVE-2021-1000", "CVE-2021-44228"]
+
+def test_normalize():
+    assert normalize_cve(" cve-2021-44228 ") == "CVE-2021-44228"
+
+def test_vectorized_matches_scalar():
+    values = CANONICAL + [v for v in INVALID_IDS if v is not None] + [" cve-2014-0160"]
+    keys = pack_many(pd.Series(values))
+    assert keys.dtype == np.int64
+    assert keys.tolist() == [INVALID if pack_cve(v) is None else pack_cve(v) for v in values]
+    assert pack_many(iter(values)).tolist() == keys.tolist()
+    assert unpack_many(keys) == [None if k == INVALID else unpack_cve(k) for k in keys]
+    assert pack_many([]).tolist() == []
+
+def test_find_in_text():
+    text = "see cve-2021-44228 and CVE-2014-0160; also CVE-2021-44228"
+    assert find_cve(text) == "CVE-2021-44228"
+    assert find_all_cves(text) == ["CVE-2021-44228", "CVE-2014-0160"]
+    assert find_cve("no id here") is None and find_all_cves(None) == []
@@ -0,0 +1,57 @@
+# test_extdiff.py
+import os
+import random
+from collections import Counter
+
+import pytest
+
+from common import extdiff
+from common.extdiff import CHANGED, DELETED, NEW, UNCHANGED, ExternalSorter, external_diff
+
+def dict_diff(old, new):
+    """Reference diff over dicts (last record per key wins)."""
+    o = {k: (h, p) for k, h, p in old}
+    n = {k: (h, p) for k, h, p in new}
+    rows = []
+    for k in sorted(o.keys() | n.keys()):
+        if k not in n:
+            rows.append((DELETED, k, o[k], None))
+        elif k not in o:
+            rows.append((NEW, k, None, n[k]))
+        elif o[k][0] != n[k][0]:
+            rows.append((CHANGED, k, o[k], n[k]))
+    return rows
+
+def records(rng, n, keys):
+    return [(f"k{rng.randrange(keys):05d}", f"h{rng.randrange(3)}", {"i": i}) for i in range(n)]
+
+@pytest.mark.parametrize("run_size", [1, 7, 100000])
+def test_matches_in_memory_diff(tmp_path, monkeypatch, run_size):
+    monkeypatch.setattr(extdiff, "MAX_OPEN_RUNS", 4)  # force multi-pass merges
+    monkeypatch.setattr(extdiff, "RUN_BLOCK", 3)
+    rng = random.Random(run_size)
+    old, new = records(rng, 300, 200), records(rng, 300, 200)
+    stats = Counter()
+    rows = [tuple(r) for r in external_diff(iter(old), iter(new), run_size, str(tmp_path), stats=stats)]
+    assert rows == dict_diff(old, new)
+    assert stats[NEW] + stats[CHANGED] + stats[DELETED] == len(rows) and stats[UNCHANGED] > 0
+    assert os.listdir(tmp_path) == []
+
+def test_emit_unchanged_and_empty_sides(tmp_path):
+    old = [("a", "1", "pa"), ("b", "1", "pb")]
+    rows = list(external_diff(old, old, 1, str(tmp_path), emit_unchanged=True))
+    assert [(r.status, r.key) for r in rows] == [(UNCHANGED, "a"), (UNCHANGED, "b")]
+    assert [r.status for r in external_diff([], old, tmp_dir=str(tmp_path))] == [NEW, NEW]
+    assert [r.status for r in external_diff(old, [], tmp_dir=str(tmp_path))] == [DELETED, DELETED]
+    assert list(external_diff([], [])) == []
+
+def test_sorter_last_wins_and_cleans_up_when_abandoned(tmp_path):
+    sorter = ExternalSorter(2, str(tmp_path)).extend([("b", 1), ("a", 1), ("b", 2), ("c", 1), ("a", 2)])
+    assert sorter.runs == 2
+    assert list(sorter) == [("a", 2), ("b", 2), ("c", 1)]
+    assert os.listdir(tmp_path) == []
+    sorter = ExternalSorter(2, str(tmp_path)).extend((f"k{i}", i) for i in range(10))
+    it = iter(sorter)
+    next(it)
+    it.close()
+    assert os.listdir(tmp_path) == []
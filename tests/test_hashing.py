@@ -0,0 +1,52 @@
+# test_hashing.py
+import hashlib
+
+import pandas as pd
+import pytest
+
+from common import hashing
+from common.hashing import (algorithm_of, canonical_text, content_hash, frame_hashes, record_hashes,
+                            resolve_algorithm, same_algorithm)
+
+FIELDS = ["id", "description", "rank"]
+REC = {"id": "1", "description": "Stack  overflow\n in svc ", "rank": None}
+
+def test_canonical_text():
+    assert canonical_text(None) == ""
+    assert canonical_text("  a \t b\n") == "a b"
+    assert canonical_text("already clean") == "already clean"
+    assert canonical_text(5) == "5"
+
+def test_sha256_matches_existing_baselines():
+    assert content_hash(REC, FIELDS, "sha256") == hashlib.sha256(b"1|Stack overflow in svc|").hexdigest()
+
+@pytest.mark.parametrize("algorithm,tag", [("sha256", ""), ("blake2b", "b2:"), ("xxh3", "x3:")])
+def test_algorithms_are_tagged_and_stable(algorithm, tag):
+    h = content_hash(REC, FIELDS, algorithm)
+    assert h.startswith(tag) and algorithm_of(h) == algorithm and same_algorithm(h, algorithm)
+    # whitespace-only differences do not change the hash; content does
+    assert content_hash(dict(REC, description="Stack overflow in svc"), FIELDS, algorithm) == h
+    assert content_hash(dict(REC, rank="great"), FIELDS, algorithm) != h
+
+@pytest.mark.parametrize("algorithm", ["sha256", "blake2b", "xxh3"])
+def test_record_hashes_match_content_hash(algorithm):
+    recs = [REC, {"id": "2"}, dict(REC, rank="low")]
+    assert record_hashes(recs, FIELDS, algorithm) == [content_hash(r, FIELDS, algorithm) for r in recs]
+
+def test_algorithm_resolution(monkeypatch):
+    assert resolve_algorithm(None) == "blake2b"
+    assert algorithm_of("") is None and algorithm_of("f64:00") == "frame64"
+    with pytest.raises(ValueError):
+        resolve_algorithm("md5")
+    monkeypatch.setattr(hashing, "xxhash", None)
+    assert resolve_algorithm("xxh3") == "blake2b"
+
+def test_frame_hashes():
+    df = pd.DataFrame({"id": ["1", "2", "3", "4"], "description": [" x ", "x", "nan", ""],
+                       "rank": [None, "", "None", pd.NA]})
+    h = frame_hashes(df, ["id", "description", "rank", "absent"])
+    assert all(v.startswith("f64:") and len(v) == 20 for v in h)
+    assert len(set(h)) == 4
+    # stripped values and every null spelling hash alike
+    same = pd.DataFrame({"id": ["1", "3"], "description": ["x", None], "rank": ["nan", ""]})
+    assert frame_hashes(same, ["id", "description", "rank", "absent"]) == [h[0], h[2]]
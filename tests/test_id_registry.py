@@ -0,0 +1,52 @@
+# test_id_registry.py
+import boto3
+import pytest
+
+from conftest import feed_path
+
+feed_path("metasploit_db")
+from id_registry import MetaIdRegistry
+
+def test_assign_is_stable_and_per_year():
+    reg = MetaIdRegistry({"exploit/a": "META-2024-000007"})
+    assert not reg.dirty
+    assert reg.assign("exploit/a", 2024) == "META-2024-000007" and not reg.dirty
+    assert reg.assign("exploit/b", 2024) == "META-2024-000008"
+    assert reg.assign("exploit/c", 2025) == "META-2025-000001"
+    assert reg.assign("exploit/b", 2025) == "META-2024-000008"
+    assert reg.dirty and len(reg) == 3 and reg.get("exploit/c") == "META-2025-000001"
+
+def test_round_trip_keeps_high_water_mark():
+    reg = MetaIdRegistry({"exploit/a": "META-2024-000003"}, {2024: 10})
+    reg.assign("exploit/b", 2024)
+    again = MetaIdRegistry.from_text(reg.to_bytes().decode("utf-8"))
+    assert again.ids == reg.ids and again.max_seq == {2024: 11}
+    # an id forgotten from ids (deleted module) is never handed out again
+    assert again.assign("exploit/c", 2024) == "META-2024-000012"
+
+@pytest.fixture
+def table(aws_env):
+    from moto import mock_aws
+    with mock_aws():
+        ddb = boto3.resource("dynamodb", region_name="us-east-1")
+        t = ddb.create_table(TableName="metasploit_data", KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+                             AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+                             BillingMode="PAY_PER_REQUEST")
+        yield t
+
+def test_rebuild_from_table_scan(table):
+    items = [
+        {"id": "META-2024-000001", "module_id": "exploit/a", "content_hash": "b2:old"},
+        {"id": "META-2024-000004", "module_id": "exploit/a", "content_hash": "b2:new"},
+        {"id": "META-2024-000002", "module_id": "exploit/b", "content_hash": "b2:x"},
+        {"id": "META-2024-000003", "module_id": "exploit/b", "content_hash": "b2:y"},
+        {"id": "META-2024-000009"},  # orphan: no module, still counts toward the high-water mark
+    ]
+    with table.batch_writer() as batch:
+        for it in items:
+            batch.put_item(Item=it)
+    reg = MetaIdRegistry.from_table_scan(table, {"exploit/a": "b2:old"})
+    # baseline hash match wins for exploit/a; the newest id for exploit/b
+    assert reg.ids == {"exploit/a": "META-2024-000001", "exploit/b": "META-2024-000003"}
+    assert reg.dirty
+    assert reg.assign("exploit/c", 2024) == "META-2024-000010"
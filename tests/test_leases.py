@@ -0,0 +1,95 @@
+# test_leases.py
+import time
+import types
+
+import pytest
+
+from common import aws, leases
+from common.leases import DONE, LeaseLost, ShardLeases, filter_rows, in_shard, run_shards, shard_of
+
+@pytest.fixture
+def ddb(aws_env, monkeypatch):
+    from moto import mock_aws
+    monkeypatch.setattr(aws, "_known_tables", set())
+    with mock_aws():
+        yield aws.get_resource("dynamodb", region_name="us-east-1")
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Wall clock seen by the leases module, advanced by hand."""
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(leases, "time", types.SimpleNamespace(time=lambda: now[0], sleep=time.sleep))
+    return now
+
+def test_shard_of_is_stable_and_covers_every_key():
+    assert shard_of("CVE-2021-44228", 8) == shard_of(" cve-2021-44228 ", 8)
+    keys = [f"CVE-2020-{i}" for i in range(1000, 1400)]
+    shards = {shard_of(k, 4) for k in keys}
+    assert shards == {0, 1, 2, 3}
+    assert all(sum(in_shard(k, (s, 4)) for s in range(4)) == 1 for k in keys)
+    assert in_shard("anything", None)
+    batches = list(filter_rows([[{"cve": k} for k in keys[:50]], []], (1, 4)))
+    assert all(shard_of(r["cve"], 4) == 1 for b in batches for r in b)
+
+def test_claim_is_exclusive(ddb, clock):
+    a = ShardLeases(ddb, "job", 2, "a", lease_seconds=60)
+    b = ShardLeases(ddb, "job", 2, "b", lease_seconds=60)
+    assert a.claim(0) and a.tokens[0] == 1
+    assert not b.claim(0)
+    assert b.claim(1)
+    # the owner may re-claim (e.g. after a restart); the token still moves on
+    assert a.claim(0) and a.tokens[0] == 2
+
+def test_expired_lease_is_taken_over_and_old_owner_fenced(ddb, clock):
+    a = ShardLeases(ddb, "job", 1, "a", lease_seconds=60)
+    b = ShardLeases(ddb, "job", 1, "b", lease_seconds=60)
+    assert a.claim(0)
+    clock[0] += 30
+    a.renew(0)
+    clock[0] += 61
+    assert b.claim(0)  # renewed at +30, so the lease ran out at +90
+    with pytest.raises(LeaseLost):
+        a.renew(0)
+    with pytest.raises(LeaseLost):
+        a.complete(0)
+    b.complete(0, {"rows": 3})
+    assert b.status()[0]["state"] == DONE and b.status()[0]["result"] == {"rows": 3}
+    clock[0] += 3600
+    assert not a.claim(0)  # done shards are never handed out again
+
+def test_stale_token_is_fenced_for_the_same_worker_id(ddb, clock):
+    old = ShardLeases(ddb, "job", 1, "node-1", lease_seconds=60)
+    new = ShardLeases(ddb, "job", 1, "node-1", lease_seconds=60)
+    assert old.claim(0) and new.claim(0)
+    with pytest.raises(LeaseLost):
+        old.complete(0)
+    new.complete(0)
+
+def test_release_frees_the_shard_at_once(ddb, clock):
+    a = ShardLeases(ddb, "job", 1, "a", lease_seconds=60)
+    b = ShardLeases(ddb, "job", 1, "b", lease_seconds=60)
+    assert a.claim(0)
+    a.release(0)
+    assert 0 not in a.tokens
+    assert b.claim(0)
+
+def test_run_shards_processes_each_shard_once(ddb):
+    done = []
+    a = ShardLeases(ddb, "job", 5, "a", lease_seconds=60)
+    b = ShardLeases(ddb, "job", 5, "b", lease_seconds=60)
+    first = run_shards(a, lambda s: done.append(s) or {"shard": s}, wait=False, max_shards=2)
+    second = run_shards(b, lambda s: done.append(s), wait=False)
+    assert len(first["processed"]) == 2 and len(second["processed"]) == 3
+    assert sorted(done) == [0, 1, 2, 3, 4]
+    assert [item["state"] for item in a.status()] == [DONE] * 5
+
+def test_failed_shard_is_released_and_error_raised(ddb):
+    a = ShardLeases(ddb, "job", 1, "a", lease_seconds=60)
+
+    def boom(shard):
+        raise RuntimeError("load failed")
+
+    with pytest.raises(RuntimeError, match="load failed"):
+        run_shards(a, boom, wait=False)
+    assert a.status()[0]["state"] == leases.FREE
+    assert ShardLeases(ddb, "job", 1, "b", lease_seconds=60).claim(0)
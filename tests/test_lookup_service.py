@@ -0,0 +1,48 @@
+# test_lookup_service.py
+import asyncio
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestClient, TestServer
+
+from conftest import feed_path
+
+feed_path("lookup_service")
+import lookup_main
+
+class FakeReader:
+    def __init__(self):
+        self.calls = []
+
+    def invalidate_from_summary(self, feed, summary, keys=None):
+        self.calls.append((feed, summary, keys))
+        return len(keys or [])
+
+class FakeService:
+    def __init__(self):
+        self.reader = FakeReader()
+
+def post_invalidate(data=None, json=None):
+    async def run():
+        app = web.Application()
+        app["service"] = FakeService()
+        app.router.add_post("/invalidate", lookup_main.handle_invalidate)
+        async with TestClient(TestServer(app)) as client:
+            resp = await client.post("/invalidate", data=data, json=json)
+            return resp.status, await resp.text(), app["service"].reader.calls
+    return asyncio.run(run())
+
+def test_invalidate_keys():
+    status, text, calls = post_invalidate(json={"feed": "cisa", "keys": ["CVE-2024-0001"]})
+    assert status == 200 and '"dropped": 1' in text
+    assert calls == [("cisa", {}, ["CVE-2024-0001"])]
+
+@pytest.mark.parametrize("body", [["cisa"], "cisa", 3, None, {"feed": ["cisa"]}, {"feed": "nope"},
+                                  {"feed": "cisa", "summary": [1]}, {"feed": "cisa", "keys": "CVE-2024-0001"}])
+def test_invalidate_rejects_bad_bodies(body):
+    status, _, calls = post_invalidate(json=body)
+    assert status == 400 and calls == []
+
+def test_invalidate_rejects_non_json():
+    status, _, calls = post_invalidate(data=b"{not json")
+    assert status == 400 and calls == []
@@ -0,0 +1,52 @@
+# test_processed_set.py
+import os
+
+from conftest import feed_path
+
+feed_path("epss_db")
+from processed_set import ProcessedCveSet, index_path_for
+
+def write_csv(path, cves, mode="w"):
+    with open(path, mode, encoding="utf-8", newline="") as f:
+        if mode == "w":
+            f.write("cve,epss,percentile,date\n")
+        for c in cves:
+            f.write(f"{c},0.1,0.5,2025-01-01\n")
+
+def test_membership_add_and_compact():
+    s = ProcessedCveSet()
+    for cve in ("CVE-2021-44228", "cve-2014-0160", "not-a-cve"):
+        s.add(cve)
+    s.add("CVE-2021-44228")
+    assert len(s) == 3
+    assert "CVE-2021-44228" in s and "CVE-2014-0160" in s and "not-a-cve" in s
+    assert "CVE-2021-44229" not in s
+    s.compact()
+    assert len(s) == 3 and "CVE-2021-44228" in s
+
+def test_build_save_and_resume(tmp_path):
+    csv_path = str(tmp_path / "epss_extract.csv")
+    write_csv(csv_path, [f"CVE-2020-{1000 + i}" for i in range(50)] + ["bogus"])
+    s = ProcessedCveSet.load_or_build(csv_path)
+    assert len(s) == 51 and "CVE-2020-1049" in s and "bogus" in s
+    assert os.path.exists(index_path_for(csv_path))
+
+    # rows appended after the save are parsed from the tail only
+    write_csv(csv_path, ["CVE-2024-12345"], mode="a")
+    s = ProcessedCveSet.load_or_build(csv_path)
+    assert len(s) == 52 and "CVE-2024-12345" in s
+
+def test_stale_or_corrupt_index_is_rebuilt(tmp_path):
+    csv_path = str(tmp_path / "epss_extract.csv")
+    write_csv(csv_path, ["CVE-2020-1000", "CVE-2020-1001"])
+    ProcessedCveSet.load_or_build(csv_path)
+    # CSV truncated below the size the index covers
+    write_csv(csv_path, ["CVE-2020-1001"])
+    s = ProcessedCveSet.load_or_build(csv_path)
+    assert len(s) == 1 and "CVE-2020-1000" not in s
+    with open(index_path_for(csv_path), "wb") as f:
+        f.write(b"garbage")
+    assert len(ProcessedCveSet.load_or_build(csv_path)) == 1
+
+def test_missing_csv(tmp_path):
+    assert len(ProcessedCveSet.load_or_build(str(tmp_path / "none.csv"))) == 0
@@ -0,0 +1,46 @@
+# test_profiling.py
+import os
+import threading
+
+from common import profiling
+from common.profiling import Profiler, profiled_entry
+
+def artifacts(path):
+    return sorted(os.listdir(path)) if os.path.isdir(path) else []
+
+def test_stage_off_is_noop(tmp_path):
+    with Profiler("feed", str(tmp_path / "out"), None).stage("load"):
+        pass
+    assert artifacts(tmp_path / "out") == []
+
+def test_stage_writes_artifacts(tmp_path):
+    with Profiler("feed", str(tmp_path), "cprofile").stage("load"):
+        sum(range(1000))
+    names = artifacts(tmp_path)
+    assert any(n.endswith("_load.prof") for n in names)
+    assert any(n.endswith("_load.alloc.txt") for n in names)
+    assert profiling._active_stage is None
+
+def test_entry_point_in_stage_thread_is_not_profiled_again(tmp_path, monkeypatch):
+    monkeypatch.setenv("PIPELINE_PROFILE", "sample")
+    calls = []
+
+    @profiled_entry("feed", "inner", str(tmp_path / "inner"))
+    def load():
+        calls.append(threading.current_thread().name)
+
+    with Profiler("feed", str(tmp_path / "outer"), "sample").stage("pipeline"):
+        worker = threading.Thread(target=load, name="load-stage")
+        worker.start()
+        worker.join()
+    assert calls == ["load-stage"]
+    assert artifacts(tmp_path / "inner") == []
+    assert any(n.endswith("_pipeline.folded") for n in artifacts(tmp_path / "outer"))
+
+def test_stage_released_after_error(tmp_path):
+    try:
+        with Profiler("feed", str(tmp_path), "cprofile").stage("load"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert profiling._active_stage is None
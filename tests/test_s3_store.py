@@ -0,0 +1,85 @@
+# test_s3_store.py
+import os
+
+import pytest
+
+from conftest import feed_path
+
+feed_path("metasploit_db")
+from s3_store import (BaselineStore, S3TransferSettings, s3_get_bytes_if_exists, s3_open_if_exists,
+                      s3_put_bytes)
+
+PREFIX = "vuln-raw-source/metasploit/"
+
+def entry(i, content="a"):
+    return {"module_key": f"exploit/test/mod_{i}", "id": f"META-2025-{i + 1:06d}",
+            "content_hash": f"b2:{content}{i}"}
+
+def test_multipart_round_trip(s3):
+    # moto enforces S3's 5 MiB minimum part size
+    transfer = S3TransferSettings({"S3_MULTIPART_THRESHOLD_MB": 5, "S3_MULTIPART_CHUNK_MB": 5,
+                                   "S3_MAX_CONCURRENCY": 4})
+    data = os.urandom(12 * 1024 * 1024 + 123)
+    s3_put_bytes(s3, "test", "big.bin", data, transfer)
+    assert "-" in s3.head_object(Bucket="test", Key="big.bin")["ETag"]  # multipart ETag: "<md5>-<parts>"
+    assert s3_get_bytes_if_exists(s3, "test", "big.bin", transfer) == data
+
+def test_ranged_get_reassembly(s3):
+    transfer = S3TransferSettings({"S3_RANGE_MB": 1024 / (1024 * 1024), "S3_MAX_CONCURRENCY": 4})
+    assert transfer.range_bytes == 1024
+    data = os.urandom(10 * 1024 + 7)  # 11 ranges, the last one short
+    s3.put_object(Bucket="test", Key="ranged.bin", Body=data)
+    assert s3_get_bytes_if_exists(s3, "test", "ranged.bin", transfer) == data
+    # objects within one range come back as the first GET's stream
+    s3.put_object(Bucket="test", Key="small.bin", Body=data[:1000])
+    assert s3_get_bytes_if_exists(s3, "test", "small.bin", transfer) == data[:1000]
+
+@pytest.mark.parametrize("codec", ["gzip", "zstd"])
+def test_manifest_snapshot_and_delta_merge(s3, codec):
+    cfg = {"S3_CODEC": codec, "COMPACT_AFTER_DELTAS": 3, "COMPACT_DELTA_RATIO": 0.5}
+    merged = {e["module_key"]: e for e in (entry(i) for i in range(20))}
+    store = BaselineStore(s3, "test", PREFIX, cfg)
+    assert store.load_baseline() is None
+    assert store.save_baseline(merged, list(merged.values())) == "snapshot"
+
+    delta = [entry(3, "b"), entry(20)]
+    merged.update((e["module_key"], e) for e in delta)
+    store = BaselineStore(s3, "test", PREFIX, cfg)
+    assert store.save_baseline(merged, delta) == "delta"
+    assert store.save_baseline(merged, []) == "skipped"
+
+    store = BaselineStore(s3, "test", PREFIX, cfg)
+    manifest = store.load_manifest()
+    assert manifest["generation"] == 2 and len(manifest["deltas"]) == 1
+    loaded = {e["module_key"]: e for e in store.load_baseline()}
+    assert loaded == merged
+
+    # compaction folds the deltas into a new snapshot and removes the old objects
+    old = [manifest["snapshot"]["key"]] + [d["key"] for d in manifest["deltas"]]
+    delta = [entry(i, "c") for i in range(15)]
+    merged.update((e["module_key"], e) for e in delta)
+    assert store.save_baseline(merged, delta) == "snapshot"
+    keys = {o["Key"] for o in s3.list_objects_v2(Bucket="test", Prefix=PREFIX)["Contents"]}
+    assert not keys & set(old)
+    assert {e["module_key"]: e for e in BaselineStore(s3, "test", PREFIX, cfg).load_baseline()} == merged
+
+def test_canonical_upload_skipped_when_unchanged(s3):
+    store = BaselineStore(s3, "test", PREFIX, {})
+    assert store.put_canonical(b"[]", "k1")
+    store.flush()
+    store = BaselineStore(s3, "test", PREFIX, {})
+    assert not store.put_canonical(b"[]", "k1")
+    assert store.puts == 0
+
+def test_missing_objects(s3):
+    assert s3_open_if_exists(s3, "test", "nope.bin") is None
+    assert s3_get_bytes_if_exists(s3, "test", "nope.bin") is None
+    assert s3_get_bytes_if_exists(s3, "no-such-bucket", "nope.bin") is None
+    s3.put_object(Bucket="test", Key="empty.bin", Body=b"")
+    assert s3_get_bytes_if_exists(s3, "test", "empty.bin") == b""
+    # a manifest pointing at a deleted part is an error, not an empty baseline
+    store = BaselineStore(s3, "test", PREFIX, {})
+    store.save_baseline({"m": entry(0)}, [entry(0)])
+    s3.delete_object(Bucket="test", Key=store.manifest["snapshot"]["key"])
+    with pytest.raises(RuntimeError, match="missing object"):
+        BaselineStore(s3, "test", PREFIX, {}).load_baseline()